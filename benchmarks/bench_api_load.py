@@ -0,0 +1,75 @@
+"""
+Latency of the REST API under concurrent clients.
+
+Concurrent clients send requests to a running `omnia serve` for a fixed number of
+requests, and the p50, p95 and p99 latencies and the throughput are reported. With
+a blocking data path, the tail latency grows with the number of clients, as every
+request waits for the queries of the others.
+
+It needs httpx, which is not a dependency of omnia.
+
+Usage:
+    omnia serve &
+    python benchmarks/bench_api_load.py [--url http://localhost:8000] [--concurrency 1 16 64] [--requests 2000]
+        [--path /collections /collections/datasets/path/data/sample.bam]
+"""
+
+import argparse
+import asyncio
+import itertools
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def client(http: httpx.AsyncClient, paths, counter, total: int, latencies: list[float], errors: list[int]):
+    while next(counter) < total:
+        path = next(paths)
+        start = time.perf_counter()
+        response = await http.get(path)
+        latencies.append(time.perf_counter() - start)
+        if response.status_code >= 500:
+            errors.append(response.status_code)
+
+
+async def run(url: str, paths: list[str], concurrency: int, total: int) -> tuple[list[float], int, float]:
+    latencies, errors = [], []
+    counter, cycle = itertools.count(), itertools.cycle(paths)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        # Warm up the connections of both the clients and the server
+        await asyncio.gather(*(http.get(paths[0]) for _ in range(concurrency)))
+        start = time.perf_counter()
+        await asyncio.gather(*(client(http, cycle, counter, total, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return latencies, len(errors), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000", help="Base URL of the API")
+    parser.add_argument("--path", nargs="+", default=["/collections"], help="Paths requested in turn")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64], help="Concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per run")
+    args = parser.parse_args()
+
+    header = f"{'clients':>8} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}"
+    print(header)
+    print("-" * len(header))
+    for concurrency in args.concurrency:
+        latencies, errors, elapsed = asyncio.run(run(args.url, args.path, concurrency, args.requests))
+        ms = [latency * 1000 for latency in latencies]
+        print(
+            f"{concurrency:>8} {len(ms) / elapsed:>9.1f} {statistics.mean(ms):>9.2f} {percentile(ms, 50):>9.2f} "
+            f"{percentile(ms, 95):>9.2f} {percentile(ms, 99):>9.2f} {errors:>7}"
+        )
+
+
+if __name__ == "__main__":
+    main()
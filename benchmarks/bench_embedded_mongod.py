@@ -0,0 +1,63 @@
+"""
+Start-up latency of the embedded MongoDB server, cold and warm.
+
+A cold start spawns mongod and pings it until it accepts connections. A warm start
+attaches to the server kept alive by a previous start, as `omnia --mongo-keep-alive`
+does. Each run uses a temporary dbpath and port, so it doesn't touch the data of omnia.
+
+It needs mongod on the PATH.
+
+Usage:
+    python benchmarks/bench_embedded_mongod.py [--repeat 5] [--port 27118]
+"""
+
+import argparse
+import pathlib
+import statistics
+import tempfile
+import time
+
+from omnia.mongo.mongo_manager import MongoDBManager
+
+
+def start(directory: str, port: int, keep_alive: bool) -> tuple[MongoDBManager, float]:
+    manager = MongoDBManager(
+        dbpath=pathlib.Path(directory, "db"),
+        logpath=pathlib.Path(directory, "mongod.log"),
+        port=port,
+        timeout=30,
+        pidfile=pathlib.Path(directory, "mongod.pid"),
+        keep_alive=keep_alive,
+    )
+    begin = time.perf_counter()
+    manager.start()
+    return manager, time.perf_counter() - begin
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="Starts of each kind")
+    parser.add_argument("--port", type=int, default=27118, help="Port of the benchmarked server")
+    args = parser.parse_args()
+
+    cold, warm = [], []
+    for _ in range(args.repeat):
+        with tempfile.TemporaryDirectory() as directory:
+            manager, elapsed = start(directory, args.port, keep_alive=True)
+            cold.append(elapsed)
+            for _ in range(args.repeat):
+                attached, elapsed = start(directory, args.port, keep_alive=False)
+                if not attached.attached:
+                    raise RuntimeError("The warm start didn't attach to the running server")
+                warm.append(elapsed)
+                attached.stop()
+            manager.stop(force=True)
+
+    print(f"{'start':>6} {'runs':>5} {'mean ms':>9} {'min ms':>9} {'max ms':>9}")
+    for name, values in (("cold", cold), ("warm", warm)):
+        ms = [value * 1000 for value in values]
+        print(f"{name:>6} {len(ms):>5} {statistics.mean(ms):>9.1f} {min(ms):>9.1f} {max(ms):>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
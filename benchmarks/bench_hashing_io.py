@@ -0,0 +1,72 @@
+"""
+Hashing throughput across buffer sizes, file sizes and read strategies.
+
+Each file is hashed with `Hashing.hash_file` using the buffered `readinto` path and,
+when requested, the `mmap` path. Unless --cold is given, files are read from the page cache,
+so the figures show the per-call overhead of each buffer size rather than the disk speed.
+
+Usage:
+    python benchmarks/bench_hashing_io.py [--file-sizes-mb 1 64 512] [--bufsizes-kb 4 64 1024 8192] [--cold]
+"""
+
+import argparse
+import os
+import pathlib
+import tempfile
+import time
+
+from omnia.utils import Hashing
+
+
+def make_file(directory: str, size_mb: int) -> pathlib.Path:
+    path = pathlib.Path(directory, f"sample_{size_mb}mb")
+    block = os.urandom(1024 * 1024)
+    with open(path, "wb") as fp:
+        for _ in range(size_mb):
+            fp.write(block)
+    return path
+
+
+def throughput(path: pathlib.Path, repeat: int) -> float:
+    hg = Hashing()
+    size = path.stat().st_size
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        hg.hash_file(path)
+        best = min(best, time.perf_counter() - start)
+    return size / 1e6 / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file-sizes-mb", type=int, nargs="+", default=[1, 64, 512], help="File sizes in MB")
+    parser.add_argument("--bufsizes-kb", type=int, nargs="+", default=[4, 64, 1024, 8192], help="Buffer sizes in KB")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measure, the best is reported")
+    parser.add_argument("--cold", action="store_true", help="Drop the files from the page cache after each read")
+    parser.add_argument("--no-mmap", action="store_true", help="Skip the mmap strategy")
+    args = parser.parse_args()
+
+    Hashing.set_cache(None)
+    strategies = {"readinto": None}
+    if not args.no_mmap:
+        strategies["mmap"] = 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = [make_file(tmp_dir, size_mb) for size_mb in args.file_sizes_mb]
+
+        header = f"{'file':>10} {'strategy':>9} " + " ".join(f"{f'{kb} KB':>10}" for kb in args.bufsizes_kb)
+        print(header)
+        print("-" * len(header))
+        for path in files:
+            for strategy, mmap_threshold in strategies.items():
+                row = []
+                for kb in args.bufsizes_kb:
+                    Hashing.configure(bufsize=kb * 1024, mmap_threshold=mmap_threshold, fadvise=args.cold)
+                    row.append(f"{throughput(path, args.repeat):>10.1f}")
+                print(f"{path.stat().st_size // 1024 // 1024:>7} MB {strategy:>9} " + " ".join(row))
+        print("\nMB/s, higher is better")
+
+
+if __name__ == "__main__":
+    main()
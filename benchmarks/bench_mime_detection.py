@@ -0,0 +1,68 @@
+"""
+Cost of the MIME detection of extensionless files, with and without the MimeDetector caches.
+
+The baseline is the former detection, magic.from_file per file, which opens each file again.
+The detector sniffs the leading bytes read while hashing, with a reusable libmagic handle, and
+sniffs identical heads only once. Half of the files are copies of the other half, as the same
+outputs often are. The files are written to a temporary directory.
+
+Usage:
+    python benchmarks/bench_mime_detection.py [--files 2000] [--repeat 3]
+"""
+
+import argparse
+import gzip
+import pathlib
+import statistics
+import tempfile
+import time
+
+import magic
+
+from omnia.utils.hashing import HEAD_SIZE
+from omnia.utils.mime import MimeDetector
+
+
+def write_files(directory: str, count: int) -> list[tuple[str, bytes]]:
+    """Extensionless gzipped FASTQ files, with their leading bytes as hashing reads them."""
+    files = []
+    for i in range(count):
+        path = pathlib.Path(directory, f"sample_{i}_R1")
+        path.write_bytes(gzip.compress(f"@read{i // 2}\nACGTACGT\n+\nIIIIIIII\n".encode() * 64, mtime=0))
+        with open(path, "rb") as file:
+            files.append((str(path), file.read(HEAD_SIZE)))
+    return files
+
+
+def from_file(files):
+    for path, _ in files:
+        magic.from_file(path, mime=True)
+
+
+def detector(files):
+    MimeDetector._by_signature.clear()
+    for path, head in files:
+        MimeDetector.guess(path, head=head)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=2000, help="Number of files")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of each method")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = write_files(directory, args.files)
+        print(f"{'method':>10} {'runs':>5} {'mean ms':>9} {'us/file':>9}")
+        for name, method in (("from_file", from_file), ("detector", detector)):
+            timings = []
+            for _ in range(args.repeat):
+                begin = time.perf_counter()
+                method(files)
+                timings.append(time.perf_counter() - begin)
+            mean = statistics.mean(timings)
+            print(f"{name:>10} {args.repeat:>5} {mean * 1000:>9.1f} {mean / args.files * 1e6:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
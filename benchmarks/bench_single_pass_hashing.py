@@ -0,0 +1,81 @@
+"""
+Bytes read per registered file: two-pass vs single-pass hashing.
+
+The two-pass path mimics the former behaviour, where the unique key and the checksum
+were computed by two independent reads of the file. The single-pass path is what
+`PosixDataObject` does now: the content digest is computed once and reused.
+
+Bytes are counted with the `rchar` field of /proc/self/io, so the benchmark runs on Linux only.
+
+Usage:
+    python benchmarks/bench_single_pass_hashing.py [--size-mb 256] [--files 4]
+"""
+
+import argparse
+import os
+import pathlib
+import sys
+import tempfile
+import time
+
+from omnia.models.data_object import PosixDataObject
+from omnia.utils import Hashing, guess_mimetype
+
+PROC_IO = pathlib.Path("/proc/self/io")
+
+
+def bytes_read() -> int:
+    for line in PROC_IO.read_text().splitlines():
+        key, value = line.split(":")
+        if key == "rchar":
+            return int(value)
+    raise RuntimeError("rchar not found in /proc/self/io")
+
+
+def two_pass(path: str) -> None:
+    hg = Hashing()
+    hg.compute_hash(fpath=path)
+    hg.compute_file_hash(path)
+    os.stat(path)
+    guess_mimetype(path)
+
+
+def single_pass(path: str) -> None:
+    PosixDataObject(path=path).compute()
+
+
+def measure(func, paths: list[str]) -> tuple[int, float]:
+    start_bytes, start_time = bytes_read(), time.perf_counter()
+    for path in paths:
+        func(path)
+    return bytes_read() - start_bytes, time.perf_counter() - start_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=256, help="Size of each file in MB")
+    parser.add_argument("--files", type=int, default=4, help="Number of files")
+    args = parser.parse_args()
+
+    if not PROC_IO.exists():
+        sys.exit("This benchmark needs /proc/self/io")
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(args.files):
+            path = pathlib.Path(tmp_dir, f"sample_{i}")
+            with open(path, "wb") as fp:
+                for _ in range(args.size_mb):
+                    fp.write(os.urandom(1024 * 1024))
+            paths.append(str(path))
+
+        total = size * args.files
+        print(f"{args.files} files of {args.size_mb} MB")
+        for name, func in (("two-pass", two_pass), ("single-pass", single_pass)):
+            nbytes, elapsed = measure(func, paths)
+            print(f"{name:>12}: {nbytes / total:.2f}x file size read, {total / 1e6 / elapsed:.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,38 +3,46 @@ from pathlib import Path
 
 from cloup import Context, HelpFormatter, HelpTheme, Style
 from loguru import logger as a_logger
-from platformdirs import user_config_dir, user_data_dir, user_log_dir
+from platformdirs import user_cache_dir, user_config_dir, user_data_dir, user_log_dir
 
 __all__ = [
     "__appname__",
     "__version__",
+    "cache_dir",
     "config_dir",
     "data_dir",
+    "hash_cache_path",
     "log_file",
     "config_filename",
     "context_settings",
     "logger",
     "mongo_db_path",
     "mongo_db_logpath",
+    "mongo_db_pidfile",
+    "sqlite_db_path",
 ]
 
 __appname__ = __name__
 __version__ = importlib.metadata.version(__appname__)
 
+# The directories are created by the code writing to them, not on import
 log_dir = Path(user_log_dir(__appname__))
-log_dir.mkdir(parents=True, exist_ok=True)
 log_file = log_dir / f"{__appname__}.log"
 
 config_dir = Path(user_config_dir(__appname__))
-config_dir.mkdir(parents=True, exist_ok=True)
 config_filename = "config.yaml"
 
+cache_dir = Path(user_cache_dir(__appname__))
+
 data_dir = Path(user_data_dir(__appname__)) / "data"
-data_dir.mkdir(parents=True, exist_ok=True)
+
+hash_cache_path = data_dir / "hash_cache.sqlite"
 
 mongo_db_path = data_dir / "mongo_db"
-mongo_db_path.mkdir(parents=True, exist_ok=True)
 mongo_db_logpath = log_dir / "mongod.log"
+mongo_db_pidfile = data_dir / "mongod.pid"
+
+sqlite_db_path = data_dir / "omnia.sqlite"
 
 # Check the docs for all available arguments of HelpFormatter and HelpTheme.
 formatter_settings = HelpFormatter.settings(
@@ -1,16 +1,34 @@
-from .co import add_collection, delete_collection, edit_collection
-from .dataset import dataset_registration, dataset_retrieval
-from .info import info
-from .list import list_metadata
-from .serve import serve
+import importlib
+
+# The subcommands are imported on first access, as they pull in heavy dependencies
+_commands = {
+    "add_collection": ".co",
+    "delete_collection": ".co",
+    "edit_collection": ".co",
+    "dataset_registration": ".dataset",
+    "dataset_retrieval": ".dataset",
+    "dataset_sync": ".dataset",
+    "db": ".db",
+    "info": ".info",
+    "list_metadata": ".list",
+    "serve": ".serve",
+}
 
 __all__ = [
     "info",
+    "db",
     "dataset_retrieval",
     "dataset_registration",
+    "dataset_sync",
     "add_collection",
     "delete_collection",
     "edit_collection",
     "serve",
     "list_metadata",
 ]
+
+
+def __getattr__(name):
+    if name in _commands:
+        return getattr(importlib.import_module(_commands[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
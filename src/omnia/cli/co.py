@@ -46,10 +46,13 @@ def edit_collection(
             touched = True
         if notes is not None:
             try:
-                json.loads(notes)
+                notes = json.loads(notes)
+            except json.JSONDecodeError:
+                notes = None
+            if isinstance(notes, dict):
                 collection.mdb_obj.notes = notes
                 touched = True
-            except json.JSONDecodeError:
+            else:
                 print('Invalid JSON format for notes. It should be like this: \'{"key": "value"}\'. Notes not updated.')
 
         if not touched:
@@ -1,8 +1,14 @@
-import glob
 from typing import Any
 
+import click
+import cloup
+
+from omnia.engines.commons import DEFAULT_WORKERS
+from omnia.engines.registration import DEFAULT_BATCH_SIZE
 from omnia.models.data_collection import Datacatalog, DataCollection
 from omnia.models.data_object import PosixDataObject
+from omnia.mongo.mixin import QueryResult
+from omnia.storage import get_collection
 
 
 def get_data_collection(name: str) -> DataCollection | None:
@@ -33,12 +39,43 @@ def get_datacatalog(name: str) -> Datacatalog | None:
     return dc.mdb_obj if dc else None
 
 
-def get_data_object(item: str) -> PosixDataObject | None:
-    """Get a PosixDataObject by its path."""
-    data_object_obj = PosixDataObject().query(path=item)
+def get_data_object(item: str) -> QueryResult | None:
+    """
+    Get the datasets registered with the given path.
+
+    POSIX paths are case-sensitive, so they are matched exactly and the lookup is served by the path index.
+    """
+    data_object_obj = PosixDataObject().query(case_sensitive=True, path=item)
     return data_object_obj if data_object_obj else None
 
 
+class CollectionNameResolver:
+    """
+    Resolve Datacatalog ids to collection names, caching them for the whole invocation.
+
+    The ids not resolved yet are fetched with a single $in query, whatever their number.
+    """
+
+    def __init__(self):
+        self._names = {}
+
+    def resolve(self, ids: list) -> list[str]:
+        """
+        Get the names of the collections with the given ids.
+
+        Parameters:
+        ids (list): The ids of the Datacatalogs.
+
+        Returns:
+        list[str]: The names of the collections, in the same order. Ids without a collection are returned as strings.
+        """
+        missing = [coll_id for coll_id in ids if coll_id not in self._names]
+        if missing:
+            for doc in get_collection(Datacatalog).find({"_id": {"$in": missing}}, {"name": 1}):
+                self._names[doc["_id"]] = doc["name"]
+        return [self._names.get(coll_id, str(coll_id)) for coll_id in ids]
+
+
 def is_collection_or_data_object(
     item: str,
 ) -> (
@@ -71,20 +108,31 @@ def is_collection_or_data_object(
     return False, bool(data_object_obj), None, data_object_obj
 
 
-def match_files(search_path: str) -> list[str]:
-    """
-    Match files using a glob pattern.
-
-    Args:
-        search_path: String to search for files.
-
-    Returns:
-        List of matching file paths
-    """
-    # Use glob to find all files matching the pattern recursively
-    files = glob.glob(search_path, recursive=True)
-
-    # Sort the files to match the behavior of `ls`
-    files.sort()
-
-    return files
+# Options selecting the files of a source
+scan_options = cloup.option_group(
+    "Scan options",
+    cloup.option("--include", multiple=True, help="Only files whose name matches this glob pattern"),
+    cloup.option("--exclude", multiple=True, help="Skip files and directories whose name matches this glob pattern"),
+    cloup.option("--max-depth", type=click.IntRange(min=0), help="Maximum depth of the files below the source"),
+)
+
+# Options tuning the registration pipeline
+registration_options = cloup.option_group(
+    "Registration options",
+    cloup.option(
+        "-w",
+        "--workers",
+        type=click.IntRange(min=1),
+        default=DEFAULT_WORKERS,
+        show_default=True,
+        help="Number of processes computing file hashes",
+    ),
+    cloup.option(
+        "-b",
+        "--batch-size",
+        type=click.IntRange(min=1),
+        default=DEFAULT_BATCH_SIZE,
+        show_default=True,
+        help="Number of files per database round trip",
+    ),
+)
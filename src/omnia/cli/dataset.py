@@ -1,10 +1,15 @@
+import sys
+
 import click
 import cloup
 
-from omnia.cli.commons import get_data_object, get_datacatalog, match_files
-from omnia.models.data_object import PosixDataObject
+from omnia.cli.commons import get_datacatalog, registration_options, scan_options
+from omnia.engines.export import DEFAULT_CURSOR_BATCH_SIZE, EXPORT_FORMATS, WRITE_BUFFER_SIZE, DatasetExporter
+from omnia.engines.registration import RegistrationPipeline
+from omnia.engines.sync import SyncPipeline
 from omnia.mongo.connection_manager import get_mec
 from omnia.mongo.mongo_manager import get_mongo_uri
+from omnia.utils import FileScanner
 
 HELP_DOC_REG = """
 Register datasets to an Omnia collection.
@@ -12,19 +17,19 @@ Register datasets to an Omnia collection.
 
 
 @cloup.command("reg", no_args_is_help=True, help=HELP_DOC_REG)
-@cloup.argument("source", help="Input path")
+@cloup.argument("source", help="Input directory, file or glob pattern")
 @cloup.argument("collection-name", help="The collection's name to register files into")
 @cloup.option("-k", "--skip-metadata-computation", is_flag=True, help="Skip metadata computation")
 @cloup.option("-f", "--force", is_flag=True, help="Force registration without prompting")
+@scan_options
+@registration_options
 @click.pass_context
-def dataset_registration(ctx, source, collection_name, skip_metadata_computation, force):
+def dataset_registration(
+    ctx, source, collection_name, skip_metadata_computation, force, include, exclude, max_depth, workers, batch_size
+):
     """Register datasets to an Omnia collection"""
-
-    file_paths = match_files(source)
-    if not file_paths:
-        print("No files found matching the pattern.")
-        return
-    print(f"{len(file_paths)} files to register")
+    # Files are streamed to the registration pipeline while the tree is walked
+    scanner = FileScanner(source, include=include, exclude=exclude, max_depth=max_depth)
 
     compute_metadata = not skip_metadata_computation
 
@@ -35,42 +40,43 @@ def dataset_registration(ctx, source, collection_name, skip_metadata_computation
             print(f"Datacatalog for collection '{collection_name}' not found.")
             return
 
-        # Print the results
-        for file_path in file_paths:
-            pdo = get_data_object(file_path)
-
-            if not pdo:
-                pdo_data = {
-                    "path": str(file_path),
-                    "included_in_datacatalog": [datacatalog],
-                }
-                pdo = PosixDataObject(uri=mongo_uri, **pdo_data)
-
-                if compute_metadata:
-                    pdo.compute()
-                pdo.save()
-
-            else:
-                dc_present = datacatalog in pdo.mdb_obj.included_in_datacatalog
-                match (dc_present, force):
-                    case (False, _):
-                        # https://docs.mongoengine.org/guide/defining-documents.html#many-to-many-with-listfields
-                        pdo.update(push__included_in_datacatalog=datacatalog)
-                    case (True, True):
-                        pdo.compute().update()
-                    case (True, False):
-                        print(f"File {file_path} already registered. Use --force to overwrite.")
+        pipeline = RegistrationPipeline(
+            datacatalog, compute_metadata=compute_metadata, force=force, workers=workers, batch_size=batch_size
+        )
+        stats = pipeline.run(scanner)
+        if not stats.processed:
+            print("No files found matching the pattern.")
+            return
+        print(stats.summary())
+        if stats.skipped:
+            print(f"{stats.skipped} files already registered were skipped. Use --force to overwrite them.")
 
 
 HELP_DOC_GET = """
 Get a list of dataset paths from an Omnia collection.
+The datasets are streamed from the database to a file or to the standard output.
 """
 
 
 @cloup.command("get", no_args_is_help=True, help=HELP_DOC_GET)
 @cloup.argument("collection-name", help="The collection's name")
+@cloup.option(
+    "-o",
+    "--output",
+    type=click.Path(dir_okay=False, allow_dash=True),
+    help="Output file, '-' for the standard output [default: dataset_paths_from_<collection>.<format>]",
+)
+@cloup.option("-f", "--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="txt", show_default=True)
+@cloup.option("--fields", default="path", show_default=True, help="Comma separated list of the fields to export")
+@cloup.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=DEFAULT_CURSOR_BATCH_SIZE,
+    show_default=True,
+    help="Number of datasets fetched per round trip to the database",
+)
 @click.pass_context
-def dataset_retrieval(ctx, collection_name):
+def dataset_retrieval(ctx, collection_name, output, fmt, fields, batch_size):
     """
     Get a list of dataset paths from an Omnia collection.
     """
@@ -78,17 +84,55 @@ def dataset_retrieval(ctx, collection_name):
 
     with get_mec(uri=mongo_uri):
         datacatalog = get_datacatalog(collection_name)
+        if not datacatalog:
+            print(f"Datacatalog for collection '{collection_name}' not found.")
+            return
+
+        exporter = DatasetExporter(
+            datacatalog, fmt=fmt, fields=[field.strip() for field in fields.split(",")], batch_size=batch_size
+        )
+        if output == "-":
+            exporter.export(sys.stdout)
+            return
+
+        filename = output or f"dataset_paths_from_{datacatalog.name}.{fmt}"
+        with open(filename, "w", buffering=WRITE_BUFFER_SIZE, newline="") as file:
+            count = exporter.export(file)
+
+        print(f"{count} datasets have been written to {filename}")
+
 
-        pdos = PosixDataObject().query(included_in_datacatalog=datacatalog)
+HELP_DOC_SYNC = """
+Synchronise an Omnia collection with a directory tree or a glob pattern.
+Only new and modified files are hashed.
+"""
+
+
+@cloup.command("sync", no_args_is_help=True, help=HELP_DOC_SYNC)
+@cloup.argument("source", help="Input directory or glob pattern")
+@cloup.argument("collection-name", help="The collection's name to synchronise")
+@cloup.option("--prune", is_flag=True, help="Remove from the collection the files no longer found")
+@cloup.option("-n", "--dry-run", is_flag=True, help="Only report the differences")
+@scan_options
+@registration_options
+@click.pass_context
+def dataset_sync(ctx, source, collection_name, prune, dry_run, include, exclude, max_depth, workers, batch_size):
+    """Synchronise an Omnia collection with a directory tree"""
+    scanner = FileScanner(source, include=include, exclude=exclude, max_depth=max_depth)
+
+    mongo_uri = get_mongo_uri(ctx)
+    with get_mec(uri=mongo_uri):
+        datacatalog = get_datacatalog(collection_name)
+        if not datacatalog:
+            print(f"Datacatalog for collection '{collection_name}' not found.")
+            return
 
-        # Open a file in write mode
-        filename = f"dataset_paths_from_{datacatalog.name}.txt"
-        with open(filename, "w") as file:
-            print(f"Retrieving {len(pdos)} paths from {datacatalog.name}...")
-            # Iterate over the PosixDataObject instances
-            for pdo in pdos:
-                # Get the path and write it to the file
-                path = pdo.get("path")
-                file.write(path + "\n")
+        pipeline = SyncPipeline(datacatalog, prune=prune, dry_run=dry_run, workers=workers, batch_size=batch_size)
+        stats = pipeline.run(scanner, scanner.matches)
 
-        print(f"Paths have been written to {filename}")
+        for path in pipeline.changed_paths:
+            print(f"Changed: {path}")
+        action = "Removed" if prune and not dry_run else "Vanished"
+        for path in pipeline.vanished_paths:
+            print(f"{action}: {path}")
+        print(stats.summary())
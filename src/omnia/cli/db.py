@@ -0,0 +1,49 @@
+import click
+import cloup
+
+from omnia.mongo.connection_manager import get_mec
+from omnia.mongo.indexes import ensure_indexes, explain_queries
+from omnia.mongo.mongo_manager import MongoDBManager, get_mongo_uri
+from omnia.storage import get_store
+
+
+@cloup.group("db", help="Manage the database.")
+def db():
+    pass
+
+
+HELP_DOC_ENSURE_INDEXES = """
+Create the missing indexes and show how the main queries use them.
+The notes stored as JSON strings by older versions are converted into subdocuments, so that
+they can be queried.
+A COLLSCAN stage means that the query scans the whole collection.
+"""
+
+
+@db.command("ensure-indexes", help=HELP_DOC_ENSURE_INDEXES)
+@click.pass_context
+def db_ensure_indexes(ctx):
+    """Create the missing indexes and report the query plans"""
+    mongo_uri = get_mongo_uri(ctx)
+
+    with get_mec(uri=mongo_uri):
+        for collection, indexes in ensure_indexes().items():
+            print(f"{collection} indexes:")
+            for index in indexes:
+                print(f"  - {index}")
+
+        # The query plans are the ones of MongoDB
+        if get_store() is not None:
+            return
+        print("Query plans:")
+        for query, plan in explain_queries().items():
+            print(f"  - {query}: {plan}")
+
+
+@db.command("stop", help="Stop the embedded MongoDB server left running with --mongo-keep-alive.")
+def db_stop():
+    """Stop the embedded MongoDB server"""
+    if MongoDBManager().stop(force=True):
+        print("The embedded MongoDB server has been stopped")
+    else:
+        print("No embedded MongoDB server is running")
@@ -1,13 +1,249 @@
+import asyncio
 import json
+import signal
 import urllib
+import zlib
+from collections.abc import AsyncIterable, AsyncIterator, Callable
+from contextlib import asynccontextmanager, suppress
+from typing import Annotated
 
 from bson import ObjectId, json_util
-from fastapi import FastAPI, HTTPException, Request
-from pymongo import MongoClient
+from bson.errors import BSONError, InvalidId
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pymongo import AsyncMongoClient, DeleteOne, InsertOne, UpdateOne
+from pymongo.asynchronous.database import AsyncDatabase
+from pymongo.errors import BulkWriteError, PyMongoError
 
+from omnia import logger
+from omnia.utils.response_cache import CachedResponse, ResponseCache
 
-def create_app(mongo_uri: str, database_name: str):
-    app = FastAPI()
+
+def get_database(request: Request) -> AsyncDatabase:
+    """Dependency returning the database of the client opened by the application lifespan."""
+    return request.app.state.db
+
+
+Database = Annotated[AsyncDatabase, Depends(get_database)]
+
+# Documents per page when listing a collection, 0 streams the whole collection
+DEFAULT_PAGE_SIZE = 1000
+# Documents fetched per round trip while streaming a page
+CURSOR_BATCH_SIZE = 1000
+DEFAULT_FIELDS = "path,mimetype"
+BULK_OPERATIONS = ("insert", "update", "upsert", "delete")
+# Operations sent to the server per bulk write
+BULK_BATCH_SIZE = 1000
+# Maximum size in bytes of the body of a bulk request, as received and once decompressed
+MAX_BULK_BYTES = 256 * 1024 * 1024
+MAX_BULK_DECOMPRESSED_BYTES = 1024 * 1024 * 1024
+# Totals reported by bulk requests, from the fields of the bulk write results
+BULK_COUNTS = {
+    "inserted": "nInserted",
+    "matched": "nMatched",
+    "modified": "nModified",
+    "upserted": "nUpserted",
+    "deleted": "nRemoved",
+}
+
+
+def get_projection(fields: str) -> dict:
+    """Projection of a comma separated list of fields, always including the _id used as pagination key."""
+    projection = {field.strip(): 1 for field in fields.split(",") if field.strip()}
+    projection["_id"] = 1
+    return projection
+
+
+def get_keyset_filter(after: str | None) -> dict:
+    """Filter of the documents following the given _id, in _id order."""
+    if after is None:
+        return {}
+    try:
+        return {"_id": {"$gt": ObjectId(after)}}
+    except InvalidId as e:
+        raise HTTPException(status_code=400, detail=f"Invalid document id: {after}") from e
+
+
+def to_ndjson(document: dict) -> str:
+    """Serialise a document as a JSON line, ObjectIds and dates as strings."""
+    return json.dumps(document, default=str) + "\n"
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header matches the entity tag, with the weak comparison."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+def cached_response(request: Request, entry: CachedResponse) -> Response:
+    """The cached body with its ETag, or a 304 if the client already has it."""
+    headers = {"ETag": entry.etag}
+    if etag_matches(request.headers.get("if-none-match"), entry.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+async def watch_changes(db: AsyncDatabase, cache: ResponseCache) -> None:
+    """Invalidate the cached responses on the changes made by any client, as long as the change stream is open."""
+    try:
+        async with await db.watch() as stream:
+            async for change in stream:
+                # Events without a collection, such as dropDatabase, invalidate the whole cache
+                cache.invalidate(change.get("ns", {}).get("coll"))
+    except PyMongoError as e:
+        cache.invalidate()
+        logger.warning(f"Change stream closed, the response cache is invalidated only by the API writes: {e}")
+
+
+class BulkBodyError(Exception):
+    """The body of a bulk request can't be read to its end, as it is invalid or too large."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes],
+    gzipped: bool = False,
+    max_bytes: int | None = None,
+    max_decompressed_bytes: int | None = None,
+) -> AsyncIterator[bytes]:
+    """
+    Split a stream of bytes into lines, decompressing it on the fly if gzipped.
+
+    Raises:
+        BulkBodyError: If the gzip stream is invalid or truncated, or if the body is larger than
+                       max_bytes or than max_decompressed_bytes once decompressed. The lines read
+                       before have been yielded.
+    """
+    max_bytes = MAX_BULK_BYTES if max_bytes is None else max_bytes
+    max_decompressed_bytes = MAX_BULK_DECOMPRESSED_BYTES if max_decompressed_bytes is None else max_decompressed_bytes
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    received = decompressed = 0
+    pending = b""
+    async for chunk in chunks:
+        received += len(chunk)
+        if received > max_bytes:
+            raise BulkBodyError(f"Body larger than {max_bytes} bytes", status_code=413)
+        if decompressor:
+            try:
+                # Decompressing one byte more than allowed is enough to tell that the body is too large
+                chunk = decompressor.decompress(chunk, max_decompressed_bytes - decompressed + 1)
+            except zlib.error as e:
+                raise BulkBodyError(f"Invalid gzip body: {e}") from e
+            decompressed += len(chunk)
+            if decompressed > max_decompressed_bytes:
+                raise BulkBodyError(f"Body larger than {max_decompressed_bytes} bytes once decompressed", 413)
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+    if decompressor and not decompressor.eof:
+        raise BulkBodyError("Invalid gzip body: truncated stream")
+    yield pending
+
+
+def parse_bulk_operation(line: bytes) -> tuple[str, InsertOne | UpdateOne | DeleteOne, dict | None]:
+    """
+    Parse a line of a bulk request, in MongoDB Extended JSON so that ObjectIds can be given as {"$oid": ...}.
+
+    The operations are:
+        {"op": "insert", "document": {...}}
+        {"op": "update" | "upsert", "filter": {...}, "update": {...}}
+        {"op": "delete", "filter": {...}}
+    An update without operators is applied as $set, like PUT does.
+
+    Returns:
+        The name of the operation, the write request and the inserted document, if any.
+
+    Raises:
+        ValueError, BSONError: If the line is not a valid operation.
+    """
+    item = json_util.loads(line)
+    if not isinstance(item, dict):
+        raise ValueError("An operation must be a JSON object")
+    op = item.get("op")
+    if op not in BULK_OPERATIONS:
+        raise ValueError(f"Unknown operation: {op}, it must be one of {', '.join(BULK_OPERATIONS)}")
+
+    if op == "insert":
+        document = item.get("document")
+        if not isinstance(document, dict):
+            raise ValueError("An insert needs a document")
+        return op, InsertOne(document), document
+
+    query = item.get("filter")
+    if not isinstance(query, dict) or not query:
+        raise ValueError(f"An {op} needs a non-empty filter")
+    if op == "delete":
+        return op, DeleteOne(query), None
+
+    update = item.get("update")
+    if not isinstance(update, dict) or not update:
+        raise ValueError(f"An {op} needs a non-empty update")
+    if not any(key.startswith("$") for key in update):
+        update = {"$set": update}
+    return op, UpdateOne(query, update, upsert=op == "upsert"), None
+
+
+async def write_bulk_batch(collection, batch: list, items: list[dict], counts: dict) -> None:
+    """
+    Run a batch of write requests with an unordered bulk write, recording the outcome of each item.
+
+    Args:
+        collection: The collection to write to.
+        batch: Tuples of the item index, the write request and the inserted document, if any.
+        items: Status of every item of the bulk request.
+        counts: Totals of the bulk request, updated with the ones of the batch.
+    """
+    try:
+        result = (await collection.bulk_write([request for _, request, _ in batch], ordered=False)).bulk_api_result
+    except BulkWriteError as e:
+        result = e.details
+        for error in result["writeErrors"]:
+            items[batch[error["index"]][0]].update(status="error", error=error["errmsg"])
+
+    upserted = {upsert["index"]: upsert["_id"] for upsert in result.get("upserted", [])}
+    for position, (index, _, document) in enumerate(batch):
+        item = items[index]
+        if item["status"] != "ok":
+            continue
+        if document is not None:
+            item["_id"] = str(document["_id"])
+        elif position in upserted:
+            item["_id"] = str(upserted[position])
+    for key, count_key in BULK_COUNTS.items():
+        counts[key] += result.get(count_key, 0)
+
+
+def create_app(
+    mongo_uri: str,
+    database_name: str,
+    client_options: dict | None = None,
+    cache: ResponseCache | None = None,
+    watch: bool = False,
+    on_reload: Callable[[], None] | None = None,
+):
+    """
+    Create the REST API application.
+
+    The handlers use the asynchronous driver, so a slow query doesn't block the event loop.
+    The client and its connection pool are opened at startup and closed at shutdown.
+
+    Args:
+        mongo_uri: MongoDB connection URI.
+        database_name: Name of the database, overridden by the one in the URI.
+        client_options: Options of the AsyncMongoClient, such as maxPoolSize.
+        cache: Cache of the responses of the read endpoints, invalidated by the write endpoints.
+               If None, a cache with the default settings is used.
+        watch: Whether to also invalidate the cache on the changes made by other clients.
+               It needs a replica set, as it relies on change streams.
+        on_reload: Called from the event loop when the server receives SIGHUP, to reload the configuration.
+    """
+    cache = cache if cache is not None else ResponseCache()
 
     def parse_uri(uri: str) -> tuple[str, str, str]:
         try:
@@ -20,53 +256,151 @@ def create_app(mongo_uri: str, database_name: str):
             raise ValueError(f"Invalid URI: {uri}") from e
 
     scheme, netloc, path = parse_uri(mongo_uri)
-    # Connect to MongoDB
     uri = "://".join([scheme, netloc])
     database_name = path.strip("/")
-    client = MongoClient(uri)
-    db = client[database_name]
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        # Connect to MongoDB
+        client = AsyncMongoClient(uri, **(client_options or {}))
+        await client.aconnect()
+        app.state.db = client[database_name]
+        app.state.cache = cache
+        watcher = asyncio.create_task(watch_changes(app.state.db, cache)) if watch else None
+        reload_signal = getattr(signal, "SIGHUP", None) if on_reload is not None else None
+        if reload_signal is not None:
+            asyncio.get_running_loop().add_signal_handler(reload_signal, on_reload)
+        try:
+            yield
+        finally:
+            if reload_signal is not None:
+                asyncio.get_running_loop().remove_signal_handler(reload_signal)
+            if watcher is not None:
+                watcher.cancel()
+                with suppress(asyncio.CancelledError):
+                    await watcher
+            await client.close()
+
+    app = FastAPI(lifespan=lifespan)
 
     @app.get("/collections")
-    async def get_collections():
-        collections = db.list_collection_names()
-        return {"collections": collections}
+    async def get_collections(request: Request, db: Database):
+        entry = cache.get(("collections",))
+        if entry is None:
+            generation = cache.generation()
+            collections = await db.list_collection_names()
+            body = json.dumps({"collections": collections}).encode()
+            entry = cache.put(("collections",), body, generation=generation)
+        return cached_response(request, entry)
 
     @app.get("/collections/{collection_name}")
-    async def get_documents(collection_name: str):
+    async def get_documents(
+        collection_name: str,
+        db: Database,
+        after: str | None = None,
+        limit: Annotated[int, Query(ge=0)] = DEFAULT_PAGE_SIZE,
+        fields: str = DEFAULT_FIELDS,
+    ):
+        """
+        Stream a page of documents as NDJSON, in _id order.
+
+        The next page starts after the _id of the last line. A page shorter than limit is the last one.
+        """
         collection = db[collection_name]
-        documents = list(collection.find({}, {"path": 1, "mimetype": 1, "_id": 0}))
-        return json.loads(json_util.dumps(documents))
+        cursor = (
+            collection.find(get_keyset_filter(after), get_projection(fields))
+            .sort("_id", 1)
+            .limit(limit)
+            .batch_size(min(limit, CURSOR_BATCH_SIZE) or CURSOR_BATCH_SIZE)
+        )
+
+        async def lines():
+            async for document in cursor:
+                yield to_ndjson(document)
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
 
     @app.post("/collections/{collection_name}")
-    async def insert_document(collection_name: str, request: Request):
+    async def insert_document(collection_name: str, request: Request, db: Database):
         collection = db[collection_name]
         data = await request.json()
-        result = collection.insert_one(data)
+        result = await collection.insert_one(data)
+        cache.invalidate(collection_name)
         return {"inserted_id": str(result.inserted_id)}
 
+    @app.post("/collections/{collection_name}/_bulk")
+    async def bulk_write(collection_name: str, request: Request, db: Database):
+        """
+        Run the NDJSON operations of the request body, possibly gzipped, with unordered bulk writes.
+
+        The response reports the status of each line, in order, and the totals of the writes.
+        If the body can't be read to its end, the lines read before are reported too, with a 400
+        or 413 status: the ones written have an ok status, the others are not written.
+        """
+        collection = db[collection_name]
+        gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+        items, batch = [], []
+        counts = dict.fromkeys(BULK_COUNTS, 0)
+        try:
+            async for line in iter_lines(request.stream(), gzipped=gzipped):
+                if not line.strip():
+                    continue
+                try:
+                    op, write_request, document = parse_bulk_operation(line)
+                except (ValueError, BSONError) as e:
+                    items.append({"status": "error", "error": str(e)})
+                    continue
+                items.append({"op": op, "status": "ok"})
+                batch.append((len(items) - 1, write_request, document))
+                if len(batch) >= BULK_BATCH_SIZE:
+                    await write_bulk_batch(collection, batch, items, counts)
+                    batch = []
+            if batch:
+                await write_bulk_batch(collection, batch, items, counts)
+        except BulkBodyError as e:
+            # The operations of the unfinished batch are dropped, so that the items report what was written
+            for index, _, _ in batch:
+                items[index].update(status="error", error="Not written, the request body could not be read to its end")
+            content = {"detail": str(e), "errors": True, **counts, "items": items}
+            return JSONResponse(status_code=e.status_code, content=content)
+        finally:
+            cache.invalidate(collection_name)
+
+        return {"errors": any(item["status"] != "ok" for item in items), **counts, "items": items}
+
     @app.put("/collections/{collection_name}/{document_id}")
-    async def update_document(collection_name: str, document_id: str, request: Request):
+    async def update_document(collection_name: str, document_id: str, request: Request, db: Database):
         collection = db[collection_name]
         data = await request.json()
-        result = collection.update_one({"_id": ObjectId(document_id)}, {"$set": data})
+        result = await collection.update_one({"_id": ObjectId(document_id)}, {"$set": data})
+        cache.invalidate(collection_name)
         if result.modified_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
         return {"modified_count": result.modified_count}
 
     @app.delete("/collections/{collection_name}/{document_id}")
-    async def delete_document(collection_name: str, document_id: str):
+    async def delete_document(collection_name: str, document_id: str, db: Database):
         collection = db[collection_name]
-        result = collection.delete_one({"_id": ObjectId(document_id)})
+        result = await collection.delete_one({"_id": ObjectId(document_id)})
+        cache.invalidate(collection_name)
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Document not found")
         return {"deleted_count": result.deleted_count}
 
     @app.get("/collections/{collection_name}/path/{path:path}")
-    async def get_document_by_path(collection_name: str, path: str):
-        collection = db[collection_name]
-        document = collection.find_one({"path": path}, {"path": 1, "mimetype": 1, "_id": 0})
-        if document is None:
-            raise HTTPException(status_code=404, detail="Document not found")
-        return json.loads(json_util.dumps(document))
+    async def get_document_by_path(collection_name: str, path: str, request: Request, db: Database):
+        key = ("path", collection_name, path)
+        entry = cache.get(key)
+        if entry is None:
+            # Read before the query, so that a write during it keeps the document out of the cache
+            generation = cache.generation(collection_name)
+            collection = db[collection_name]
+            document = await collection.find_one({"path": path}, {"path": 1, "mimetype": 1, "_id": 0})
+            if document is None:
+                raise HTTPException(status_code=404, detail="Document not found")
+            entry = cache.put(
+                key, json_util.dumps(document).encode(), collection=collection_name, generation=generation
+            )
+        return cached_response(request, entry)
 
     return app
@@ -0,0 +1,90 @@
+"""
+Group whose subcommands are imported only when they are needed.
+
+Importing a subcommand pulls in its dependencies (the ODM, the MongoDB driver, the web
+framework...), so the group knows its subcommands by name, import path and short help,
+and imports just the invoked one. The help lists them without importing any.
+"""
+
+import importlib
+
+import click
+import cloup
+
+
+class LazyGroup(cloup.Group):
+    """
+    A cloup Group with lazily imported subcommands.
+
+    Subcommands are added by name with the import path of the command, "module:attribute",
+    the short help they are listed with and the aliases they have to be reachable by before
+    being imported. Until then, a placeholder command stands for them in their section.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Import path and section of the subcommands not imported yet, by name
+        self.lazy_commands = {}
+
+    def lazy_section(self, title: str, **commands: tuple[str, str] | tuple[str, str, list[str]]) -> cloup.Section:
+        """
+        Add a section of lazily imported subcommands.
+
+        Args:
+            title: Title of the section in the help.
+            **commands: Import path and short help of each subcommand, with its aliases if any, by name.
+
+        Returns:
+            cloup.Section: The section of the subcommands.
+        """
+        section = cloup.Section(title)
+        self.add_section(section)
+        for name, spec in commands.items():
+            self.add_lazy_command(name, *spec, section=section)
+        return section
+
+    def add_lazy_command(
+        self,
+        name: str,
+        import_path: str,
+        short_help: str,
+        aliases: list[str] = (),
+        section: cloup.Section | None = None,
+    ) -> None:
+        """Add a lazily imported subcommand, optionally to a section."""
+        self.lazy_commands[name] = (import_path, section)
+        placeholder = cloup.Command(name, aliases=list(aliases), help=short_help)
+        self._add_command_to_section(placeholder, name, section)
+        for alias in aliases:
+            self.alias2name[alias] = name
+
+    def _import_command(self, name: str) -> click.Command:
+        import_path, section = self.lazy_commands.pop(name)
+        module_name, attribute = import_path.split(":")
+        cmd = getattr(importlib.import_module(module_name), attribute)
+        if not isinstance(cmd, click.Command):
+            raise TypeError(f"{import_path} is not a click command")
+        self.add_command(cmd, name, fallback_to_default_section=False)
+        # The command takes the place of its placeholder, keeping the order of the section
+        (section or self._default_section).commands[name] = cmd
+        return cmd
+
+    def list_commands(self, ctx: click.Context) -> list[str]:
+        return sorted([*self.commands, *self.lazy_commands])
+
+    def get_command(self, ctx: click.Context, cmd_name: str) -> click.Command | None:
+        if cmd_name in self.lazy_commands:
+            return self._import_command(cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+    def resolve_command_name(self, ctx: click.Context, name: str) -> str | None:
+        if ctx.token_normalize_func:
+            name = ctx.token_normalize_func(name)
+        if name in self.lazy_commands:
+            return name
+        return super().resolve_command_name(ctx, name)
+
+    def handle_bad_command_name(
+        self, bad_name: str, valid_names: list[str], error: click.UsageError
+    ) -> click.UsageError:
+        return super().handle_bad_command_name(bad_name, [*valid_names, *self.lazy_commands], error)
@@ -1,13 +1,15 @@
-import json
-
 import click
 import cloup
 
-from omnia.cli.commons import is_collection_or_data_object
-from omnia.models.data_collection import Datacatalog, DataCollection
-from omnia.models.data_object import PosixDataObject
+from omnia import logger
+from omnia.cli.commons import CollectionNameResolver, is_collection_or_data_object
+from omnia.engines.commons import DEFAULT_WORKERS, EXECUTOR_TYPES
+from omnia.engines.verification import VerificationEngine
+from omnia.models.data_collection import Datacatalog
+from omnia.models.data_object import Dataset, PosixDataObject
 from omnia.mongo.connection_manager import get_mec
 from omnia.mongo.mongo_manager import get_mongo_uri
+from omnia.storage import get_collection
 from omnia.utils import Hashing
 
 
@@ -23,8 +25,31 @@ from omnia.utils import Hashing
     required=False,
     help="Verify Data Object integrity. It works only for Collections.",
 )
+@cloup.option_group(
+    "Verification options",
+    cloup.option(
+        "-j",
+        "--jobs",
+        type=click.IntRange(min=1),
+        default=DEFAULT_WORKERS,
+        show_default=True,
+        help="Number of files verified concurrently",
+    ),
+    cloup.option(
+        "--executor",
+        type=click.Choice(EXECUTOR_TYPES),
+        default="thread",
+        show_default=True,
+        help="Verify files in threads (I/O bound) or processes (CPU bound)",
+    ),
+    cloup.option(
+        "--report",
+        type=click.File("w"),
+        help="Write a JSON line per verified file, and a summary line, to this file ('-' for stdout)",
+    ),
+)
 @click.pass_context
-def list_metadata(ctx: click.Context, source, full_path, verify_checksums) -> None:
+def list_metadata(ctx: click.Context, source, full_path, verify_checksums, jobs, executor, report) -> None:
     """
     List metadata of Data Objects, Collections
 
@@ -33,6 +58,9 @@ def list_metadata(ctx: click.Context, source, full_path, verify_checksums) -> No
         source: Collection's title or Data Object's path
         verify_checksums: flag to verify checksums of Data Objects. It works only for Collections.
         full_path: flag to list full path of data objects in the collections.
+        jobs: number of files verified concurrently.
+        executor: whether to verify files in threads or processes.
+        report: file where to write the JSON lines report of the verification.
     """
     mongo_uri = get_mongo_uri(ctx)
 
@@ -56,24 +84,41 @@ def list_metadata(ctx: click.Context, source, full_path, verify_checksums) -> No
                 if field_name in Datacatalog.json_dict_fields():
                     if field_value:
                         print(f"  - {field_name}:")
-                        field_value = json.loads(field_value)
                         for subk, v in field_value.items():
                             print(f"      - {subk}: {v}")
                         continue
                     print(f"  - {field_name}: {field_value}")
-            print(f"  - objects: {len(PosixDataObject().query(included_in_datacatalog=cobj.mdb_obj))}")
+            stats = Dataset.collection_stats(cobj.mdb_obj)
+            print(f"  - objects: {stats['count']}")
+            print(f"  - total size: {stats['size']} bytes")
+            if stats["last_modified"]:
+                print(f"  - last modified: {stats['last_modified']}")
+            if stats["mimetypes"]:
+                print("  - encoding formats:")
+                for encoding_format, count in stats["mimetypes"].items():
+                    print(f"      - {encoding_format or 'unknown'}: {count}")
 
             if full_path or verify_checksums:
-                dojs = PosixDataObject().query(included_in_datacatalog=cobj.mdb_obj)
-                for pdo in dojs:
-                    formatted_string = f"    - {pdo['path']}"
-                    if verify_checksums:
-                        ck = hg.compute_file_hash(pdo["path"]) == pdo["checksum"]
-                        formatted_string = f"    - {ck} {pdo['path']}"
+                # A single cursor, streamed to the listing or to the verification engine
+                dojs = PosixDataObject().query(included_in_datacatalog=cobj.mdb_obj, projection=("path", "checksum"))
+                if not verify_checksums:
+                    for pdo in dojs:
+                        print(f"    - {pdo['path']}")
+                    return
+
+                engine = VerificationEngine(jobs=jobs, executor_type=executor, report=report)
+                for result in engine.run(dojs):
+                    formatted_string = f"    - {result.ok} {result.path}"
+                    if result.status not in ("ok", "mismatch"):
+                        formatted_string += f" ({result.status})"
                     print(formatted_string)
+                print(engine.stats.summary())
+                if hg.cache is not None:
+                    logger.info(hg.cache.summary())
             return
 
         if data_object_path:
+            collection_names = CollectionNameResolver()
             for pdo in dojs:
                 if verify_checksums:
                     ck = hg.compute_file_hash(pdo["path"]) == pdo["checksum"]
@@ -81,16 +126,12 @@ def list_metadata(ctx: click.Context, source, full_path, verify_checksums) -> No
                 for field_name, field_value in pdo.items():
                     if field_name not in ("_cls", "_id", "uk", "context", "type"):
                         if field_name == "included_in_datacatalog":
-                            collection_names = []
-                            for coll_id in field_value:
-                                coll = DataCollection(pk=coll_id).map()
-                                collection_names.append(coll.desc)
-                            print(f"  - {field_name}: {collection_names}")
+                            print(f"  - {field_name}: {collection_names.resolve(field_value)}")
                             continue
                         print(f"  - {field_name}: {field_value}")
             return
 
-        collections = Datacatalog.objects()
+        collections = list(get_collection(Datacatalog).find({}, {"name": 1}))
         if not collections:
             print("No collections found in the database.")
             return
@@ -99,4 +140,4 @@ def list_metadata(ctx: click.Context, source, full_path, verify_checksums) -> No
         print("=" * 40)
 
         for coll in collections:
-            print(f"- {coll.name}")
+            print(f"- {coll['name']}")
@@ -1,9 +1,12 @@
+from functools import partial
+
 import click
 import cloup
-import uvicorn
 
-from omnia.cli.fast_app import create_app
+from omnia.config.config_manager import ConfigurationManager
 from omnia.mongo.mongo_manager import embedded_mongo, get_mongo_deployment, get_mongo_uri
+from omnia.storage import is_sqlite_uri
+from omnia.utils import ResponseCache
 
 
 class UvicornServer:
@@ -14,6 +17,8 @@ class UvicornServer:
         self.server = None
 
     def __enter__(self):
+        import uvicorn
+
         self.server = uvicorn.Server(config=uvicorn.Config(self.app, host=self.host, port=self.port, log_level="info"))
         return self.server
 
@@ -23,13 +28,47 @@ class UvicornServer:
             self.server = None
 
 
-@cloup.command("serve", no_args_is_help=False, help="Serve the application locally.")
+def reload_configuration(cm: ConfigurationManager, cache: ResponseCache) -> None:
+    """
+    Reload the configuration file and apply the settings of the response cache.
+    The other settings, such as the connection pool ones, are applied when the server restarts.
+    """
+    if cm.reload():
+        api_config = cm.get_api_config
+        cache.configure(
+            ttl=api_config.cache_ttl, max_entries=api_config.cache_max_entries, max_bytes=api_config.cache_max_bytes
+        )
+
+
+@cloup.command(
+    "serve",
+    no_args_is_help=False,
+    help="Serve the application locally. Send SIGHUP to the server to reload the configuration.",
+)
 @click.pass_context
 def serve(ctx):
+    # The web framework is imported only to serve, not to list the commands
+    from omnia.cli.fast_app import create_app
+
+    if is_sqlite_uri(get_mongo_uri(ctx)):
+        raise click.UsageError("The API needs a MongoDB server, it can't serve the embedded SQLite store.")
     with embedded_mongo(ctx):
         mongo_uri = get_mongo_uri(ctx)
         if get_mongo_deployment(ctx) == "embedded":
             print(f"Serving embedded MongoDB at {mongo_uri}...")
-        app = create_app(mongo_uri, "omnia")
+        # The API opens its own asynchronous client, with the pool settings of the configuration
+        cm = ConfigurationManager()
+        api_config = cm.get_api_config
+        cache = ResponseCache(
+            ttl=api_config.cache_ttl, max_entries=api_config.cache_max_entries, max_bytes=api_config.cache_max_bytes
+        )
+        app = create_app(
+            mongo_uri,
+            "omnia",
+            client_options=cm.get_mdbc_options,
+            cache=cache,
+            watch=api_config.watch_changes,
+            on_reload=partial(reload_configuration, cm, cache),
+        )
         with UvicornServer(app) as server:
             server.run()
@@ -1,36 +1,114 @@
+import hashlib
+import os
+import pickle
 from importlib.resources import files
 from pathlib import Path
 from shutil import copyfile
 
-from pydantic import ValidationError
-from ruamel.yaml import YAML
+from pydantic import BaseModel
 
-from .. import __appname__, config_dir, config_filename, logger
+from .. import __appname__, __version__, cache_dir, config_dir, config_filename, logger
 from .config_models import Configuration
 
 
-class SingletonConfigurationManager(type):
-    """Metaclass."""
+def get_snapshot_path(configuration_file: Path) -> Path:
+    """Path of the snapshot of a configuration file, in the cache dir."""
+    digest = hashlib.blake2b(str(configuration_file).encode(), digest_size=8).hexdigest()
+    return cache_dir / f"config-{digest}.pickle"
+
+
+def get_file_stamp(configuration_file: Path) -> tuple[int, int]:
+    """Modification time and size of a file, which change when it is edited."""
+    stat = configuration_file.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def get_models_fingerprint(model: type[BaseModel] = Configuration) -> tuple:
+    """Names of the fields of the configuration models, so that the snapshots of other versions of them are ignored."""
+    fields = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        nested = isinstance(annotation, type) and issubclass(annotation, BaseModel)
+        fields.append((name, get_models_fingerprint(annotation) if nested else ()))
+    return tuple(fields)
+
+
+def load_snapshot(configuration_file: Path, stamp: tuple[int, int]) -> Configuration | None:
+    """Get the validated configuration of a file, if the snapshot of its current version is in the cache."""
+    try:
+        with open(get_snapshot_path(configuration_file), "rb") as file:
+            snapshot = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+    if snapshot.get("key") != (str(configuration_file), stamp, __version__, get_models_fingerprint()):
+        return None
+    return snapshot["config"]
+
+
+def save_snapshot(configuration_file: Path, stamp: tuple[int, int], config: Configuration) -> None:
+    """Cache the validated configuration of a file. Failures are logged, as the cache is only an optimisation."""
+    snapshot_path = get_snapshot_path(configuration_file)
+    snapshot = {"key": (str(configuration_file), stamp, __version__, get_models_fingerprint()), "config": config}
+    try:
+        snapshot_path.parent.mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, so that a concurrent reader never sees a partial file
+        tmp_path = snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as file:
+            pickle.dump(snapshot, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot_path)
+    except OSError as e:
+        logger.debug(f"Configuration snapshot not saved: {e}")
+
+
+class ConfigurationManagerMeta(type):
+    """
+    Metaclass keeping one instance per configuration source, the file and the URI overriding the one it sets.
+
+    Called without arguments, it returns the instance created last, so that the configuration chosen on the
+    command line is the one used by the rest of the process.
+    """
 
     _instances = {}
+    _current = {}
+
+    def __call__(cls, cf=None, uri=None):
+        if cf is None and uri is None and cls in cls._current:
+            return cls._current[cls]
+        key = (cls, str(Path(cf).resolve()) if cf else None, uri)
+        if key not in cls._instances:
+            cls._instances[key] = super().__call__(cf=cf, uri=uri)
+        cls._current[cls] = cls._instances[key]
+        return cls._instances[key]
+
+    def clear_instances(cls):
+        """Forget the instances, so that the next call reads the configuration again."""
+        for key in [key for key in cls._instances if key[0] is cls]:
+            del cls._instances[key]
+        cls._current.pop(cls, None)
 
-    def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super().__call__(*args, **kwargs)
-        return cls._instances[cls]
 
+class ConfigurationManager(metaclass=ConfigurationManagerMeta):
+    """
+    Configuration of Omnia, read from a YAML file.
 
-class ConfigurationManager(metaclass=SingletonConfigurationManager):
-    def __init__(self, **kwargs):
+    The validated configuration is cached in a snapshot keyed by the path and the modification time of the
+    file, so that the YAML file is parsed only after it changes.
+
+    Args:
+        cf: Path of the configuration file. If None, the one in the config dir is used, copied from the
+            package defaults if needed.
+        uri: MongoDB URI overriding the one of the configuration file.
+    """
+
+    def __init__(self, cf=None, uri=None):
         def copy_config_file_from_package(dst):
             package_name = ".".join([__appname__, "config"])
             _from_package = files(package_name).joinpath(config_filename)
             copyfile(_from_package, dst)
 
         # Check if a custom config file is provided
-        custom_config_file = kwargs.get("cf")
-        if custom_config_file:
-            configuration_file = Path(custom_config_file)
+        if cf:
+            configuration_file = Path(cf).resolve()
             if not configuration_file.exists():
                 msg = f"{configuration_file} file not found. Please check the path"
                 logger.error(msg)
@@ -47,22 +125,82 @@ class ConfigurationManager(metaclass=SingletonConfigurationManager):
                 copy_config_file_from_package(configuration_file)
                 logger.warning(f"Configuration file has default values! Update them in {configuration_file}")
 
-        logger.debug(f"Reading configuration from {configuration_file}")
-        yaml = YAML(typ="safe")
-        with open(configuration_file) as file:
-            c = yaml.load(file)
-
+        self.configuration_file = configuration_file
+        self.uri = uri
+        self.stamp = None
         try:
-            config = Configuration(**c)
-        except (ValidationError, TypeError) as e:
+            self._load()
+        except (ValueError, TypeError) as e:
             logger.error(f"Configuration validation error: {e}")
             exit(f"Configuration validation error: {e}")
 
-        # Get database connection settings from kwargs, if not present, use config
+    def _load(self) -> None:
+        stamp = get_file_stamp(self.configuration_file)
+        config = load_snapshot(self.configuration_file, stamp)
+        if config is None:
+            config = self._parse()
+            save_snapshot(self.configuration_file, stamp, config)
+        else:
+            logger.debug(f"Reading configuration from the snapshot of {self.configuration_file}")
+        self.stamp = stamp
+
+        # The URI given to the manager overrides the one of the configuration file
         mdb_connection = config.mdbc
 
-        self.mdbc_uri = kwargs.get("uri") if kwargs.get("uri") is not None else str(mdb_connection.uri)
+        self.mdbc_uri = self.uri if self.uri is not None else str(mdb_connection.uri)
+        self.mdbc_options = mdb_connection.client_options()
+
+        self.hashing_config = config.hashing
+        self.mimetypes_config = config.mimetypes
+        self.api_config = config.api
+
+    def _parse(self) -> Configuration:
+        # Imported only when there is no snapshot of the file
+        from ruamel.yaml import YAML, YAMLError
+
+        logger.debug(f"Reading configuration from {self.configuration_file}")
+        yaml = YAML(typ="safe")
+        with open(self.configuration_file) as file:
+            try:
+                c = yaml.load(file)
+            except YAMLError as e:
+                raise ValueError(f"Invalid YAML: {e}") from e
+        return Configuration(**c)
+
+    def reload(self) -> bool:
+        """
+        Read the configuration file again if it has changed.
+        An invalid configuration is logged and the previous one is kept.
+
+        Returns:
+            bool: Whether the configuration was reloaded.
+        """
+        if get_file_stamp(self.configuration_file) == self.stamp:
+            return False
+        try:
+            self._load()
+        except (ValueError, TypeError) as e:
+            logger.error(f"Configuration validation error, the previous configuration is kept: {e}")
+            return False
+        logger.info(f"Configuration reloaded from {self.configuration_file}")
+        return True
 
     @property
     def get_mdbc_uri(self):
         return self.mdbc_uri
+
+    @property
+    def get_mdbc_options(self):
+        return self.mdbc_options
+
+    @property
+    def get_hashing_config(self):
+        return self.hashing_config
+
+    @property
+    def get_mimetypes_config(self):
+        return self.mimetypes_config
+
+    @property
+    def get_api_config(self):
+        return self.api_config
@@ -1,9 +1,61 @@
-from pydantic import BaseModel, MongoDsn
+from typing import Literal
+
+from pydantic import BaseModel, Field, MongoDsn, NonNegativeFloat, NonNegativeInt, PositiveInt
+
+from ..utils import response_cache
+from ..utils.hash_cache import DEFAULT_MAX_ENTRIES
+from ..utils.hashing import DEFAULT_BUFSIZE, MMAP_THRESHOLD
+from ..utils.mime import DEFAULT_EXTENSIONS
 
 
 class MongoDBConfig(BaseModel):
     uri: MongoDsn
+    max_pool_size: PositiveInt = 100
+    min_pool_size: NonNegativeInt = 0
+    compressors: list[Literal["zstd", "snappy", "zlib"]] = []
+    connect_timeout_ms: PositiveInt = 20000
+    server_selection_timeout_ms: PositiveInt = 30000
+    socket_timeout_ms: PositiveInt | None = None
+    read_preference: Literal["primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"] = "primary"
+    write_concern: NonNegativeInt | Literal["majority"] | None = None
+    journal: bool | None = None
+
+    def client_options(self) -> dict:
+        """Keyword arguments of the MongoClient, the unset ones are left to the driver defaults."""
+        options = {
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "compressors": ",".join(self.compressors) or None,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "readPreference": self.read_preference,
+            "w": self.write_concern,
+            "journal": self.journal,
+        }
+        return {key: value for key, value in options.items() if value is not None}
+
+
+class HashingConfig(BaseModel):
+    bufsize: PositiveInt = DEFAULT_BUFSIZE
+    mmap_threshold: PositiveInt | None = MMAP_THRESHOLD
+    fadvise: bool = True
+    cache_max_entries: PositiveInt = DEFAULT_MAX_ENTRIES
+
+
+class MimeTypesConfig(BaseModel):
+    extensions: dict[str, str] = Field(default_factory=lambda: dict(DEFAULT_EXTENSIONS))
+
+
+class ApiConfig(BaseModel):
+    cache_ttl: NonNegativeFloat = response_cache.DEFAULT_TTL
+    cache_max_entries: NonNegativeInt = response_cache.DEFAULT_MAX_ENTRIES
+    cache_max_bytes: NonNegativeInt = response_cache.DEFAULT_MAX_BYTES
+    watch_changes: bool = False
 
 
 class Configuration(BaseModel):
     mdbc: MongoDBConfig
+    hashing: HashingConfig = HashingConfig()
+    mimetypes: MimeTypesConfig = MimeTypesConfig()
+    api: ApiConfig = ApiConfig()
@@ -0,0 +1,18 @@
+"""
+Batch engines operating on many data objects at once
+"""
+
+from .export import DatasetExporter
+from .registration import RegistrationPipeline, RegistrationStats
+from .sync import SyncPipeline, SyncStats
+from .verification import VerificationEngine, VerificationResult
+
+__all__ = [
+    "DatasetExporter",
+    "RegistrationPipeline",
+    "RegistrationStats",
+    "SyncPipeline",
+    "SyncStats",
+    "VerificationEngine",
+    "VerificationResult",
+]
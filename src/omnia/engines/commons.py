@@ -0,0 +1,80 @@
+"""
+Helpers shared by the engines
+"""
+
+import multiprocessing
+import os
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from omnia.utils import HashCache, Hashing, MimeDetector
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+EXECUTOR_TYPES = ["thread", "process"]
+
+
+def batched(iterable: Iterable, n: int) -> Iterator[list]:
+    """
+    Split an iterable in lists of at most n items.
+
+    Args:
+        iterable: The iterable to split.
+        n: The size of each batch.
+
+    Returns:
+        Iterator over the batches.
+    """
+    if n < 1:
+        raise ValueError("n must be at least one")
+    it = iter(iterable)
+    while batch := list(islice(it, n)):
+        yield batch
+
+
+def is_changed(doc: dict, st: os.stat_result) -> bool:
+    """
+    Whether a file changed since it was registered.
+
+    Datasets registered without modification time and inode are always considered changed.
+
+    Args:
+        doc: The registered dataset, with at least the SYNC_FIELDS.
+        st: The stat result of the file.
+
+    Returns:
+        bool: True if the file must be hashed again.
+    """
+    return (doc.get("size"), doc.get("mtime_ns"), doc.get("inode")) != (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+def init_worker(settings: dict, cache: HashCache | None, mime_settings: dict) -> None:
+    """Set up a worker process with the hashing and MIME detection settings of the parent process."""
+    Hashing.configure(**settings)
+    Hashing.set_cache(cache)
+    MimeDetector.configure(**mime_settings)
+
+
+def get_executor(executor_type: str, workers: int) -> Executor:
+    """
+    Create a pool of workers hashing files with the settings of the current process.
+
+    Args:
+        executor_type: "thread" or "process". Threads suit I/O bound work, processes CPU bound work.
+        workers: Number of workers.
+
+    Returns:
+        Executor: The pool of workers.
+    """
+    match executor_type:
+        case "thread":
+            return ThreadPoolExecutor(max_workers=workers)
+        case "process":
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_worker,
+                initargs=(Hashing.settings(), Hashing.cache, MimeDetector.settings()),
+            )
+        case _:
+            raise ValueError(f"Invalid executor type: {executor_type}")
@@ -0,0 +1,83 @@
+"""
+Streaming export of the datasets of a collection.
+
+Datasets are read from a projected server cursor and written as they arrive, so the
+memory used doesn't depend on the size of the collection and consumers can start
+reading before the export finishes.
+"""
+
+import csv
+import json
+from collections.abc import Sequence
+from typing import TextIO
+
+from omnia.models.data_collection import Datacatalog
+from omnia.models.data_object import Dataset
+from omnia.storage import get_collection
+
+EXPORT_FORMATS = ("txt", "ndjson", "csv")
+# Documents fetched per round trip to the server
+DEFAULT_CURSOR_BATCH_SIZE = 10000
+# Size of the buffer of the output files
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+class DatasetExporter:
+    """
+    Write the datasets of a Datacatalog to a text stream.
+
+    Args:
+        datacatalog: The Datacatalog to export.
+        fmt: One of "txt" (tab separated values, without header), "ndjson" or "csv".
+        fields: The dataset fields to export.
+        batch_size: Number of documents fetched per round trip to the server.
+    """
+
+    def __init__(
+        self,
+        datacatalog: Datacatalog,
+        fmt: str = "txt",
+        fields: Sequence[str] = ("path",),
+        batch_size: int = DEFAULT_CURSOR_BATCH_SIZE,
+    ):
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        self.datacatalog = datacatalog
+        self.fmt = fmt
+        self.fields = tuple(fields)
+        self.batch_size = batch_size
+
+    def cursor(self):
+        """A cursor over the datasets, projected on the exported fields."""
+        return get_collection(Dataset).find(
+            {"included_in_datacatalog": self.datacatalog.pk},
+            projection={**dict.fromkeys(self.fields, 1), "_id": 0},
+            batch_size=self.batch_size,
+        )
+
+    def export(self, stream: TextIO) -> int:
+        """
+        Write the datasets to the stream.
+
+        Args:
+            stream: The text stream to write to.
+
+        Returns:
+            int: The number of datasets written.
+        """
+        count = 0
+        if self.fmt == "csv":
+            writer = csv.writer(stream)
+            writer.writerow(self.fields)
+            for doc in self.cursor():
+                writer.writerow([doc.get(field, "") for field in self.fields])
+                count += 1
+        elif self.fmt == "ndjson":
+            for doc in self.cursor():
+                stream.write(json.dumps(doc, default=str) + "\n")
+                count += 1
+        else:
+            for doc in self.cursor():
+                stream.write("\t".join(str(doc.get(field, "")) for field in self.fields) + "\n")
+                count += 1
+        return count
@@ -0,0 +1,270 @@
+"""
+Pipelined registration of POSIX data objects into a collection.
+
+Files are hashed in a pool of worker processes, existence lookups are batched into a
+single `$in` query per chunk and documents are written with unordered bulk operations.
+While the workers hash a chunk, the results of the previous one are written to the database.
+"""
+
+import datetime
+import os
+import time
+from collections.abc import Iterable
+from concurrent.futures import Executor
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from omnia import logger
+from omnia.engines.commons import DEFAULT_WORKERS, batched, get_executor, is_changed
+from omnia.models.data_collection import Datacatalog
+from omnia.models.data_object import Dataset, PosixDataObject
+from omnia.storage import get_collection
+from omnia.utils import Hashing
+
+DEFAULT_BATCH_SIZE = 500
+
+METADATA_FIELDS = ("uk", "host", "checksum", "size", "encoding_format", "mtime_ns", "inode")
+
+
+def compute_data_object(path: str, compute_metadata: bool = True) -> dict:
+    """
+    Compute the fields of a POSIX data object. It runs in the worker processes.
+
+    Args:
+        path: Path of the file.
+        compute_metadata: Whether to compute checksum, size and encoding format too.
+
+    Returns:
+        dict: path, computed fields, number of bytes of the file, whether its hash was cached
+              and an error message, if any.
+    """
+    try:
+        pdo = PosixDataObject(path=path)
+        if compute_metadata:
+            pdo.compute()
+        fields = {key: pdo.mdb_obj[key] for key in METADATA_FIELDS}
+        file_hash = pdo.file_hash
+        return {"path": path, "fields": fields, "nbytes": file_hash.size, "cached": file_hash.cached, "error": None}
+    except Exception as e:
+        # Whatever the failure, it is reported for the file rather than aborting the whole pool
+        return {"path": path, "fields": None, "nbytes": 0, "cached": False, "error": str(e) or type(e).__name__}
+
+
+class RegistrationStats:
+    """Counters collected during a registration run."""
+
+    def __init__(self):
+        self.registered = 0
+        self.linked = 0
+        self.updated = 0
+        self.skipped = 0
+        self.failed = 0
+        self.nbytes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.start_time = time.perf_counter()
+        self.end_time = None
+
+    @property
+    def processed(self) -> int:
+        return self.registered + self.linked + self.updated + self.skipped + self.failed
+
+    @property
+    def elapsed(self) -> float:
+        end_time = self.end_time if self.end_time is not None else time.perf_counter()
+        return end_time - self.start_time
+
+    @property
+    def files_per_second(self) -> float:
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.nbytes / 1e6 / self.elapsed if self.elapsed > 0 else 0.0
+
+    def stop(self) -> None:
+        self.end_time = time.perf_counter()
+
+    def summary(self) -> str:
+        return (
+            f"{self.processed} files processed in {self.elapsed:.2f}s: "
+            f"{self.registered} registered, {self.linked} linked, {self.updated} updated, "
+            f"{self.skipped} skipped, {self.failed} failed "
+            f"({self.files_per_second:.1f} files/s, {self.mb_per_second:.1f} MB/s). "
+            f"Hash cache: {self.cache_hits} hits, {self.cache_misses} misses"
+        )
+
+
+class _Chunk:
+    """A batch of paths moving through the pipeline."""
+
+    def __init__(self, paths: list[str]):
+        self.paths = paths
+        # path -> _id of the datasets to recompute
+        self.forced = {}
+        # Paths of the recomputed datasets to link to the Datacatalog too
+        self.relinks = set()
+        # _id of the datasets to link to the Datacatalog
+        self.links = []
+        self.results = iter(())
+
+
+class RegistrationPipeline:
+    """
+    Register many POSIX files into a Datacatalog.
+
+    Args:
+        datacatalog: The Datacatalog to register the files into.
+        compute_metadata: Whether to compute checksum, size and encoding format of new files.
+        force: Whether to recompute the metadata of files already registered into the Datacatalog.
+        workers: Number of hashing processes. With one worker, files are hashed in the current process.
+        batch_size: Number of files per database round trip.
+    """
+
+    def __init__(
+        self,
+        datacatalog: Datacatalog,
+        compute_metadata: bool = True,
+        force: bool = False,
+        workers: int = DEFAULT_WORKERS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least one")
+        self.datacatalog = datacatalog
+        self.compute_metadata = compute_metadata
+        self.force = force
+        self.workers = max(1, workers)
+        self.batch_size = batch_size
+        self.stats = RegistrationStats()
+
+    def run(self, paths: Iterable[str | os.PathLike]) -> RegistrationStats:
+        """
+        Register the given paths.
+
+        Args:
+            paths: Paths of the files to register, consumed as a stream.
+
+        Returns:
+            RegistrationStats: counters of the run.
+        """
+        self.stats = RegistrationStats()
+        pool = None
+        if self.workers > 1:
+            pool = get_executor("process", self.workers)
+        try:
+            pending = None
+            for paths_batch in batched(map(os.fspath, paths), self.batch_size):
+                chunk = self._submit(paths_batch, pool)
+                # Write the previous chunk while the workers hash the current one
+                if pending is not None:
+                    self._write(pending)
+                pending = chunk
+            if pending is not None:
+                self._write(pending)
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        self.stats.stop()
+        logger.info(self.stats.summary())
+        return self.stats
+
+    def _submit(self, paths: list[str], pool: Executor | None) -> _Chunk:
+        """Look up which paths are already registered and submit the files to hash."""
+        chunk = _Chunk(paths)
+        catalog_id = self.datacatalog.pk
+
+        projection = {"path": 1, "included_in_datacatalog": 1, "size": 1, "mtime_ns": 1, "inode": 1}
+        existing = get_collection(Dataset).find({"path": {"$in": paths}}, projection)
+        registered = {doc["path"]: doc for doc in existing}
+
+        to_hash = []
+        for path in paths:
+            doc = registered.get(path)
+            if doc is None:
+                to_hash.append(path)
+            elif catalog_id not in doc.get("included_in_datacatalog", []):
+                # A dataset of another Datacatalog is recomputed if the file changed since
+                if self._is_stale(doc, path):
+                    chunk.forced[path] = doc["_id"]
+                    chunk.relinks.add(path)
+                    to_hash.append(path)
+                else:
+                    chunk.links.append(doc["_id"])
+            elif self.force:
+                chunk.forced[path] = doc["_id"]
+                to_hash.append(path)
+            else:
+                self.stats.skipped += 1
+                logger.info(f"File {path} already registered, skipped")
+
+        args = (to_hash, [self.compute_metadata or path in chunk.forced for path in to_hash])
+        if pool is None:
+            chunk.results = map(compute_data_object, *args)
+        else:
+            chunk.results = pool.map(compute_data_object, *args, chunksize=max(1, len(to_hash) // self.workers))
+        return chunk
+
+    @staticmethod
+    def _is_stale(doc: dict, path: str) -> bool:
+        """Whether the file changed since its dataset was computed. Files that can't be stat'ed are hashed to fail."""
+        try:
+            return is_changed(doc, os.stat(path))
+        except OSError:
+            return True
+
+    def _write(self, chunk: _Chunk) -> None:
+        """Collect the hashing results of a chunk and write them with bulk operations."""
+        new_docs, new_paths, updates = [], [], []
+        now = datetime.datetime.now()
+
+        for result in chunk.results:
+            if result["error"]:
+                self.stats.failed += 1
+                logger.error(f"Failed to process {result['path']}: {result['error']}")
+                continue
+            self.stats.nbytes += result["nbytes"]
+            if Hashing.cache is not None:
+                if result["cached"]:
+                    self.stats.cache_hits += 1
+                else:
+                    self.stats.cache_misses += 1
+            if result["path"] in chunk.forced:
+                update = {"$set": dict(result["fields"], date_modified=now)}
+                if result["path"] in chunk.relinks:
+                    update["$addToSet"] = {"included_in_datacatalog": self.datacatalog.pk}
+                updates.append(UpdateOne({"_id": chunk.forced[result["path"]]}, update))
+                continue
+            dataset = Dataset(path=result["path"], protocol="posix", included_in_datacatalog=[self.datacatalog])
+            for key, value in result["fields"].items():
+                setattr(dataset, key, value)
+            dataset.validate()
+            new_docs.append(dataset.to_mongo().to_dict())
+            new_paths.append(result["path"])
+
+        collection = get_collection(Dataset)
+        if new_docs:
+            self.stats.registered += len(new_docs)
+            try:
+                collection.insert_many(new_docs, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    self.stats.registered -= 1
+                    self.stats.failed += 1
+                    logger.error(f"Failed to register {new_paths[error['index']]}: {error.get('errmsg')}")
+        if chunk.links:
+            result = collection.update_many(
+                {"_id": {"$in": chunk.links}}, {"$addToSet": {"included_in_datacatalog": self.datacatalog.pk}}
+            )
+            self.stats.linked += result.modified_count
+        if updates:
+            self.stats.updated += len(updates)
+            try:
+                collection.bulk_write(updates, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    self.stats.updated -= 1
+                    self.stats.failed += 1
+                    logger.error(f"Failed to update a dataset: {error.get('errmsg')}")
+        logger.debug(f"Chunk of {len(chunk.paths)} files written. {self.stats.summary()}")
@@ -0,0 +1,155 @@
+"""
+Incremental synchronisation of a directory tree with a collection.
+
+The files found on disk are compared with the datasets registered into the collection,
+fetched with a single projected query. Only new files and files whose size, modification
+time or inode changed are hashed. Registered paths that are no longer on disk are reported
+and, optionally, removed from the collection.
+"""
+
+import os
+import time
+from collections.abc import Callable, Iterable, Iterator
+
+from omnia import logger
+from omnia.engines.commons import DEFAULT_WORKERS, batched, is_changed
+from omnia.engines.registration import DEFAULT_BATCH_SIZE, RegistrationPipeline
+from omnia.models.data_collection import Datacatalog
+from omnia.models.data_object import Dataset
+from omnia.storage import get_collection
+
+SYNC_FIELDS = ("path", "size", "mtime_ns", "inode")
+
+
+class SyncStats:
+    """Counters collected during a synchronisation run."""
+
+    def __init__(self):
+        self.scanned = 0
+        self.unchanged = 0
+        self.new = 0
+        self.modified = 0
+        self.vanished = 0
+        self.removed = 0
+        self.failed = 0
+        self.registration = None
+        self.start_time = time.perf_counter()
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def summary(self) -> str:
+        summary = (
+            f"{self.scanned} files scanned in {self.elapsed:.2f}s: {self.unchanged} unchanged, {self.new} new, "
+            f"{self.modified} modified, {self.vanished} vanished, {self.removed} removed, {self.failed} failed"
+        )
+        if self.registration is not None:
+            summary += f"\n{self.registration.summary()}"
+        return summary
+
+
+class SyncPipeline:
+    """
+    Synchronise a Datacatalog with the files found on disk.
+
+    Args:
+        datacatalog: The Datacatalog to synchronise.
+        prune: Whether to remove the vanished paths from the Datacatalog.
+               Datasets left without any Datacatalog are deleted.
+        dry_run: Whether to only report the differences, without changing the database.
+        workers: Number of hashing processes.
+        batch_size: Number of files per database round trip.
+    """
+
+    def __init__(
+        self,
+        datacatalog: Datacatalog,
+        prune: bool = False,
+        dry_run: bool = False,
+        workers: int = DEFAULT_WORKERS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ):
+        self.datacatalog = datacatalog
+        self.prune = prune
+        self.dry_run = dry_run
+        self.workers = workers
+        self.batch_size = batch_size
+        self.stats = SyncStats()
+        self.vanished_paths = []
+        # Paths that would be hashed, collected by a dry run
+        self.changed_paths = []
+
+    def run(self, paths: Iterable[str | os.DirEntry], in_scope: Callable[[str], bool] = lambda path: True) -> SyncStats:
+        """
+        Synchronise the Datacatalog with the given paths.
+
+        Args:
+            paths: Paths of the files found on disk, consumed as a stream.
+                   The stat details of os.DirEntry items are reused.
+            in_scope: Whether a registered path belongs to the scanned tree, so that
+                      it is vanished if it isn't among the paths.
+
+        Returns:
+            SyncStats: counters of the run.
+        """
+        self.stats = SyncStats()
+        self.changed_paths = []
+        registered = {
+            doc["path"]: doc
+            for doc in get_collection(Dataset).find(
+                {"included_in_datacatalog": self.datacatalog.pk}, dict.fromkeys(SYNC_FIELDS, 1)
+            )
+        }
+        logger.debug(f"{len(registered)} datasets registered into {self.datacatalog.name}")
+
+        changed = self._diff(paths, registered)
+        if self.dry_run:
+            self.changed_paths = list(changed)
+        else:
+            pipeline = RegistrationPipeline(
+                self.datacatalog, force=True, workers=self.workers, batch_size=self.batch_size
+            )
+            self.stats.registration = pipeline.run(changed)
+
+        # The paths left have not been found on disk
+        vanished = [doc for path, doc in registered.items() if in_scope(path)]
+        self.stats.vanished = len(vanished)
+        self.vanished_paths = [doc["path"] for doc in vanished]
+        if self.prune and not self.dry_run:
+            self._remove([doc["_id"] for doc in vanished])
+
+        logger.info(self.stats.summary())
+        return self.stats
+
+    def _diff(self, paths: Iterable[str | os.DirEntry], registered: dict) -> Iterator[str]:
+        """Yield the paths to hash, removing the paths found from the registered ones."""
+        for entry in paths:
+            self.stats.scanned += 1
+            path = os.fspath(entry)
+            doc = registered.pop(path, None)
+            try:
+                st = entry.stat() if isinstance(entry, os.DirEntry) else os.stat(path)
+            except OSError as e:
+                self.stats.failed += 1
+                logger.error(f"Failed to stat {path}: {e}")
+                continue
+            if doc is None:
+                self.stats.new += 1
+                yield path
+            elif is_changed(doc, st):
+                self.stats.modified += 1
+                yield path
+            else:
+                self.stats.unchanged += 1
+
+    def _remove(self, ids: list) -> None:
+        """Remove datasets from the Datacatalog, deleting the ones left without any Datacatalog."""
+        collection = get_collection(Dataset)
+        for ids_batch in batched(ids, self.batch_size):
+            result = collection.update_many(
+                {"_id": {"$in": ids_batch}}, {"$pull": {"included_in_datacatalog": self.datacatalog.pk}}
+            )
+            self.stats.removed += result.modified_count
+            deleted = collection.delete_many({"_id": {"$in": ids_batch}, "included_in_datacatalog": {"$size": 0}})
+            logger.debug(f"{deleted.deleted_count} datasets deleted, as they are no longer in any collection")
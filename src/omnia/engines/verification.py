@@ -0,0 +1,171 @@
+"""
+Concurrent verification of the checksums of data objects.
+
+Files are hashed by a bounded pool of threads or processes and the results are
+streamed back in completion order, so slow files don't hold back the others.
+"""
+
+import json
+import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import TextIO
+
+from omnia.engines.commons import DEFAULT_WORKERS, get_executor
+from omnia.utils import Hashing
+
+VERIFICATION_STATUSES = ("ok", "mismatch", "missing", "error")
+# Files submitted to the pool per worker, bounding the memory used by pending results
+QUEUE_DEPTH = 4
+
+
+class VerificationResult:
+    """
+    Outcome of the verification of a file.
+
+    Attributes:
+        path (str): Path of the file.
+        expected (str): Checksum registered in the database.
+        actual (str): Checksum of the file on disk, None if it couldn't be computed.
+        status (str): One of "ok", "mismatch", "missing" or "error".
+        elapsed (float): Seconds spent verifying the file.
+        size (int): Size of the file in bytes, None if it couldn't be read.
+        error (str): Error message, if any.
+    """
+
+    def __init__(self, path, expected, actual=None, status="error", elapsed=0.0, size=None, error=None):
+        self.path = path
+        self.expected = expected
+        self.actual = actual
+        self.status = status
+        self.elapsed = elapsed
+        self.size = size
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.status == "ok"
+
+    def to_dict(self) -> dict:
+        return {
+            "path": self.path,
+            "status": self.status,
+            "expected": self.expected,
+            "actual": self.actual,
+            "size": self.size,
+            "elapsed": round(self.elapsed, 6),
+            "error": self.error,
+        }
+
+
+def verify_file(path: str, expected: str | None) -> VerificationResult:
+    """
+    Compare the checksum of a file with the expected one. It runs in the workers.
+
+    Args:
+        path: Path of the file.
+        expected: The checksum registered in the database.
+
+    Returns:
+        VerificationResult: The outcome of the verification.
+    """
+    start = time.perf_counter()
+    try:
+        file_hash = Hashing().hash_file(path)
+    except FileNotFoundError as e:
+        return VerificationResult(path, expected, status="missing", elapsed=time.perf_counter() - start, error=str(e))
+    except OSError as e:
+        return VerificationResult(path, expected, status="error", elapsed=time.perf_counter() - start, error=str(e))
+    status = "ok" if file_hash.digest == expected else "mismatch"
+    return VerificationResult(
+        path, expected, file_hash.digest, status, elapsed=time.perf_counter() - start, size=file_hash.size
+    )
+
+
+class VerificationStats:
+    """Counters collected during a verification run."""
+
+    def __init__(self):
+        self.counts = dict.fromkeys(VERIFICATION_STATUSES, 0)
+        self.nbytes = 0
+        self.start_time = time.perf_counter()
+
+    @property
+    def verified(self) -> int:
+        return sum(self.counts.values())
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start_time
+
+    def add(self, result: VerificationResult) -> None:
+        self.counts[result.status] += 1
+        self.nbytes += result.size or 0
+
+    def to_dict(self) -> dict:
+        elapsed = self.elapsed
+        return {
+            "status": "summary",
+            "verified": self.verified,
+            **self.counts,
+            "bytes": self.nbytes,
+            "elapsed": round(elapsed, 6),
+            "mb_per_second": round(self.nbytes / 1e6 / elapsed, 3) if elapsed > 0 else 0.0,
+        }
+
+    def summary(self) -> str:
+        counts = ", ".join(f"{count} {status}" for status, count in self.counts.items())
+        return f"{self.verified} files verified in {self.elapsed:.2f}s: {counts}"
+
+
+class VerificationEngine:
+    """
+    Verify the checksums of many files concurrently.
+
+    Args:
+        jobs: Number of workers.
+        executor_type: "thread" or "process".
+        report: Text stream where a JSON line is written for each file, and a summary line at the end.
+    """
+
+    def __init__(self, jobs: int = DEFAULT_WORKERS, executor_type: str = "thread", report: TextIO | None = None):
+        self.jobs = max(1, jobs)
+        self.executor_type = executor_type
+        self.report = report
+        self.stats = VerificationStats()
+
+    def run(self, items: Iterable[dict]) -> Iterator[VerificationResult]:
+        """
+        Verify the files, yielding the results as soon as they are ready.
+
+        Args:
+            items: Documents with the "path" and "checksum" of the files.
+
+        Returns:
+            Iterator over the results, in completion order.
+        """
+        self.stats = VerificationStats()
+        items = iter(items)
+        with get_executor(self.executor_type, self.jobs) as pool:
+            pending = set()
+            exhausted = False
+            while pending or not exhausted:
+                while not exhausted and len(pending) < self.jobs * QUEUE_DEPTH:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    pending.add(pool.submit(verify_file, item["path"], item.get("checksum")))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    result = future.result()
+                    self.stats.add(result)
+                    self._write(result.to_dict())
+                    yield result
+        self._write(self.stats.to_dict())
+
+    def _write(self, record: dict) -> None:
+        if self.report is not None:
+            self.report.write(json.dumps(record) + "\n")
@@ -3,18 +3,8 @@ import sys
 import click
 import cloup
 
-from omnia import __appname__, __version__, context_settings, log_file, logger
-from omnia.cli import (
-    add_collection,
-    dataset_registration,
-    dataset_retrieval,
-    delete_collection,
-    edit_collection,
-    info,
-    list_metadata,
-    serve,
-)
-from omnia.config.config_manager import ConfigurationManager
+from omnia import __appname__, __version__, context_settings, hash_cache_path, log_file, logger, sqlite_db_path
+from omnia.cli.lazy_group import LazyGroup
 from omnia.mongo.mongo_manager import mongo_deployment_types
 
 
@@ -53,12 +43,18 @@ def configure_logging(stdout, verbosity, _logger):
 
 
 @cloup.group(
-    name="omnia", show_subcommand_aliases=True, help="Omnia", no_args_is_help=True, context_settings=context_settings
+    name="omnia",
+    cls=LazyGroup,
+    show_subcommand_aliases=True,
+    help="Omnia",
+    no_args_is_help=True,
+    context_settings=context_settings,
 )
 @click.version_option(version=__version__)
 @cloup.option("--verbosity", type=click.Choice(["quiet", "normal", "loud"]), default="normal", help="Set log verbosity")
 @cloup.option("--stdout", is_flag=True, default=False, help="Print logs to the stdout")
 @cloup.option("--configuration_file", help="Configuration file.")
+@cloup.option("--no-hash-cache", is_flag=True, default=False, help="Always read files to compute their hash")
 @cloup.option_group(
     "MongoDB options",
     cloup.option("--mongo-uri", help="URI connection string to reach the MongoDB server."),
@@ -66,27 +62,69 @@ def configure_logging(stdout, verbosity, _logger):
         "--mongo-deployment",
         type=click.Choice(mongo_deployment_types),
         default="embedded",
-        help="Specify the deployment environment for the MongoDB server",
+        help="Specify the deployment environment for the MongoDB server. sqlite stores the documents in an "
+        "embedded SQLite database instead, for offline use.",
+    ),
+    cloup.option(
+        "--mongo-keep-alive",
+        is_flag=True,
+        default=False,
+        help="Leave the embedded MongoDB server running for the next commands. Stop it with omnia db stop.",
     ),
 )
 @click.pass_context
-def cli(ctx, verbosity, stdout, configuration_file, mongo_uri, mongo_deployment):
+def cli(ctx, verbosity, stdout, configuration_file, no_hash_cache, mongo_uri, mongo_deployment, mongo_keep_alive):
+    # Imported here so that --help and --version don't load the configuration models
+    from omnia.config.config_manager import ConfigurationManager
+    from omnia.utils.hash_cache import HashCache
+    from omnia.utils.hashing import Hashing
+    from omnia.utils.mime import MimeDetector
+
     configure_logging(stdout, verbosity, logger)
     logger.info(f"{__appname__.capitalize()} started")
 
+    # The embedded SQLite store is opened like a MongoDB server, through its URI
+    if mongo_deployment == "sqlite" and not mongo_uri:
+        mongo_uri = f"sqlite://{sqlite_db_path}"
+
     ctx.ensure_object(dict)
-    ctx.obj["mongo"] = {"uri": mongo_uri, "deployment": mongo_deployment}
+    ctx.obj["mongo"] = {"uri": mongo_uri, "deployment": mongo_deployment, "keep_alive": mongo_keep_alive}
 
     # Initialize the ConfigurationManager
-    ConfigurationManager(cf=configuration_file, uri=mongo_uri)
+    cm = ConfigurationManager(cf=configuration_file, uri=mongo_uri)
+
+    hashing_config = cm.get_hashing_config
+    Hashing.configure(
+        bufsize=hashing_config.bufsize, mmap_threshold=hashing_config.mmap_threshold, fadvise=hashing_config.fadvise
+    )
+    MimeDetector.configure(extensions=cm.get_mimetypes_config.extensions)
+    if not no_hash_cache:
+        Hashing.set_cache(HashCache(hash_cache_path, max_entries=hashing_config.cache_max_entries))
+
+
+# The short help of the subcommands is repeated here, so that listing them doesn't import them
+cli.lazy_section(
+    "Collections",
+    mkcoll=("omnia.cli.co:add_collection", "Create a new collection in the database.", ["mkdir"]),
+    edit=("omnia.cli.co:edit_collection", "Edit a collection in the database.", ["mv"]),
+    rmcoll=("omnia.cli.co:delete_collection", "Delete a collection from the database.", ["rmdir"]),
+)
+cli.lazy_section(
+    "Datasets",
+    get=("omnia.cli.dataset:dataset_retrieval", "Get a list of dataset paths from an Omnia collection."),
+    reg=("omnia.cli.dataset:dataset_registration", "Register datasets to an Omnia collection."),
+    sync=("omnia.cli.dataset:dataset_sync", "Synchronise an Omnia collection with a directory tree or a glob pattern."),
+)
+cli.lazy_section(
+    "Metadata",
+    ls=("omnia.cli.list:list_metadata", "List metadata of Data Objects, Collections.", ["list"]),
+)
+cli.lazy_section("Database", db=("omnia.cli.db:db", "Manage the database."))
+cli.add_lazy_command("info", "omnia.cli.info:info", "Show Omnia details")
+cli.add_lazy_command("serve", "omnia.cli.serve:serve", "Serve the application locally.")
 
 
 def main():
-    cli.section("Collections", add_collection, edit_collection, delete_collection)
-    cli.section("Datasets", dataset_retrieval, dataset_registration)
-    cli.section("Metadata", list_metadata)
-    cli.add_command(info)
-    cli.add_command(serve)
     logger.remove()
     cli(obj={})
 
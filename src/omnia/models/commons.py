@@ -1,30 +1,88 @@
 import json
 
-from mongoengine import StringField, ValidationError
+from mongoengine import DictField, ValidationError
+
+from omnia import logger
+from omnia.storage import get_store
 
 PROTOCOLS = ("posix", "s3", "https")
+# Collation of the case-insensitive index on paths, queries must use the same one to be served by it
+PATH_COLLATION = {"locale": "en", "strength": 2}
+
+# Document classes whose JSON fields have been migrated, with the collection they were migrated in
+_MIGRATED = {}
+
 
+class JSONField(DictField):
+    """
+    A JSON object stored as a native BSON subdocument, so that its keys can be queried
+    and indexed server-side (e.g. notes__project="X").
+
+    JSON strings are accepted on assignment, and legacy documents storing the object as
+    a JSON string are still read transparently until they are migrated.
+    """
 
-class JSONField(StringField):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    def to_mongo(self, value):
-        if value is not None:
-            try:
-                return json.dumps(value)
-            except TypeError as e:
-                raise ValidationError(f"Invalid JSON value: {e}") from e
-        return value
-
-    def to_python(self, value):
-        if value is not None and isinstance(value, str):
+    @staticmethod
+    def _loads(value):
+        if isinstance(value, str):
             try:
                 return json.loads(value)
             except json.JSONDecodeError as e:
                 raise ValidationError(f"Invalid JSON string: {e}") from e
         return value
 
+    # JSON values hold no documents or references to convert, unlike the values of a DictField
+    def to_mongo(self, value, *args, **kwargs):
+        return self._loads(value)
+
+    def to_python(self, value):
+        return self._loads(value)
+
     def validate(self, value):
-        if value is not None and not isinstance(value, str | dict | list):
-            raise ValidationError("Invalid JSON value")
+        value = self._loads(value)
+        if not isinstance(value, dict):
+            raise ValidationError("Invalid JSON value, it must be a JSON object")
+        super().validate(value)
+
+
+def migrate_json_fields(document_cls) -> int:
+    """
+    Convert the JSON fields stored as strings into subdocuments and ensure a wildcard index on them.
+
+    It runs once per process and collection, the following calls are no-ops.
+
+    Args:
+        document_cls: The Document class to migrate.
+
+    Returns:
+        int: The number of documents migrated.
+    """
+    # The embedded store keeps JSON fields as JSON and has no wildcard indexes
+    if get_store(document_cls) is not None:
+        return 0
+    collection = document_cls._get_collection()
+    if _MIGRATED.get(document_cls) is collection:
+        return 0
+
+    migrated = 0
+    for field in document_cls._fields.values():
+        if not isinstance(field, JSONField):
+            continue
+        for doc in collection.find({field.db_field: {"$type": "string"}}, {field.db_field: 1}):
+            try:
+                value = json.loads(doc[field.db_field])
+            except json.JSONDecodeError:
+                logger.warning(f"Document {doc['_id']} has invalid JSON in {field.name}, not migrated")
+                continue
+            collection.update_one({"_id": doc["_id"]}, {"$set": {field.db_field: value}})
+            migrated += 1
+        # Wildcard indexes can't be declared in the meta indexes of mongoengine
+        collection.create_index([(f"{field.db_field}.$**", 1)])
+
+    if migrated:
+        logger.info(f"{migrated} {document_cls.__name__} documents migrated to native JSON fields")
+    _MIGRATED[document_cls] = collection
+    return migrated
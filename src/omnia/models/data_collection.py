@@ -70,7 +70,7 @@ class Datacatalog(Document):
         """
         Returns a tuple of field names in this metadata class that store JSON-formatted data.
 
-        These fields are stored as strings in MongoDB, where each string contains a valid JSON object.
+        These fields are stored as subdocuments in MongoDB, so that their keys can be queried server-side.
         The purpose of this method is to provide a convenient way to access these JSON-formatted fields.
 
         :return: A tuple of field names (str) that store JSON-formatted data
@@ -1,13 +1,16 @@
 import datetime
 import platform
+from collections import Counter
+from pathlib import Path
 
 from mongoengine import DateTimeField, Document, IntField, ListField, ReferenceField, StringField
 
 from omnia import logger
-from omnia.models.commons import PROTOCOLS, JSONField
+from omnia.models.commons import PATH_COLLATION, PROTOCOLS, JSONField
 from omnia.models.data_collection import Datacatalog
 from omnia.mongo.mixin import MongoMixin
-from omnia.utils import Hashing, get_file_size, guess_mimetype
+from omnia.storage import get_collection, get_store
+from omnia.utils import FileHash, Hashing, guess_mimetype
 
 
 class Dataset(Document):
@@ -24,6 +27,8 @@ class Dataset(Document):
         date_modified (DateTimeField): Date and time when the dataset was last modified.
         path (StringField): Path to the dataset.
         protocol (StringField): Prefix for the dataset, must be one of the predefined choices.
+        mtime_ns (IntField): Modification time of the file in nanoseconds, when the dataset was computed.
+        inode (IntField): Inode number of the file, when the dataset was computed.
     """
 
     # JSON-LD context and type
@@ -41,25 +46,102 @@ class Dataset(Document):
     path = StringField(required=True)
     protocol = StringField(choices=PROTOCOLS)
     size = IntField()
+    mtime_ns = IntField()
+    inode = IntField()
 
     @classmethod
     def json_dict_fields(cls) -> tuple:
         """
         Returns a tuple of field names in this metadata class that store JSON-formatted data.
 
-        These fields are stored as strings in MongoDB, where each string contains a valid JSON object.
+        These fields are stored as subdocuments in MongoDB, so that their keys can be queried server-side.
         The purpose of this method is to provide a convenient way to access these JSON-formatted fields.
 
         :return: A tuple of field names (str) that store JSON-formatted data
         """
         return tuple(field.name for field in cls._fields.values() if isinstance(field, JSONField))
 
-    meta = {"collection": "datasets"}
+    @classmethod
+    def collection_stats(cls, datacatalog: Datacatalog) -> dict:
+        """
+        Compute the statistics of the datasets of a Datacatalog with a single aggregation.
+        In the embedded store, which has no aggregation pipeline, they are computed while reading the datasets.
+
+        Args:
+            datacatalog: The Datacatalog to describe.
+
+        Returns:
+            dict: The number of datasets ("count"), their total size in bytes ("size"),
+                  the latest creation or modification date ("last_modified") and the number
+                  of datasets per encoding format ("mimetypes").
+        """
+        if get_store(cls) is not None:
+            return cls._collection_stats_embedded(datacatalog)
+
+        pipeline = [
+            {"$match": {"included_in_datacatalog": datacatalog.pk}},
+            {
+                "$facet": {
+                    "totals": [
+                        {
+                            "$group": {
+                                "_id": None,
+                                "count": {"$sum": 1},
+                                "size": {"$sum": "$size"},
+                                "last_modified": {"$max": {"$ifNull": ["$date_modified", "$date_created"]}},
+                            }
+                        }
+                    ],
+                    "mimetypes": [
+                        {"$group": {"_id": "$encoding_format", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1, "_id": 1}},
+                    ],
+                }
+            },
+        ]
+        facets = next(cls._get_collection().aggregate(pipeline))
+        totals = facets["totals"][0] if facets["totals"] else {}
+        return {
+            "count": totals.get("count", 0),
+            "size": totals.get("size", 0),
+            "last_modified": totals.get("last_modified"),
+            "mimetypes": {doc["_id"]: doc["count"] for doc in facets["mimetypes"]},
+        }
+
+    @classmethod
+    def _collection_stats_embedded(cls, datacatalog: Datacatalog) -> dict:
+        stats = {"count": 0, "size": 0, "last_modified": None}
+        mimetypes = Counter()
+        projection = {"size": 1, "date_modified": 1, "date_created": 1, "encoding_format": 1}
+        for doc in get_collection(cls).find({"included_in_datacatalog": datacatalog.pk}, projection):
+            stats["count"] += 1
+            stats["size"] += doc.get("size") or 0
+            modified = doc.get("date_modified") or doc.get("date_created")
+            if modified is not None and (stats["last_modified"] is None or modified > stats["last_modified"]):
+                stats["last_modified"] = modified
+            mimetypes[doc.get("encoding_format")] += 1
+        # Sorted as by the aggregation, by decreasing count then by format
+        stats["mimetypes"] = dict(sorted(mimetypes.items(), key=lambda item: (-item[1], str(item[0]))))
+        return stats
+
+    meta = {
+        "collection": "datasets",
+        "indexes": [
+            "path",
+            {"fields": ["path"], "name": "path_ci", "collation": PATH_COLLATION},
+            ("included_in_datacatalog", "path"),
+            "checksum",
+            "host",
+            "encoding_format",
+        ],
+    }
 
 
 class PosixDataObject(MongoMixin):
     """Represents a POSIX data object."""
 
+    collations = {"path": PATH_COLLATION}
+
     def __init__(self, **kwargs):
         """Initialize a PosixDataObject instance.
 
@@ -69,6 +151,8 @@ class PosixDataObject(MongoMixin):
         self.hg = Hashing()
         self.logger = logger
         self._klass = Dataset
+        # Result of the last read of the file, shared by the unique key and the metadata
+        self._file_hash = None
 
         included_in_datacatalog = kwargs.get("included_in_datacatalog", [])
         host = kwargs.get("host", platform.node())
@@ -121,18 +205,34 @@ class PosixDataObject(MongoMixin):
         """
         Retrieve object's detail
         """
-        self.mdb_obj.checksum = self.hg.compute_file_hash(path=self.mdb_obj.path)
-        self.mdb_obj.size = get_file_size(self.mdb_obj.path)
-        self.mdb_obj.encoding_format = guess_mimetype(self.mdb_obj.path)
+        file_hash = self.file_hash
+        self.mdb_obj.checksum = file_hash.digest
+        self.mdb_obj.size = file_hash.size
+        self.mdb_obj.mtime_ns = file_hash.mtime_ns
+        self.mdb_obj.inode = file_hash.ino
+        self.mdb_obj.encoding_format = guess_mimetype(self.mdb_obj.path, head=file_hash.head)
 
         self.logger.debug(
             f"for {self.desc} computed:\n{self.mdb_obj.size}, {self.mdb_obj.encoding_format}, {self.mdb_obj.checksum}"
         )
         return self
 
+    @property
+    def file_hash(self) -> FileHash:
+        """
+        Hash of the file content, read at most once as long as the file doesn't change
+        """
+        if (
+            self._file_hash is None
+            or self._file_hash.path != Path(self.mdb_obj.path)
+            or not self._file_hash.is_current()
+        ):
+            self._file_hash = self.hg.hash_file(self.mdb_obj.path)
+        return self._file_hash
+
     def make_unique_key(self):
         """Generate a unique key for the object"""
-        self.mdb_obj.uk = self.hg.compute_hash(fpath=self.mdb_obj.path)
+        self.mdb_obj.uk = self.hg.compute_unique_key(self.file_hash) if self.mdb_obj.path else None
 
     def set_modification_date(self) -> None:
         """Set the modification_date of the underlying MongoDB object"""
@@ -2,11 +2,20 @@
 Manager to handle Mongoengine's connection
 """
 
+import threading
+
 from mongoengine import connect, disconnect
+from mongoengine.connection import DEFAULT_CONNECTION_NAME, ConnectionFailure, get_connection
 from pydantic import MongoDsn
 
+from ..storage import SQLiteStore, get_sqlite_path, is_sqlite_uri, register_store, unregister_store
+
 DEFAULT_URI = ""
 
+# Connections opened by the managers, by alias: URI and number of contexts using them
+_connections = {}
+_lock = threading.Lock()
+
 
 def get_mec(uri=None):
     """Factory function to create a MongoEngineConnectionManager instance."""
@@ -19,33 +28,80 @@ def get_mec_from_config():
 
 
 class MongoEngineConnectionManager:
-    """Context manager for handling Mongoengine connections."""
+    """
+    Context manager for handling Mongoengine connections.
 
-    def __init__(self, uri=None):
+    The connection pool is opened by the outermost context and reused by the nested ones,
+    it is closed when the outermost context exits.
+
+    A SQLite URI, as in sqlite:///path/to/omnia.sqlite, opens the embedded store instead of a MongoDB connection.
+    """
+
+    def __init__(self, uri=None, alias=DEFAULT_CONNECTION_NAME, **options):
         """
         Initialize the connection manager.
 
         Args:
             uri: MongoDB connection URI. If None, it will try to import from config.
+            alias: Name of the Mongoengine connection.
+            **options: MongoClient options, such as maxPoolSize. If none, they are imported from config.
         """
         self.uri = uri if uri is not None else self._get_uri_from_config()
+        self.alias = alias
+        self.options = options or self._get_options_from_config()
 
     @staticmethod
     def _get_uri_from_config() -> MongoDsn | str:
         """Helper method to get URI from config or use default."""
         try:
-            from ..main import ConfigurationManager
+            from ..config.config_manager import ConfigurationManager
 
             cm = ConfigurationManager()
             return cm.get_mdbc_uri
         except ImportError:
             return DEFAULT_URI
 
+    @staticmethod
+    def _get_options_from_config() -> dict:
+        """Helper method to get the MongoClient options from config, if any."""
+        try:
+            from ..config.config_manager import ConfigurationManager
+
+            cm = ConfigurationManager()
+            return dict(cm.get_mdbc_options)
+        except ImportError:
+            return {}
+
+    @property
+    def client(self):
+        """The MongoClient of the connection, to share its pool outside Mongoengine."""
+        return get_connection(self.alias)
+
     def __enter__(self):
-        """Establish MongoDB connection when entering the context."""
-        connect(host=self.uri)
+        """Establish MongoDB connection when entering the context, or reuse the open one."""
+        with _lock:
+            connection = _connections.get(self.alias)
+            if connection is None:
+                if is_sqlite_uri(self.uri):
+                    register_store(self.alias, SQLiteStore(get_sqlite_path(self.uri)))
+                else:
+                    connect(host=self.uri, alias=self.alias, **self.options)
+                _connections[self.alias] = {"uri": self.uri, "count": 1}
+            elif connection["uri"] == self.uri:
+                connection["count"] += 1
+            else:
+                raise ConnectionFailure(f"Connection {self.alias} is already open to {connection['uri']}")
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback):
-        """Close MongoDB connection when exiting the context."""
-        disconnect()
+        """Close MongoDB connection when exiting the outermost context."""
+        with _lock:
+            connection = _connections[self.alias]
+            connection["count"] -= 1
+            if connection["count"] == 0:
+                del _connections[self.alias]
+                store = unregister_store(self.alias)
+                if store is not None:
+                    store.close()
+                else:
+                    disconnect(alias=self.alias)
@@ -0,0 +1,65 @@
+"""
+Indexes of the omnia collections, and the plans of the main queries that rely on them.
+"""
+
+from omnia.models.commons import PATH_COLLATION, migrate_json_fields
+from omnia.models.data_collection import Datacatalog
+from omnia.models.data_object import Dataset
+from omnia.storage import get_collection, get_store
+
+MODELS = (Datacatalog, Dataset)
+
+
+def ensure_indexes() -> dict[str, list[str]]:
+    """
+    Create the indexes declared by the models, if missing.
+    The embedded store creates them along with its tables.
+
+    Returns:
+        dict: The names of the indexes of each collection.
+    """
+    if get_store() is None:
+        for model in MODELS:
+            model.ensure_indexes()
+        # The wildcard index of the JSON fields is created along with their migration
+        migrate_json_fields(Datacatalog)
+    return {model._meta["collection"]: list(get_collection(model).index_information()) for model in MODELS}
+
+
+def plan_summary(explain: dict) -> str:
+    """
+    Summarise the winning plan of an explain() output, e.g. "FETCH < IXSCAN path_1".
+
+    A COLLSCAN stage means that the query scans the whole collection.
+    """
+    plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+    # The plans of the slot-based execution engine are nested
+    plan = plan.get("queryPlan", plan)
+    stages = []
+    while plan:
+        stage = plan.get("stage", "UNKNOWN")
+        if "indexName" in plan:
+            stage += f" {plan['indexName']}"
+        stages.append(stage)
+        plan = plan.get("inputStage") or next(iter(plan.get("inputStages", [])), None)
+    return " < ".join(stages)
+
+
+def explain_queries() -> dict[str, str]:
+    """
+    Explain the main dataset queries, with the values of a registered dataset.
+
+    Returns:
+        dict: The summary of the winning plan of each query.
+    """
+    sample = Dataset.objects.only("path", "checksum", "included_in_datacatalog").as_pymongo().first() or {}
+    path = sample.get("path", "/")
+    datacatalog = next(iter(sample.get("included_in_datacatalog", [])), None)
+    queries = {
+        "path": Dataset.objects(path=path),
+        "path, case-insensitive": Dataset.objects(path=path.upper()).collation(PATH_COLLATION),
+        "collection": Dataset.objects(included_in_datacatalog=datacatalog),
+        "collection and path": Dataset.objects(included_in_datacatalog=datacatalog, path=path),
+        "checksum": Dataset.objects(checksum=sample.get("checksum", "")),
+    }
+    return {name: plan_summary(queryset.explain()) for name, queryset in queries.items()}
@@ -1,41 +1,56 @@
-import json
-from typing import Any
+import datetime
+import operator
+import re
+from functools import reduce
 
-from mongoengine.errors import NotUniqueError
+from mongoengine.errors import NotUniqueError, SaveConditionError
+from mongoengine.queryset import transform
 from mongoengine.queryset.visitor import Q
+from pymongo.errors import DuplicateKeyError
 
 from omnia import logger
+from omnia.storage import get_store
 
 
-def find_item(obj: dict, key: str) -> Any:
+def as_stored(value: datetime.datetime | None) -> datetime.datetime | None:
+    """Truncate a datetime to the millisecond precision of BSON, so that it matches the stored value."""
+    if value is None:
+        return None
+    return value.replace(microsecond=value.microsecond // 1000 * 1000)
+
+
+class QueryResult:
     """
-    Recursively search for a specific key in a dictionary.
+    Lazy result of MongoMixin.query, backed by a server cursor or by a query of the embedded store.
 
-    Args:
-        obj (Dict): The dictionary to search in.
-        key (str): The key to search for.
+    Documents are fetched in batches while iterating, and each iteration runs the query again.
+    The length is counted server-side, without fetching the documents.
+    """
 
-    Returns:
-        Any: The value associated with the key if found, otherwise None.
+    def __init__(self, queryset=None):
+        self._queryset = queryset
 
-    Notes:
-        This function searches for the key in the dictionary and its nested dictionaries.
-        If the key is found, the function returns the associated value.
-        If the key is not found, the function returns None.
+    @property
+    def queryset(self):
+        """The underlying QuerySet, None if the query is empty."""
+        return self._queryset
 
-    """
-    if key in obj:
-        return obj[key]
-    else:
-        for _k, v in obj.items():
-            if isinstance(v, dict):
-                result = find_item(v, key)
-                if result is not None:
-                    return result
-        return None
+    def __iter__(self):
+        if self._queryset is None:
+            return iter(())
+        return iter(self._queryset.clone())
+
+    def __len__(self) -> int:
+        return 0 if self._queryset is None else self._queryset.count()
+
+    def __bool__(self) -> bool:
+        return self._queryset is not None and self._queryset.clone().first() is not None
 
 
 class MongoMixin:
+    # Collation of the case-insensitive index of each field, which case-insensitive queries on it use
+    collations: dict[str, dict] = {}
+
     def __init_subclass__(cls, **kwargs):
         required_attrs = ["mdb_obj", "klass", "pk", "unique_key", "desc"]
         missing_attrs = [attr for attr in required_attrs if not hasattr(cls, attr)]
@@ -43,22 +58,41 @@ class MongoMixin:
             raise AttributeError(f"Class {cls.__name__} is missing required attributes: {', '.join(missing_attrs)}")
         super().__init_subclass__(**kwargs)
 
+    @property
+    def embedded(self):
+        """The SQLiteCollection of the documents, if they are stored in the embedded store, otherwise None."""
+        store = get_store(self.klass)
+        return store.collection(self.klass) if store is not None else None
+
+    def _filter(self, selector: dict) -> dict:
+        """The raw filter of a selector, for the embedded store."""
+        return Q(**selector).to_query(self.klass)
+
     @property
     def is_mapped(self) -> bool:
-        count = self.klass.objects(**self.unique_key).count()
-        if count == 1:
-            logger.debug(f" {count} {self.klass.__name__} found")
-            return True
+        # At most two ids are fetched, enough to tell whether the match is unique
+        if self.embedded is not None:
+            count = len(list(self.embedded.find(self._filter(self.unique_key), {"_id": 1}, limit=2)))
+        else:
+            count = len(self.klass.objects(**self.unique_key).only("id").limit(2).as_pymongo())
         logger.debug(f" {count} {self.klass.__name__} found")
-        return False
+        return count == 1
+
+    @property
+    def _selector(self) -> dict:
+        """The primary key if known, otherwise the unique key."""
+        return self.pk if all(self.pk.values()) else self.unique_key
 
     def delete(self) -> None:
         """
         Delete the Document from the database and unmap the local object.
         This will only take effect if the document has been previously saved.
         """
-        if self.is_mapped:
-            self.mdb_obj.delete()
+        if self.embedded is not None:
+            deleted = self.embedded.delete_many(self._filter(self._selector)).deleted_count
+        else:
+            deleted = self.klass.objects(**self._selector).delete()
+        if deleted:
             logger.info(f"{self.desc} deleted")
             self.mdb_obj.id = None
 
@@ -69,24 +103,20 @@ class MongoMixin:
         Returns:
             The current object if a unique match is found, otherwise None.
         """
-        if all(self.pk.values()):
-            objs = self.klass.objects(**self.pk)
+        # A single round trip fetching at most two documents, enough to tell whether the match is unique
+        if self.embedded is not None:
+            objs = [self.klass._from_son(doc) for doc in self.embedded.find(self._filter(self._selector), limit=2)]
         else:
-            objs = self.klass.objects(**self.unique_key)
-        #  len() is much slower than count()
-        count = objs.count()
-        if count == 1:
-            logger.debug(f"Mapping, {count} {self.klass.__name__} found")
+            objs = list(self.klass.objects(**self._selector).limit(2))
+        if len(objs) != 1:
+            logger.debug(f"Mapping, {len(objs)} {self.klass.__name__} found")
+            return None
 
-            # Reload object fields from the db object
-            obj_fields = {key: getattr(objs[0], key) for key, value in self.mdb_obj._fields.items()}
-
-            for key, value in obj_fields.items():
-                logger.debug(f"Setting field: {key}")
-                setattr(self.mdb_obj, key, value)
-
-            return self
-        return None
+        # Reload object fields from the db object, setting the id marks the local object as saved
+        for key, value in objs[0]._data.items():
+            setattr(self.mdb_obj, key, value)
+        self.mdb_obj._clear_changed_fields()
+        return self
 
     def save(self, **kwargs):
         """
@@ -98,7 +128,10 @@ class MongoMixin:
         """
         force_update = kwargs.pop("force_update", False)
         try:
-            self.mdb_obj.save(**kwargs)
+            if self.embedded is not None:
+                self._save_embedded()
+            else:
+                self.mdb_obj.save(**kwargs)
             logger.info(f"{self.desc} saved")
         except NotUniqueError:
             if force_update:
@@ -111,91 +144,167 @@ class MongoMixin:
         """
         Return object's detail in JSON format
         """
-        detail = {}
-        if self.ensure_is_mapped("view"):
-            detail = self.klass.objects(id=self.pk).as_pymongo()[0]
-            logger.debug(detail)
+        if self.embedded is not None:
+            detail = self.embedded.find_one(self._filter(self._selector)) or {}
+        else:
+            detail = self.klass.objects(**self._selector).as_pymongo().first() or {}
+        logger.debug(detail)
         return detail
 
-    def query(self, case_sensitive=False, **kwargs) -> list[dict]:
+    def query(self, case_sensitive=False, projection=None, contains=False, **kwargs) -> QueryResult:
         """
         Queries the database based on the provided keyword arguments.
 
+        The data_ids and the regular key value pairs are compiled into a single server query,
+        so each matching document is returned once.
+
         Args:
-            case_sensitive (bool, optional): Whether the query should be case-sensitive. Defaults to True.
+            case_sensitive (bool, optional): Whether the query should be case-sensitive. Defaults to False.
+                Case-insensitive queries on the fields of `collations` use their collation on MongoDB.
+            projection (Iterable[str], optional): The fields to return, all of them if None.
+            contains (bool, optional): Whether the keys of the JSON fields match the values containing the
+                given ones, rather than equal to them. Defaults to False, as only equality is served by
+                the wildcard index of the JSON fields.
             **kwargs: Additional keyword arguments to filter the query results.
 
         Returns:
-            list: A list of query results.
+            QueryResult: A lazy, cursor-backed iterable of the matching documents.
         """
-        operators = {"case_insensitive": ["iexact", "icontains"], "case_sensitive": ["exact", "contains"]}
-        exact_op, contains_op = operators["case_sensitive" if case_sensitive else "case_insensitive"]
+        # Equality has no operator, the exact one compiles to a regex
+        exact_op, contains_op = (None, "contains") if case_sensitive else ("iexact", "icontains")
 
-        docs = []
         if not kwargs:
-            return []
+            return QueryResult()
+
+        # On MongoDB, a case-insensitive query on a field with a case-insensitive index compares with its
+        # collation, as a regex can't be served by it. The embedded store serves the regex by its index.
+        collation = None
+        if not case_sensitive and self.embedded is None:
+            collation = next((self.collations[key] for key in kwargs if key in self.collations), None)
+            if collation is not None:
+                exact_op = None
 
         jds = {field: kwargs.pop(field, {}) for field in self.klass.json_dict_fields() if field in kwargs}
 
-        # Compose queries from data_ids list, if any.
-        queries = [Q(**{f"data_id__{exact_op}": value}) for value in kwargs.pop("data_ids", [])]
+        # Compose a single $in query from data_ids list, if any.
+        queries = []
+        data_ids = list(kwargs.pop("data_ids", []))
+        if data_ids:
+            if not case_sensitive:
+                data_ids = [re.compile(f"^{re.escape(value)}$", re.IGNORECASE) for value in data_ids]
+            queries.append(Q(data_id__in=data_ids))
 
         # Compose queries from regular key value pairs in the yaml file.
-        query_fields_exact = {f"{key}__{exact_op}": value for key, value in kwargs.items()}
+        query_fields_exact = {f"{key}__{exact_op}" if exact_op else key: value for key, value in kwargs.items()}
         if query_fields_exact:
             queries.append(Q(**query_fields_exact))
-        logger.debug(queries)
 
         if len(jds.keys()) > 0:
+            # Keys of the JSON fields are matched server-side, nested keys are given in dot notation.
+            # Equality is served by the wildcard index, the case only matters to substring matching.
+            # JSON fields still stored as strings aren't matched until `omnia db ensure-indexes` migrates them.
+            json_op = [contains_op] if contains else []
             for jdk, jdv in jds.items():
-                query_fields_contains = {f"{jdk}__{contains_op}.{key}": value for key, value in jdv.items()}
-
-                for key, value in query_fields_contains.items():
-                    query_field_contains = key.split(".")[0]
-                    queries.append(Q(**{query_field_contains: value}))
-
-                # Use & operator to combine all the queries with AND logic
-                # query_args = reduce(lambda x, y: x & y, queries)
-                query_args = Q()
-                for q in queries:
-                    query_args = query_args & q
-                logger.debug(query_args)
-                docs.extend(
-                    qr
-                    for qr in self.klass.objects(query_args).as_pymongo()
-                    if value.casefold() in find_item(json.loads(qr[jdk]), key.split(".").pop()).casefold()
-                )
-        else:
-            for query_arg in queries:
-                logger.debug(query_arg)
-                docs.extend(qr for qr in self.klass.objects(query_arg).as_pymongo())
-        logger.debug(f"found {len(docs)} documents")
+                for key, value in jdv.items():
+                    queries.append(Q(**{"__".join([jdk, *key.split("."), *json_op]): value}))
 
-        return docs
+            # Use & operator to combine all the queries with AND logic
+            query_args = reduce(operator.and_, queries, Q())
+        else:
+            # Use | operator to combine all the queries with OR logic
+            query_args = reduce(operator.or_, queries, Q())
+        logger.debug(query_args)
+
+        if self.embedded is not None:
+            return QueryResult(self.embedded.find(query_args.to_query(self.klass), projection))
+        queryset = self.klass.objects(query_args)
+        if collation is not None:
+            queryset = queryset.collation(collation)
+        if projection:
+            queryset = queryset.only(*projection)
+        return QueryResult(queryset.as_pymongo())
 
     def update(self, **kwargs) -> bool:
         """
         Perform an atomic update of the document in the database and reload the document
         using the updated version.
 
+        The write is conditional on the modification date read from the database, so that
+        a concurrent update is detected instead of being overwritten.
+
         Returns:
             bool: True if the document was updated successfully, False if the document
                   in the database doesn't match the query or if mapping is not ensured.
         """
-        if not self.is_mapped:
+        if self.mdb_obj.pk is None or self.mdb_obj._created:
             logger.debug(f"Mapping not ensured, cannot update document {self.desc}")
             return False
 
+        previous_date = as_stored(self.mdb_obj.date_modified)
+        condition = {"date_modified": previous_date}
         self.make_unique_key()
         self.set_modification_date()
-        if kwargs:
-            update_result = self.mdb_obj.update(**kwargs)
-        else:
-            update_result = self.mdb_obj.save()
+        self.mdb_obj.date_modified = as_stored(self.mdb_obj.date_modified)
+        try:
+            if self.embedded is not None:
+                update_result = self._save_embedded(condition, **kwargs)
+            elif kwargs:
+                update_result = self.mdb_obj.modify(
+                    query=condition, set__date_modified=self.mdb_obj.date_modified, **kwargs
+                )
+            else:
+                update_result = bool(self.mdb_obj.save(save_condition=condition))
+        except SaveConditionError:
+            update_result = False
 
         if update_result:
             logger.info(f"{self.desc} updated successfully")
         else:
-            logger.info(f"Failed to update document {self.desc}")
+            # Keep the date read from the database, so that a retry still detects the conflict
+            self.mdb_obj.date_modified = previous_date
+            logger.info(f"Failed to update document {self.desc}, it was deleted or modified concurrently")
 
         return update_result
+
+    def _save_embedded(self, condition: dict | None = None, **kwargs) -> bool:
+        """
+        Write the document to the embedded store, conditionally if a condition is given.
+
+        The updates given as keyword arguments are applied to the document before writing it. The set__
+        ones are assigned to its fields, the other ones, such as push__, add_to_set__ and pull__ on list
+        fields, are compiled by mongoengine and applied by the embedded store.
+
+        Raises:
+            NotUniqueError: If a unique field of the document is already taken.
+            OperationFailure: If an update operator isn't supported by the embedded store.
+        """
+        operators = {}
+        for key, value in kwargs.items():
+            operator_name, _, field = key.partition("__")
+            if operator_name == "set":
+                setattr(self.mdb_obj, field, value)
+            else:
+                operators[key] = value
+
+        self.mdb_obj.validate()
+        son = self.mdb_obj.to_mongo().to_dict()
+        if operators:
+            self.embedded.apply(son, transform.update(self.klass, **operators))
+            # Reload the fields changed by the operators, as mapping does
+            for key, value in self.klass._from_son(son)._data.items():
+                setattr(self.mdb_obj, key, value)
+        try:
+            if self.mdb_obj.pk is None:
+                self.mdb_obj.pk = self.embedded.insert_one(son).inserted_id
+                saved = True
+            else:
+                result = self.embedded.replace_one(
+                    {"_id": self.mdb_obj.pk, **(condition or {})}, son, upsert=condition is None
+                )
+                saved = result.matched_count == 1 or result.upserted_id is not None
+        except DuplicateKeyError as e:
+            raise NotUniqueError(str(e)) from e
+        if saved:
+            self.mdb_obj._created = False
+            self.mdb_obj._clear_changed_fields()
+        return saved
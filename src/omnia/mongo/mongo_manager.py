@@ -1,11 +1,20 @@
+import fcntl
+import json
+import os
+import signal
 import subprocess
 import time
 from contextlib import contextmanager
+from pathlib import Path
 
-from omnia import logger, mongo_db_logpath, mongo_db_path
-from omnia.config.config_manager import ConfigurationManager
+import click
 
-mongo_deployment_types = ["embedded", "standalone"]
+from omnia import logger, mongo_db_logpath, mongo_db_path, mongo_db_pidfile
+
+mongo_deployment_types = ["embedded", "standalone", "sqlite"]
+# Bounds of the delay between two pings of a starting server, in seconds
+MIN_READY_DELAY = 0.01
+MAX_READY_DELAY = 0.5
 
 
 def get_mongo_deployment(ctx: object) -> str:
@@ -20,6 +29,8 @@ def get_mongo_uri(ctx: object) -> str:
     uri = ctx.obj.get("mongo").get("uri")
 
     if not uri:
+        from omnia.config.config_manager import ConfigurationManager
+
         config = ConfigurationManager()
         uri = config.get_mdbc_uri
 
@@ -38,15 +49,18 @@ def embedded_mongo(ctx):
         None
 
     Raises:
-        Exception: If an error occurs during the MongoDB server management.
+        click.ClickException: If the embedded MongoDB server can't be started.
     """
     embedded = (get_mongo_deployment(ctx) == "embedded") and (
         (get_mongo_uri(ctx) is None) or ("localhost:27018" in get_mongo_uri(ctx))
     )
     logger.debug(f"Embedded MongoDB: {embedded}")
-    mdb = MongoDBManager()
+    mdb = MongoDBManager(keep_alive=ctx.obj.get("mongo").get("keep_alive", False))
     if embedded:
-        mdb.start()
+        try:
+            mdb.start()
+        except (OSError, RuntimeError) as e:
+            raise click.ClickException(f"Failed to start the embedded MongoDB server: {e}") from e
     try:
         yield
     except Exception as e:
@@ -57,98 +71,221 @@ def embedded_mongo(ctx):
             mdb.stop()
 
 
+def ping(host: str, port: int, timeout_ms: int = 200) -> bool:
+    """Check whether a MongoDB server accepts connections, waiting at most timeout_ms."""
+    # The driver is imported only by the commands managing the embedded server
+    from pymongo import MongoClient
+    from pymongo.errors import PyMongoError
+
+    # A new client connects right away, while a client whose first attempt failed waits for its next heartbeat
+    client = MongoClient(
+        host, port, directConnection=True, connectTimeoutMS=timeout_ms, serverSelectionTimeoutMS=timeout_ms
+    )
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+def is_running(pid: int) -> bool:
+    """Check whether a process exists."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
 class MongoDBManager:
     """
     Initialize the embedded MongoDBManager with the given database path and log path.
 
+    The server started is tracked in a pidfile. A server kept alive is left running when the manager stops,
+    and the next managers attach to it instead of starting another one. The other servers belong to the
+    command that started them and are never shared.
+
     Args:
         dbpath (str): The path to the MongoDB database.
         logpath (str): The path to the MongoDB log file.
         port (int): The port on which the MongoDB server will run. Default is 27018.
         timeout (int): The timeout period for starting the MongoDB server. Default is 5 seconds.
+        pidfile (str): The path of the file tracking the running server.
+        keep_alive (bool): Whether to leave the server running for the next commands.
     """
 
-    def __init__(self, dbpath=mongo_db_path, logpath=mongo_db_logpath, port=27018, timeout=5):
+    def __init__(
+        self,
+        dbpath=mongo_db_path,
+        logpath=mongo_db_logpath,
+        port=27018,
+        timeout=5,
+        pidfile=mongo_db_pidfile,
+        keep_alive=False,
+    ):
         self.dbpath = dbpath
         self.process = None
         self.logpath = logpath
         self.host = "localhost"
         self.port = port
         self.timeout = timeout
+        self.pidfile = Path(pidfile)
+        self.keep_alive = keep_alive
+        self.attached = False
+
+    def wait_until_ready(self) -> bool:
+        """
+        Ping the server until it accepts connections, with an exponential backoff.
+
+        Returns:
+            bool: Whether the server is ready within the timeout period.
+        """
+        deadline = time.monotonic() + self.timeout
+        delay = MIN_READY_DELAY
+        while True:
+            if self.process is not None and self.process.poll() is not None:
+                logger.error("MongoDB server stopped unexpectedly.")
+                return False
+            if ping(self.host, self.port):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, MAX_READY_DELAY)
+
+    @contextmanager
+    def _locked_pidfile(self):
+        """Open the pidfile, locked so that concurrent commands don't start two servers on the same dbpath."""
+        self.pidfile.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.pidfile, "a+") as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                file.seek(0)
+                yield file
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _read_pid(file) -> dict | None:
+        try:
+            running = json.loads(file.read())
+            return running if is_running(running["pid"]) else None
+        except (ValueError, KeyError, TypeError):
+            return None
 
     def start(self):
         """
-        Start the MongoDB server.
+        Start the MongoDB server, or attach to the one kept alive by a previous command.
+
+        A server started without keep_alive is stopped by its command when it ends, so it isn't shared:
+        the manager waits for it to stop, at most for the timeout period, before starting its own.
 
         Raises:
-            Exception: If the MongoDB server fails to start.
+            RuntimeError: If the server is used by another command or doesn't start within the timeout period.
+            OSError: If mongod can't be run.
         """
-        try:
-            # Start the MongoDB server
-            self.process = subprocess.Popen(
-                ["mongod", "--dbpath", self.dbpath, "--logpath", self.logpath, "--logappend", "--port", str(self.port)],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-            )
-            logger.debug("Attempting to start embedded MongoDB server...")
-
-            # Check if the server is running
-            # Wait for the server to start
-            start_time = time.time()
-            while time.time() - start_time < self.timeout:
-                return_code = self.process.poll()
-                if return_code is not None:
-                    logger.error("MongoDB server stopped unexpectedly.")
+        deadline = time.monotonic() + self.timeout
+        delay = MIN_READY_DELAY
+        while True:
+            with self._locked_pidfile() as pidfile:
+                running = self._read_pid(pidfile)
+                if running is None or running.get("keep_alive"):
+                    if running is not None and running["port"] == self.port and self.wait_until_ready():
+                        self.attached = True
+                        logger.info(f"Attached to the embedded MongoDB server running on {self.host}:{self.port}")
+                        return
+                    self._spawn(pidfile)
                     break
+            if time.monotonic() >= deadline:
+                raise RuntimeError(
+                    f"The embedded MongoDB server is used by another command (pid {running['pid']}). "
+                    "Run the commands with --mongo-keep-alive to share it."
+                )
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_READY_DELAY)
 
-                # Check if the server is ready to accept connections
-                try:
-                    # Attempt to connect to the MongoDB server
-                    # Run mongostat with one iteration (-n 1) and timeout
-                    result = subprocess.run(
-                        ["mongostat", "--host", f"{self.host}:{self.port}", "-n", "1"],
-                        capture_output=True,
-                        text=True,
-                        timeout=self.timeout,
-                    )
-                    # If mongostat returns output containing stats, server is up
-                    if result.returncode == 0 and "insert" in result.stdout:
-                        logger.info(
-                            f"Embedded MongoDB server running on {self.host}:{self.port} (Press CTRL+C to quit)"
-                        )
-                        break
-                except subprocess.TimeoutExpired:
-                    logger.info("mongostat command timed out. Server may be down or unreachable.")
-                    break
+        if not self.wait_until_ready():
+            self.stop(force=True)
+            raise RuntimeError("The embedded MongoDB server did not start within the timeout period.")
+        logger.info(f"Embedded MongoDB server running on {self.host}:{self.port} (Press CTRL+C to quit)")
 
-                # Sleep for a short period before checking again
-                time.sleep(1)
+    def _spawn(self, pidfile) -> None:
+        """Start mongod and record it in the locked pidfile."""
+        Path(self.dbpath).mkdir(parents=True, exist_ok=True)
+        Path(self.logpath).parent.mkdir(parents=True, exist_ok=True)
+        # Start the MongoDB server, in its own session so that it can outlive this command
+        self.process = subprocess.Popen(
+            [
+                "mongod",
+                "--dbpath",
+                str(self.dbpath),
+                "--logpath",
+                str(self.logpath),
+                "--logappend",
+                "--port",
+                str(self.port),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=self.keep_alive,
+        )
+        logger.debug("Attempting to start embedded MongoDB server...")
+        pidfile.truncate(0)
+        pidfile.write(json.dumps({"pid": self.process.pid, "port": self.port, "keep_alive": self.keep_alive}))
+        pidfile.flush()
 
-                # If we reach here, the server did not start within the timeout period
-                logger.error("MongoDB server did not start within the timeout period.")
+    def stop(self, force=False):
+        """
+        Stop the MongoDB server, unless it is kept alive or was started by another command.
 
-        except Exception as e:
-            logger.error(f"Failed to start MongoDB server: {e}")
+        Args:
+            force (bool): Stop the server anyway, including the one tracked by the pidfile.
 
-    def stop(self):
-        """
-        Stop the MongoDB server.
+        Returns:
+            bool: Whether a server was stopped.
 
         Raises:
             Exception: If the MongoDB server fails to stop.
         """
-        try:
-            # Stop the MongoDB server
-            self.process.terminate()
-            self.process.wait()
+        if not force and (self.keep_alive or self.attached):
+            logger.info(f"Embedded MongoDB server left running on {self.host}:{self.port}")
             self.process = None
+            self.attached = False
+            return False
+        try:
+            with self._locked_pidfile() as pidfile:
+                running = self._read_pid(pidfile)
+                if self.process is not None:
+                    # Stop the MongoDB server
+                    self.process.terminate()
+                    self.process.wait()
+                    self.process = None
+                elif running is not None:
+                    os.kill(running["pid"], signal.SIGTERM)
+                    deadline = time.monotonic() + self.timeout
+                    while is_running(running["pid"]) and time.monotonic() < deadline:
+                        time.sleep(MIN_READY_DELAY)
+                    if is_running(running["pid"]):
+                        logger.error(f"MongoDB server {running['pid']} did not stop within the timeout period.")
+                        return False
+                else:
+                    return False
+                pidfile.truncate(0)
+            self.attached = False
             logger.info("MongoDB server stopped.")
+            return True
         except Exception as e:
             logger.error(f"Failed to stop MongoDB server: {e}")
+            return False
 
     def __del__(self):
         """
         Destructor to ensure the MongoDB server is stopped when the object is deleted.
         """
-        if self.process and self.process.poll() is None:
+        if self.process and self.process.poll() is None and not self.keep_alive:
             self.stop()
@@ -0,0 +1,46 @@
+"""
+Storage backends of the documents of the models.
+
+Documents are stored in MongoDB, unless the connection was opened on a SQLite URI, in which
+case they are stored in an embedded SQLite database. get_collection returns the collection
+of a model in the backend in use, either a pymongo Collection or a SQLiteCollection.
+"""
+
+from mongoengine.connection import DEFAULT_CONNECTION_NAME
+
+from .sqlite import SQLiteCollection, SQLiteStore, get_sqlite_path, is_sqlite_uri
+
+__all__ = [
+    "SQLiteCollection",
+    "SQLiteStore",
+    "get_collection",
+    "get_sqlite_path",
+    "get_store",
+    "is_sqlite_uri",
+    "register_store",
+    "unregister_store",
+]
+
+# Embedded stores opened by the connection managers, by connection alias
+_stores = {}
+
+
+def register_store(alias: str, store: SQLiteStore) -> None:
+    """Store the documents of the connection alias in a SQLiteStore."""
+    _stores[alias] = store
+
+
+def unregister_store(alias: str) -> SQLiteStore | None:
+    return _stores.pop(alias, None)
+
+
+def get_store(document_cls=None) -> SQLiteStore | None:
+    """The SQLiteStore of the connection of a Document class, or of the default connection. None for MongoDB."""
+    alias = document_cls._meta.get("db_alias", DEFAULT_CONNECTION_NAME) if document_cls else DEFAULT_CONNECTION_NAME
+    return _stores.get(alias)
+
+
+def get_collection(document_cls):
+    """The collection of a Document class, in the backend of its connection."""
+    store = get_store(document_cls)
+    return store.collection(document_cls) if store is not None else document_cls._get_collection()
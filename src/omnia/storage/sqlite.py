@@ -0,0 +1,552 @@
+"""
+Embedded storage of the documents in a SQLite database.
+
+Each collection is a table holding its documents as JSON, with expression indexes on the
+fields indexed by its model. The elements of its list fields are kept by triggers in an indexed
+side table, so that membership queries don't scan the collection. SQLiteCollection implements the subset of the pymongo
+Collection API used by omnia, so that the models and the engines run in-process, without
+a MongoDB server. Filters are the MongoDB ones compiled by mongoengine or written by hand.
+"""
+
+import functools
+import re
+import sqlite3
+import threading
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from bson import ObjectId, json_util
+from mongoengine import ListField
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+SQLITE_SCHEME = "sqlite://"
+# Error code of MongoDB for the violation of a unique index
+DUPLICATE_KEY_ERROR = 11000
+# Error code of MongoDB for an unknown operator
+BAD_VALUE_ERROR = 2
+# Rows fetched at once while iterating a query
+FETCH_SIZE = 1000
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_$][A-Za-z0-9_]*$")
+_REGEX_FLAGS = {"i": re.IGNORECASE, "m": re.MULTILINE, "s": re.DOTALL, "x": re.VERBOSE}
+_COMPARISONS = {"$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def is_sqlite_uri(uri) -> bool:
+    """Whether a URI designates a SQLite database, as in sqlite:///path/to/omnia.sqlite."""
+    return str(uri).startswith(SQLITE_SCHEME)
+
+
+def get_sqlite_path(uri) -> Path:
+    """Path of the database of a SQLite URI."""
+    return Path(str(uri)[len(SQLITE_SCHEME) :])
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(pattern: str, flags: int) -> re.Pattern:
+    return re.compile(pattern, flags)
+
+
+def _regexp(pattern: str, flags: int, value) -> bool:
+    return isinstance(value, str) and _compile(pattern, flags).search(value) is not None
+
+
+def _anchored_literal(pattern: re.Pattern) -> str | None:
+    """The string matched by a regex such as the ones compiled by mongoengine for exact and iexact, if any."""
+    if not (pattern.pattern.startswith("^") and pattern.pattern.endswith("$")):
+        return None
+    escaped = pattern.pattern[1:-1]
+    literal = re.sub(r"\\(.)", r"\1", escaped, flags=re.DOTALL)
+    return literal if re.escape(literal) == escaped else None
+
+
+def _json_path(field: str) -> str:
+    parts = field.split(".")
+    if not all(_FIELD_NAME.match(part) for part in parts):
+        raise ValueError(f"Unsupported field name: {field}")
+    return "$." + ".".join(parts)
+
+
+def _dumps(value) -> str:
+    return json_util.dumps(value, json_options=json_util.RELAXED_JSON_OPTIONS)
+
+
+def _param(value) -> tuple[str, object]:
+    """SQL placeholder and parameter of a value, compared as JSON when it isn't a scalar."""
+    if value is None or isinstance(value, bool | int | float | str):
+        return "?", value
+    return "json(?)", _dumps(value)
+
+
+def _get(doc: dict, field: str):
+    for part in field.split("."):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(part)
+    return doc
+
+
+def _set(doc: dict, field: str, value) -> None:
+    *parents, last = field.split(".")
+    for part in parents:
+        doc = doc.setdefault(part, {})
+    doc[last] = value
+
+
+def _unset(doc: dict, field: str) -> None:
+    *parents, last = field.split(".")
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+
+def _unsupported(kind: str, name: str) -> OperationFailure:
+    """The error raised for the operators of MongoDB that the embedded store doesn't implement."""
+    return OperationFailure(f"Unsupported {kind} in the embedded SQLite store: {name}", BAD_VALUE_ERROR)
+
+
+class SQLiteQuery:
+    """
+    Lazy result of SQLiteCollection.find, with the methods of a QuerySet used by QueryResult.
+
+    Rows are fetched in batches while iterating, and each iteration runs the query again.
+    """
+
+    def __init__(self, collection: "SQLiteCollection", where: str, params: list, projection=None, limit: int = 0):
+        self.collection = collection
+        self.where = where
+        self.params = params
+        self.projection = projection
+        self._limit = limit
+
+    def clone(self) -> "SQLiteQuery":
+        return SQLiteQuery(self.collection, self.where, self.params, self.projection, self._limit)
+
+    def limit(self, limit: int) -> "SQLiteQuery":
+        query = self.clone()
+        query._limit = limit
+        return query
+
+    def _sql(self, columns: str) -> str:
+        sql = f'SELECT {columns} FROM "{self.collection.name}" WHERE {self.where}'
+        return sql + f" LIMIT {int(self._limit)}" if self._limit else sql
+
+    def __iter__(self) -> Iterator[dict]:
+        cursor = self.collection.store.execute(self._sql("doc"), self.params)
+        while rows := cursor.fetchmany(FETCH_SIZE):
+            for (doc,) in rows:
+                yield self.collection.project(json_util.loads(doc), self.projection)
+
+    def count(self) -> int:
+        return self.collection.store.execute(f"SELECT COUNT(*) FROM ({self._sql('1')})", self.params).fetchone()[0]
+
+    def first(self) -> dict | None:
+        return next(iter(self.limit(1)), None)
+
+
+class SQLiteCollection:
+    """
+    A collection of documents stored in a SQLite table, with the API of a pymongo Collection.
+
+    The query and update operators outside the subset used by omnia raise OperationFailure,
+    as MongoDB does for unknown operators.
+
+    Args:
+        store: The SQLiteStore of the collection.
+        document_cls: The Document class of the collection. Its indexed fields are indexed in the
+                      table, and its list fields are matched element-wise, as MongoDB does.
+    """
+
+    def __init__(self, store: "SQLiteStore", document_cls):
+        self.store = store
+        self.document_cls = document_cls
+        self.name = document_cls._get_collection_name()
+        self.list_fields = {field.db_field for field in document_cls._fields.values() if isinstance(field, ListField)}
+        self.elements = f"{self.name}__elements"
+        self._create()
+
+    def _create(self) -> None:
+        self.store.execute(
+            f'CREATE TABLE IF NOT EXISTS "{self.name}" (id TEXT PRIMARY KEY, doc TEXT NOT NULL CHECK (json_valid(doc)))'
+        )
+        if self.list_fields:
+            self._create_elements()
+        for name, fields, unique, nocase in self._indexes():
+            # Lists are matched through the side table of their elements
+            if any(field in self.list_fields for field in fields):
+                continue
+            collate = " COLLATE NOCASE" if nocase else ""
+            expressions = ", ".join(f"json_extract(doc, '{_json_path(field)}'){collate}" for field in fields)
+            self.store.execute(
+                f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS "{self.name}_{name}" '
+                f'ON "{self.name}" ({expressions})'
+            )
+
+    def _create_elements(self) -> None:
+        """Create the side table of the elements of the list fields, with the triggers maintaining it."""
+        exists = self.store.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.elements,)
+        ).fetchone()
+        with self.store.transaction():
+            self.store.execute(
+                f'CREATE TABLE IF NOT EXISTS "{self.elements}" (doc_id TEXT NOT NULL, field TEXT NOT NULL, value)'
+            )
+            self.store.execute(
+                f'CREATE INDEX IF NOT EXISTS "{self.elements}_value" ON "{self.elements}" (field, value, doc_id)'
+            )
+            self.store.execute(f'CREATE INDEX IF NOT EXISTS "{self.elements}_doc" ON "{self.elements}" (doc_id)')
+
+            def insert(row: str) -> str:
+                return " ".join(
+                    f"INSERT INTO \"{self.elements}\" SELECT {row}.id, '{field}', value "
+                    f"FROM json_each({row}.doc, '{_json_path(field)}');"
+                    for field in sorted(self.list_fields)
+                )
+
+            delete = f'DELETE FROM "{self.elements}" WHERE doc_id = old.id;'
+            for event, body in (
+                ("INSERT", insert("new")),
+                ("UPDATE OF doc", f"{delete} {insert('new')}"),
+                ("DELETE", delete),
+            ):
+                trigger = f"{self.elements}_{event.split()[0].lower()}"
+                self.store.execute(
+                    f'CREATE TRIGGER IF NOT EXISTS "{trigger}" AFTER {event} ON "{self.name}" BEGIN {body} END'
+                )
+            if not exists:
+                # The documents written before the side table existed
+                for field in sorted(self.list_fields):
+                    self.store.execute(
+                        f'INSERT INTO "{self.elements}" SELECT t.id, ?, e.value '
+                        f"FROM \"{self.name}\" AS t, json_each(t.doc, '{_json_path(field)}') AS e",
+                        (field,),
+                    )
+
+    def _indexes(self) -> Iterator[tuple[str, list[str], bool, bool]]:
+        """Name, fields, uniqueness and case-insensitivity of the indexes of the model."""
+        fields = self.document_cls._fields
+        for field in fields.values():
+            if field.unique and field.db_field != "_id":
+                yield f"{field.db_field}_unique", [field.db_field], True, False
+        for index in self.document_cls._meta.get("indexes", []):
+            spec = index if isinstance(index, dict) else {"fields": [index] if isinstance(index, str) else index}
+            names = [name.lstrip("+-") for name in spec["fields"]]
+            db_fields = [fields[name].db_field if name in fields else name for name in names]
+            nocase = spec.get("collation", {}).get("strength") in (1, 2)
+            yield spec.get("name", "_".join(db_fields)), db_fields, False, nocase
+
+    @staticmethod
+    def project(doc: dict, projection) -> dict:
+        """Keep the fields of a projection, given as a list of fields or as a pymongo projection document."""
+        if not projection:
+            return doc
+        if not isinstance(projection, dict):
+            projection = dict.fromkeys(projection, 1)
+        included = {field.split(".")[0] for field, value in projection.items() if value and field != "_id"}
+        if not included:
+            return {key: value for key, value in doc.items() if projection.get(key, 1)}
+        if projection.get("_id", 1):
+            included.add("_id")
+        return {key: value for key, value in doc.items() if key in included}
+
+    def _where(self, spec: dict | None) -> tuple[str, list]:
+        """Compile a MongoDB filter into a SQL condition and its parameters."""
+        clauses, params = [], []
+        for key, value in (spec or {}).items():
+            if key in ("$and", "$or"):
+                parts = [self._where(sub) for sub in value]
+                joined = f" {key[1:].upper()} ".join(f"({sql})" for sql, _ in parts) or "1"
+                clauses.append(f"({joined})")
+                params.extend(param for _, sub_params in parts for param in sub_params)
+            elif key.startswith("$"):
+                raise _unsupported("query operator", key)
+            elif isinstance(value, dict) and any(op.startswith("$") for op in value):
+                for op, operand in value.items():
+                    if op == "$options":
+                        continue
+                    if op == "$regex":
+                        operand = _compile(operand, sum(_REGEX_FLAGS[flag] for flag in value.get("$options", "")))
+                    sql, sub_params = self._condition(key, op, operand)
+                    clauses.append(sql)
+                    params.extend(sub_params)
+            else:
+                sql, sub_params = self._condition(key, "$regex" if isinstance(value, re.Pattern) else "$eq", value)
+                clauses.append(sql)
+                params.extend(sub_params)
+        return " AND ".join(clauses) or "1", params
+
+    def _condition(self, field: str, op: str, value) -> tuple[str, list]:
+        if field == "_id":
+            column, is_list = "id", False
+            value = [str(v) for v in value] if op in ("$in", "$nin") else value if value is None else str(value)
+        else:
+            column, is_list = f"json_extract(doc, '{_json_path(field)}')", field in self.list_fields
+
+        def match(predicate: str, params: list) -> tuple[str, list]:
+            # A list matches when one of its elements does, looked up in the side table
+            if is_list:
+                elements = f'SELECT doc_id FROM "{self.elements}" WHERE field = ? AND {predicate % "value"}'
+                return f"id IN ({elements})", [field, *params]
+            return predicate % column, params
+
+        if op == "$eq":
+            placeholder, param = _param(value)
+            return match(f"%s IS {placeholder}", [param])
+        if op == "$ne":
+            sql, params = self._condition(field, "$eq", value)
+            return f"NOT ({sql})", params
+        if op in ("$in", "$nin"):
+            placeholders, params = zip(*map(_param, value), strict=True) if value else ((), ())
+            sql, params = match(f"%s IN ({', '.join(placeholders)})", list(params))
+            return (sql if op == "$in" else f"NOT ({sql})"), params
+        if op in _COMPARISONS:
+            placeholder, param = _param(value)
+            return match(f"%s {_COMPARISONS[op]} {placeholder}", [param])
+        if op == "$regex":
+            literal = _anchored_literal(value)
+            if literal is not None and not value.flags & re.IGNORECASE:
+                return self._condition(field, "$eq", literal)
+            if literal is not None and value.flags & re.IGNORECASE and literal.isascii():
+                # Served by the case-insensitive index, if any. NOCASE only folds ASCII letters
+                return match("%s = ? COLLATE NOCASE", [literal])
+            return match("regexp(?, ?, %s)", [value.pattern, value.flags])
+        if op == "$exists":
+            return f"json_type(doc, '{_json_path(field)}') IS {'NOT ' if value else ''}NULL", []
+        if op == "$size":
+            return f"json_array_length(doc, '{_json_path(field)}') = ?", [value]
+        raise _unsupported("query operator", op)
+
+    def find(self, filter: dict | None = None, projection=None, limit: int = 0, **kwargs) -> SQLiteQuery:
+        """Find the documents matching a filter. Options of pymongo such as batch_size are ignored."""
+        where, params = self._where(filter)
+        return SQLiteQuery(self, where, params, projection, limit)
+
+    def find_one(self, filter: dict | None = None, projection=None) -> dict | None:
+        return self.find(filter, projection).first()
+
+    def count_documents(self, filter: dict) -> int:
+        return self.find(filter).count()
+
+    def _duplicate_key_error(self, error: sqlite3.IntegrityError) -> DuplicateKeyError:
+        return DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} {error}", DUPLICATE_KEY_ERROR)
+
+    def _insert(self, doc: dict) -> ObjectId:
+        doc.setdefault("_id", ObjectId())
+        try:
+            self.store.execute(f'INSERT INTO "{self.name}" (id, doc) VALUES (?, ?)', (str(doc["_id"]), _dumps(doc)))
+        except sqlite3.IntegrityError as e:
+            raise self._duplicate_key_error(e) from e
+        return doc["_id"]
+
+    def insert_one(self, document: dict) -> InsertOneResult:
+        with self.store.transaction():
+            return InsertOneResult(self._insert(document), True)
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True) -> InsertManyResult:
+        """Insert documents. Like pymongo, unordered inserts go on after a duplicate key error."""
+        inserted, errors = [], []
+        with self.store.transaction():
+            for index, doc in enumerate(documents):
+                try:
+                    inserted.append(self._insert(doc))
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e), "op": doc})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted)})
+        return InsertManyResult(inserted, True)
+
+    def apply(self, doc: dict, update: dict) -> bool:
+        """
+        Apply the update operators to a document in memory, returning whether it changed.
+
+        Raises:
+            OperationFailure: If an operator isn't one of $set, $unset, $push, $addToSet, $pull and $pullAll.
+        """
+        before = _dumps(doc)
+        for op, fields in update.items():
+            for field, value in fields.items():
+                each = value["$each"] if isinstance(value, dict) and "$each" in value else [value]
+                if op == "$set":
+                    _set(doc, field, value)
+                elif op == "$unset":
+                    _unset(doc, field)
+                elif op == "$push":
+                    _set(doc, field, [*(_get(doc, field) or []), *each])
+                elif op == "$addToSet":
+                    values = _get(doc, field) or []
+                    for item in each:
+                        if item not in values:
+                            values = [*values, item]
+                    _set(doc, field, values)
+                elif op == "$pull":
+                    _set(doc, field, [item for item in _get(doc, field) or [] if item != value])
+                elif op == "$pullAll":
+                    _set(doc, field, [item for item in _get(doc, field) or [] if item not in value])
+                else:
+                    raise _unsupported("update operator", op)
+        return _dumps(doc) != before
+
+    def _update(self, filter: dict, update: dict, limit: int = 0, upsert: bool = False) -> dict:
+        matched = modified = 0
+        upserted = None
+        for doc in list(self.find(filter, limit=limit)):
+            matched += 1
+            if self.apply(doc, update):
+                self._replace(doc)
+                modified += 1
+        if not matched and upsert:
+            # The equalities of the filter are the fields of the new document
+            doc = {
+                key: value for key, value in filter.items() if not key.startswith("$") and not isinstance(value, dict)
+            }
+            self.apply(doc, update)
+            upserted = self._insert(doc)
+        return {"n": matched or int(upserted is not None), "nModified": modified, "upserted": upserted}
+
+    def _replace(self, doc: dict) -> None:
+        try:
+            self.store.execute(f'UPDATE "{self.name}" SET doc = ? WHERE id = ?', (_dumps(doc), str(doc["_id"])))
+        except sqlite3.IntegrityError as e:
+            raise self._duplicate_key_error(e) from e
+
+    def update_one(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        with self.store.transaction():
+            return UpdateResult(self._update(filter, update, limit=1, upsert=upsert), True)
+
+    def update_many(self, filter: dict, update: dict, upsert: bool = False) -> UpdateResult:
+        with self.store.transaction():
+            return UpdateResult(self._update(filter, update, upsert=upsert), True)
+
+    def replace_one(self, filter: dict, replacement: dict, upsert: bool = False) -> UpdateResult:
+        with self.store.transaction():
+            doc = self.find(filter, limit=1).first()
+            if doc is None:
+                if upsert:
+                    return UpdateResult({"n": 1, "nModified": 0, "upserted": self._insert(replacement)}, True)
+                return UpdateResult({"n": 0, "nModified": 0}, True)
+            replacement = dict(replacement, _id=doc["_id"])
+            self._replace(replacement)
+            return UpdateResult({"n": 1, "nModified": int(replacement != doc)}, True)
+
+    def _delete(self, filter: dict, limit: int = 0) -> DeleteResult:
+        where, params = self._where(filter)
+        if limit:
+            where = f'id IN (SELECT id FROM "{self.name}" WHERE {where} LIMIT {int(limit)})'
+        cursor = self.store.execute(f'DELETE FROM "{self.name}" WHERE {where}', params)
+        return DeleteResult({"n": cursor.rowcount}, True)
+
+    def delete_one(self, filter: dict) -> DeleteResult:
+        with self.store.transaction():
+            return self._delete(filter, limit=1)
+
+    def delete_many(self, filter: dict) -> DeleteResult:
+        with self.store.transaction():
+            return self._delete(filter)
+
+    def bulk_write(self, requests: list, ordered: bool = True) -> BulkWriteResult:
+        """Run InsertOne, UpdateOne and DeleteOne requests, reporting the errors like pymongo."""
+        result = {"nInserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "nUpserted": 0, "upserted": []}
+        errors = []
+        with self.store.transaction():
+            for index, request in enumerate(requests):
+                try:
+                    if isinstance(request, InsertOne):
+                        self._insert(request._doc)
+                        result["nInserted"] += 1
+                    elif isinstance(request, UpdateOne):
+                        raw = self._update(request._filter, request._doc, limit=1, upsert=bool(request._upsert))
+                        if raw["upserted"] is not None:
+                            result["nUpserted"] += 1
+                            result["upserted"].append({"index": index, "_id": raw["upserted"]})
+                        else:
+                            result["nMatched"] += raw["n"]
+                            result["nModified"] += raw["nModified"]
+                    elif isinstance(request, DeleteOne):
+                        result["nRemoved"] += self._delete(request._filter, limit=1).deleted_count
+                    else:
+                        raise _unsupported("bulk request", type(request).__name__)
+                except DuplicateKeyError as e:
+                    errors.append({"index": index, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if errors:
+            raise BulkWriteError(dict(result, writeErrors=errors))
+        return BulkWriteResult(result, True)
+
+    def index_information(self) -> dict:
+        """The indexes of the collection, by the name they have in the model, as the primary key one is _id_."""
+        rows = self.store.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (self.name,)
+        )
+        prefix = f"{self.name}_"
+        return {"_id_": {}} | {name.removeprefix(prefix): {} for (name,) in rows.fetchall()}
+
+
+class SQLiteStore:
+    """
+    A SQLite database holding the collections of the models.
+
+    Writes of the same store are serialised, and the database is opened in WAL mode so that
+    other processes can read it while it is written.
+
+    Args:
+        path: Path of the database file, created if needed.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.create_function("regexp", 3, _regexp, deterministic=True)
+        self._lock = threading.RLock()
+        self._collections = {}
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            return self.connection.execute(sql, params)
+
+    def transaction(self):
+        """Context manager running the statements of the current thread in a single transaction."""
+        return _Transaction(self)
+
+    def collection(self, document_cls) -> SQLiteCollection:
+        """The collection of a Document class, with its table and indexes created on first use."""
+        with self._lock:
+            if document_cls not in self._collections:
+                self._collections[document_cls] = SQLiteCollection(self, document_cls)
+            return self._collections[document_cls]
+
+    def close(self) -> None:
+        with self._lock:
+            self.connection.close()
+
+
+class _Transaction:
+    """Reentrant transaction of a SQLiteStore, holding its lock until it ends."""
+
+    def __init__(self, store: SQLiteStore):
+        self.store = store
+
+    def __enter__(self):
+        self.store._lock.acquire()
+        if not self.store.connection.in_transaction:
+            self.store.connection.execute("BEGIN IMMEDIATE")
+            self.owner = True
+        else:
+            self.owner = False
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        try:
+            if self.owner:
+                self.store.connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
+        finally:
+            self.store._lock.release()
@@ -1,4 +1,16 @@
-from .flops import get_file_size, guess_mimetype
-from .hashing import Hashing
+from .flops import FileScanner, get_file_size, guess_mimetype
+from .hash_cache import HashCache
+from .hashing import FileHash, Hashing
+from .mime import MimeDetector
+from .response_cache import ResponseCache
 
-__all__ = ["get_file_size", "guess_mimetype", "Hashing"]
+__all__ = [
+    "FileScanner",
+    "get_file_size",
+    "guess_mimetype",
+    "FileHash",
+    "HashCache",
+    "Hashing",
+    "MimeDetector",
+    "ResponseCache",
+]
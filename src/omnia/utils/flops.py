@@ -1,9 +1,13 @@
 """FiLe OPerationS"""
 
-import mimetypes
+import fnmatch
+import os
 import pathlib
+import re
 
-import magic
+from omnia import logger
+
+from .mime import MimeDetector
 
 DEFAULT_BUFSIZE = 4096
 
@@ -17,16 +21,14 @@ def path_exists(fname):
     return pathlib.Path(fname).exists()
 
 
-def guess_mimetype(fname):
+def guess_mimetype(fname, head=None):
     """
     Identifies file types
     :param fname: filename
-    :return: mimetype and encoding as strings
+    :param head: leading bytes of the file, if already read. They spare libmagic to open the file again
+    :return: mimetype as a string, see MimeDetector
     """
-    mime_type, encoding = mimetypes.guess_type(fname)
-    if mime_type is None:
-        mime_type = magic.from_file(fname, mime=True)
-    return mime_type
+    return MimeDetector.guess(fname, head=head)
 
 
 def get_file_size(fname):
@@ -36,3 +38,164 @@ def get_file_size(fname):
     :return: file's size as integer
     """
     return pathlib.PosixPath(fname).stat().st_size
+
+
+def has_magic(component):
+    """
+    Whether a path component contains glob wildcards
+    :param component: path component
+    :return: True if it contains wildcards
+    """
+    return any(c in component for c in "*?[")
+
+
+def translate_component(component):
+    """
+    Translates a glob path component into a regular expression, wildcards don't match the path separator
+    :param component: path component
+    :return: regular expression as a string
+    """
+    res, i, n = [], 0, len(component)
+    while i < n:
+        c = component[i]
+        i += 1
+        if c == "*":
+            res.append("[^/]*")
+        elif c == "?":
+            res.append("[^/]")
+        elif c == "[":
+            j = i
+            if j < n and component[j] in "!^":
+                j += 1
+            if j < n and component[j] == "]":
+                j += 1
+            j = component.find("]", j)
+            if j == -1:
+                res.append(re.escape(c))
+                continue
+            chars = re.sub(r"([&~|\[])", r"\\\1", component[i:j].replace("\\", "\\\\"))
+            i = j + 1
+            if chars[0] == "!":
+                chars = "^" + chars[1:] + "/"
+            elif chars[0] == "^":
+                chars = "\\" + chars
+            res.append(f"[{chars}]")
+        else:
+            res.append(re.escape(c))
+    return "".join(res)
+
+
+def glob_to_regex(pattern):
+    """
+    Translates a relative glob pattern into a regular expression, with the semantic of glob.glob(recursive=True)
+    :param pattern: glob pattern, relative to the directory where the search starts
+    :return: compiled regular expression
+    """
+    components = pattern.split("/")
+    res = []
+    for i, component in enumerate(components):
+        last = i == len(components) - 1
+        if component == "**":
+            res.append("(?:[^/]+/)*[^/]+" if last else "(?:[^/]+/)*")
+        else:
+            res.append(translate_component(component) + ("" if last else "/"))
+    return re.compile("".join(res))
+
+
+class FileScanner:
+    """
+    Streams the files of a directory tree matching a glob pattern, without building the list in memory.
+
+    Files are yielded as os.DirEntry, so their stat details are fetched at most once.
+    Directories are walked depth-first, and the entries of each directory in name order.
+    Like glob, the hidden files and directories matched by wildcards are skipped, the ones named explicitly are not,
+    and symbolic links to directories are not followed.
+
+    :param source: a directory, walked recursively, a file or a glob pattern
+    :param include: file name patterns, files are yielded only if they match one of them
+    :param exclude: file and directory name patterns to skip
+    :param max_depth: maximum depth of the files to yield, 0 for the files at the top of the tree
+    """
+
+    def __init__(self, source, include=(), exclude=(), max_depth=None):
+        self.source = source
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+
+        if os.path.isdir(source):
+            root, pattern = source, "**"
+        else:
+            components = source.split("/")
+            magic = [i for i, component in enumerate(components) if has_magic(component)]
+            first = magic[0] if magic else len(components) - 1
+            root = "/".join(components[:first]) or ("/" if source.startswith("/") else ".")
+            pattern = "/".join(components[first:])
+
+        self.root = root
+        self.prefix = "" if root == "." else os.path.join(root, "")
+        self.regex = glob_to_regex(pattern)
+        # Hidden names are only matched by the components of the pattern naming them
+        self.literals = frozenset(component for component in pattern.split("/") if not has_magic(component))
+
+        # Without recursive wildcards, files can't be deeper than the pattern
+        if "**" not in pattern.split("/"):
+            pattern_depth = pattern.count("/")
+            max_depth = pattern_depth if max_depth is None else min(max_depth, pattern_depth)
+        self.max_depth = max_depth
+
+    def _relative(self, path):
+        if self.root == ".":
+            return path[2:] if path.startswith("./") else path
+        return path[len(self.prefix) :] if path.startswith(self.prefix) else None
+
+    def _is_hidden(self, name):
+        return name.startswith(".") and name not in self.literals
+
+    def matches(self, path):
+        """
+        Whether a path belongs to the scanned files, regardless of its existence
+        :param path: file path
+        :return: True if the path matches the source and the filters
+        """
+        relative = self._relative(path)
+        if relative is None or not self.regex.fullmatch(relative):
+            return False
+        if self.max_depth is not None and relative.count("/") > self.max_depth:
+            return False
+        names = relative.split("/")
+        if any(self._is_hidden(name) for name in names):
+            return False
+        if any(fnmatch.fnmatchcase(name, pattern) for name in names for pattern in self.exclude):
+            return False
+        return not self.include or any(fnmatch.fnmatchcase(names[-1], pattern) for pattern in self.include)
+
+    def __iter__(self):
+        stack = [(self.root, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.warning(f"Cannot scan {directory}: {e}")
+                continue
+
+            subdirectories = []
+            for entry in entries:
+                name = entry.name
+                if self._is_hidden(name) or any(fnmatch.fnmatchcase(name, pattern) for pattern in self.exclude):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if self.max_depth is None or depth < self.max_depth:
+                            subdirectories.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
+                if self.include and not any(fnmatch.fnmatchcase(name, pattern) for pattern in self.include):
+                    continue
+                if self.regex.fullmatch(self._relative(entry.path)):
+                    yield entry
+            stack.extend((subdirectory, depth + 1) for subdirectory in reversed(subdirectories))
@@ -0,0 +1,164 @@
+"""
+Persistent cache of file digests, keyed by the stat identity of the files
+"""
+
+import os
+import pathlib
+import sqlite3
+import threading
+import time
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+# Seconds before the access time of a cache hit is refreshed, to avoid a write on every hit
+TOUCH_INTERVAL = 3600
+# Number of insertions between two evictions
+EVICT_INTERVAL = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS digests (
+    st_dev INTEGER NOT NULL,
+    st_ino INTEGER NOT NULL,
+    st_size INTEGER NOT NULL,
+    st_mtime_ns INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    last_access INTEGER NOT NULL,
+    PRIMARY KEY (st_dev, st_ino, st_size, st_mtime_ns, algorithm)
+);
+CREATE INDEX IF NOT EXISTS digests_last_access ON digests (last_access);
+"""
+
+
+def stat_key(st: os.stat_result) -> tuple[int, int, int, int]:
+    """Identity of a file version: device, inode, size and modification time."""
+    return st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class HashCache:
+    """
+    SQLite cache of file digests with LRU eviction.
+
+    A file is hashed again only if its device, inode, size or modification time changed.
+    Connections are opened lazily, one per thread and process, so the cache can be shared by worker threads
+    and handed over to worker processes.
+
+    Args:
+        path: Path of the SQLite database.
+        max_entries: Maximum number of digests kept. The least recently used are evicted first.
+    """
+
+    def __init__(self, path: str | pathlib.Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = pathlib.Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_local"], state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # Autocommit: every statement is a short transaction on the write-ahead log
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(SCHEMA)
+            self._local.connection, self._local.pid = connection, os.getpid()
+        return connection
+
+    def get(self, st: os.stat_result, algorithm: str) -> str | None:
+        """
+        Look up the digest of a file.
+
+        Args:
+            st: The stat result of the file.
+            algorithm: The hash algorithm of the digest.
+
+        Returns:
+            str: The digest, or None if the file version is not in the cache.
+        """
+        key = (*stat_key(st), algorithm)
+        row = self.connection.execute(
+            "SELECT digest, last_access FROM digests "
+            "WHERE st_dev = ? AND st_ino = ? AND st_size = ? AND st_mtime_ns = ? AND algorithm = ?",
+            key,
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        digest, last_access = row
+        now = int(time.time())
+        if now - last_access > TOUCH_INTERVAL:
+            self.connection.execute(
+                "UPDATE digests SET last_access = ? "
+                "WHERE st_dev = ? AND st_ino = ? AND st_size = ? AND st_mtime_ns = ? AND algorithm = ?",
+                (now, *key),
+            )
+        return digest
+
+    def put(self, st: os.stat_result, algorithm: str, digest: str) -> None:
+        """
+        Store the digest of a file.
+
+        Args:
+            st: The stat result of the file, taken when it was hashed.
+            algorithm: The hash algorithm of the digest.
+            digest: The digest of the file content.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (*stat_key(st), algorithm, digest, int(time.time())),
+        )
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICT_INTERVAL == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Remove the least recently used digests exceeding max_entries.
+
+        Returns:
+            int: Number of digests removed.
+        """
+        (count,) = self.connection.execute("SELECT count(*) FROM digests").fetchone()
+        excess = count - self.max_entries
+        if excess <= 0:
+            return 0
+        self.connection.execute(
+            "DELETE FROM digests WHERE rowid IN (SELECT rowid FROM digests ORDER BY last_access LIMIT ?)", (excess,)
+        )
+        return excess
+
+    def clear(self) -> None:
+        """Remove all the digests."""
+        self.connection.execute("DELETE FROM digests")
+
+    def close(self) -> None:
+        """Close the connection of the current thread."""
+        connection = getattr(self._local, "connection", None)
+        if connection is not None and self._local.pid == os.getpid():
+            connection.close()
+        self._local.connection = None
+
+    def __len__(self) -> int:
+        return self.connection.execute("SELECT count(*) FROM digests").fetchone()[0]
+
+    def summary(self) -> str:
+        return f"Hash cache: {self.hits} hits, {self.misses} misses"
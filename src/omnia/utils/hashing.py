@@ -1,24 +1,125 @@
 import hashlib
+import mmap
+import os
 import pathlib
+import threading
 
-DEFAULT_BUFSIZE = 4096
+from .hash_cache import HashCache
+
+DEFAULT_BUFSIZE = 1024 * 1024
+# Files of at least this size are memory-mapped instead of read, None to never map them
+MMAP_THRESHOLD = 256 * 1024 * 1024
+# Bytes read between two requests to the kernel to drop the pages already hashed
+DROP_INTERVAL = 64 * 1024 * 1024
 HASH_ALGORITHM = "sha256"
 HASH_LENGTH = 10
+# Number of leading bytes of a file kept to sniff its type
+HEAD_SIZE = 65536
+
+# Read buffers, one per thread
+_buffers = threading.local()
+
+
+def get_buffer(size: int) -> bytearray:
+    """Get the read buffer of the current thread, allocating it if needed."""
+    buffer = getattr(_buffers, "buffer", None)
+    if buffer is None or len(buffer) != size:
+        buffer = _buffers.buffer = bytearray(size)
+    return buffer
+
+
+class FileHash:
+    """
+    Result of a single read of a file.
+
+    Attributes:
+        path (pathlib.Path): Path of the file.
+        digest (str): Hexadecimal digest of the file content.
+        head (bytes): Leading bytes of the file, at most HEAD_SIZE.
+        size (int): Size of the file in bytes when it was hashed.
+        mtime_ns (int): Modification time of the file in nanoseconds when it was hashed.
+        ino (int): Inode number of the file.
+        cached (bool): Whether the digest comes from the hash cache. If so, head is empty.
+    """
+
+    def __init__(
+        self,
+        path: pathlib.Path,
+        digest: str,
+        head: bytes,
+        size: int,
+        mtime_ns: int,
+        ino: int | None = None,
+        cached: bool = False,
+    ):
+        self.path = path
+        self.digest = digest
+        self.head = head
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.ino = ino
+        self.cached = cached
+
+    def is_current(self) -> bool:
+        """Whether the file is unchanged since it was hashed."""
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        return (st.st_size, st.st_mtime_ns) == (self.size, self.mtime_ns)
 
 
 class Hashing:
     _instance = None
+    # Cache of file digests shared by all the instances, None if disabled
+    cache: HashCache | None = None
+    # I/O settings shared by all the instances, see configure()
+    default_bufsize = DEFAULT_BUFSIZE
+    mmap_threshold = MMAP_THRESHOLD
+    fadvise = True
 
     def __new__(cls, *args, **kwargs):
         if cls._instance is None:
             cls._instance = super().__new__(cls)
         return cls._instance
 
-    def __init__(self, algorithm: str = HASH_ALGORITHM, bufsize: int = DEFAULT_BUFSIZE, length: int = HASH_LENGTH):
+    def __init__(self, algorithm: str = HASH_ALGORITHM, bufsize: int | None = None, length: int = HASH_LENGTH):
         self.algorithm = algorithm
-        self.bufsize = bufsize
+        self.bufsize = self.default_bufsize if bufsize is None else bufsize
         self.length = length
 
+    @classmethod
+    def configure(cls, bufsize: int = DEFAULT_BUFSIZE, mmap_threshold: int | None = MMAP_THRESHOLD, fadvise=True):
+        """
+        Set how files are read.
+
+        Args:
+            bufsize: The size of the buffer used to read files.
+            mmap_threshold: Files of at least this size are memory-mapped. None to never map them.
+            fadvise: Whether to advise the kernel of sequential reads and to drop the hashed pages
+                     from the page cache, so that hashing doesn't evict the data of other processes.
+        """
+        cls.default_bufsize = bufsize
+        cls.mmap_threshold = mmap_threshold
+        cls.fadvise = fadvise
+
+    @classmethod
+    def settings(cls) -> dict:
+        """The arguments of configure() currently in use."""
+        return {"bufsize": cls.default_bufsize, "mmap_threshold": cls.mmap_threshold, "fadvise": cls.fadvise}
+
+    @classmethod
+    def set_cache(cls, cache: HashCache | None) -> None:
+        """
+        Enable the cache of file digests, or disable it if None.
+
+        Args:
+            cache: The HashCache to use.
+        """
+        if cls.cache is not None and cls.cache is not cache:
+            cls.cache.close()
+        cls.cache = cache
+
     def compute_hash(self, fpath: str | pathlib.Path = None, st: str = None) -> str | None:
         """
         Computes file or string hash using the algorithm set in the class.
@@ -46,35 +147,110 @@ class Hashing:
                         path = fpath
                     case _:
                         raise ValueError("Invalid input type for fpath argument")
-                # Compute the hash of the filename
-                filename_hash = self.compute_string_hash(path.name)
-                # Compute the hash of the file content
-                file_content_hash = self.compute_file_hash(path)
-                # Bind the filename hash, and the file content hash
-                hash_value = self.compute_string_hash(filename_hash + file_content_hash)
+                hash_value = self.compute_unique_key(self.hash_file(path))
             case _:
                 raise ValueError("Cannot provide both file path and string")
 
+        return self.truncate(hash_value)
+
+    def truncate(self, hash_value: str | None) -> str | None:
+        """Cut a hash to the length set in the class."""
         return hash_value if self.length is None else hash_value[: self.length] if hash_value else None
 
+    def compute_unique_key(self, file_hash: FileHash) -> str:
+        """
+        Computes the unique key of a file, binding the hash of its name with the hash of its content.
+
+        Args:
+            file_hash: The result of hashing the file.
+
+        Returns:
+            str: The unique key, cut to the length set in the class.
+        """
+        filename_hash = self.compute_string_hash(file_hash.path.name)
+        return self.truncate(self.compute_string_hash(filename_hash + file_hash.digest))
+
+    def hash_file(self, path: str | pathlib.Path) -> FileHash:
+        """
+        Reads a file once, computing the hash of its content and keeping its leading bytes.
+        If the hash cache is enabled and the file is unchanged since it was last hashed, the file is not read.
+
+        Args:
+            path: The path to the file to hash.
+
+        Returns:
+            FileHash: The digest, the leading bytes and the stat details of the file.
+        """
+        path = pathlib.Path(path)
+        cache = self.cache
+        if cache is not None:
+            st = os.stat(path)
+            digest = cache.get(st, self.algorithm)
+            if digest is not None:
+                return FileHash(path, digest, b"", st.st_size, st.st_mtime_ns, st.st_ino, cached=True)
+
+        digest = hashlib.new(self.algorithm)
+        with open(path, "rb", buffering=0) as fp:
+            st = os.fstat(fp.fileno())
+            head = self._read(fp, st.st_size, digest)
+            # Cache the digest only if the file didn't change while it was read
+            if cache is not None and os.fstat(fp.fileno()).st_mtime_ns == st.st_mtime_ns:
+                cache.put(st, self.algorithm, digest.hexdigest())
+        return FileHash(path, digest.hexdigest(), head, st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def _read(self, fp, size: int, digest) -> bytes:
+        """
+        Feed a digest with the content of an open file.
+
+        Args:
+            fp: The file, opened unbuffered in binary mode.
+            size: The size of the file.
+            digest: The hash object to update.
+
+        Returns:
+            bytes: The leading bytes of the file.
+        """
+        fd = fp.fileno()
+        advise = self.fadvise and hasattr(os, "posix_fadvise")
+        if advise:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        if self.mmap_threshold is not None and size >= max(self.mmap_threshold, 1):
+            with mmap.mmap(fd, 0, access=mmap.ACCESS_READ) as mm:
+                if hasattr(mm, "madvise"):
+                    mm.madvise(mmap.MADV_SEQUENTIAL)
+                with memoryview(mm) as view:
+                    for offset in range(0, len(view), self.bufsize):
+                        digest.update(view[offset : offset + self.bufsize])
+                    head = bytes(view[:HEAD_SIZE])
+        else:
+            buffer = get_buffer(self.bufsize)
+            head, offset, dropped = bytearray(), 0, 0
+            with memoryview(buffer) as view:
+                while n := fp.readinto(buffer):
+                    if len(head) < HEAD_SIZE:
+                        head += view[: min(n, HEAD_SIZE - len(head))]
+                    digest.update(view[:n])
+                    offset += n
+                    if advise and offset - dropped >= DROP_INTERVAL:
+                        os.posix_fadvise(fd, dropped, offset - dropped, os.POSIX_FADV_DONTNEED)
+                        dropped = offset
+
+        if advise:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        return bytes(head)
+
     def compute_file_hash(self, path: str | pathlib.Path) -> str:
         """
         Computes the hash of a file using the algorithm function
 
         Args:
             path: The path to the file for which to compute the hash.
-            bufsize (int): The size of the buffer to use when reading the file.
 
         Returns:
             str: The hexadecimal representation of the hash.
         """
-        digest = hashlib.new(self.algorithm)
-        with open(path, "rb") as fp:
-            s = fp.read(self.bufsize)
-            while s:
-                digest.update(s)
-                s = fp.read(self.bufsize)
-        return digest.hexdigest()
+        return self.hash_file(path).digest
 
     def compute_string_hash(self, st: str) -> str:
         """
@@ -0,0 +1,131 @@
+"""
+Detection of the encoding format of files, from their name or from their leading bytes.
+"""
+
+import hashlib
+import mimetypes
+import os
+import threading
+
+# Maximum number of results kept in each cache
+MAX_ENTRIES = 4096
+
+# Formats of bioinformatics files, unknown to the mimetypes module. Like mimetypes.guess_type,
+# compressed files have the format of their content
+DEFAULT_EXTENSIONS = {
+    ".sam": "text/x-sam",
+    ".bam": "application/x-bam",
+    ".cram": "application/x-cram",
+    ".vcf": "text/x-vcf",
+    ".vcf.gz": "text/x-vcf",
+    ".bcf": "application/x-bcf",
+    ".fastq": "text/x-fastq",
+    ".fastq.gz": "text/x-fastq",
+    ".fq": "text/x-fastq",
+    ".fq.gz": "text/x-fastq",
+    ".fasta": "text/x-fasta",
+    ".fa": "text/x-fasta",
+}
+
+
+def normalize_extension(extension: str) -> str:
+    """Lower-case extension with its leading dot, e.g. .vcf.gz for VCF.GZ."""
+    extension = extension.lower()
+    return extension if extension.startswith(".") else f".{extension}"
+
+
+class MimeDetector:
+    """
+    Guess the MIME type of files, reusing the work done for the previous ones.
+
+    The type is looked up by extension first, among the configured extensions, the longest one matching
+    such as .vcf.gz before .gz, then among the ones of the mimetypes module. Files without a known
+    extension are sniffed by libmagic from their leading bytes, read while hashing, with one libmagic
+    handle per thread. The results are cached per extension, and per digest of the sniffed bytes, as
+    libmagic looks at all of them: files sharing only a prefix may differ in type.
+    """
+
+    # Extensions checked before the ones of the mimetypes module, see configure()
+    extensions = dict(DEFAULT_EXTENSIONS)
+    _by_extension = {}
+    _by_signature = {}
+    _local = threading.local()
+
+    @classmethod
+    def configure(cls, extensions: dict[str, str] = DEFAULT_EXTENSIONS):
+        """
+        Set the types of the file extensions.
+
+        Args:
+            extensions: MIME type of each extension, e.g. {".bam": "application/x-bam"}.
+                        Compound extensions, such as .vcf.gz, are allowed. The case is ignored.
+        """
+        cls.extensions = {normalize_extension(extension): mime_type for extension, mime_type in extensions.items()}
+        cls._by_extension.clear()
+
+    @classmethod
+    def settings(cls) -> dict:
+        """The arguments of configure() currently in use."""
+        return {"extensions": dict(cls.extensions)}
+
+    @classmethod
+    def _magic(cls):
+        handle = getattr(cls._local, "magic", None)
+        if handle is None:
+            # libmagic is loaded only when the extension isn't enough
+            import magic
+
+            handle = cls._local.magic = magic.Magic(mime=True)
+        return handle
+
+    @classmethod
+    def from_name(cls, fname: str | os.PathLike) -> str | None:
+        """The MIME type of a file name, None if its extension is unknown."""
+        name = os.path.basename(os.fspath(fname))
+        dot = name.find(".", 1)
+        if dot == -1:
+            return None
+        suffixes = name[dot:]
+        if suffixes in cls._by_extension:
+            return cls._by_extension[suffixes]
+
+        mime_type = None
+        extension = suffixes.lower()
+        while extension:
+            if extension in cls.extensions:
+                mime_type = cls.extensions[extension]
+                break
+            dot = extension.find(".", 1)
+            extension = extension[dot:] if dot != -1 else ""
+        if mime_type is None:
+            mime_type = mimetypes.guess_type(name)[0]
+
+        if len(cls._by_extension) < MAX_ENTRIES:
+            cls._by_extension[suffixes] = mime_type
+        return mime_type
+
+    @classmethod
+    def from_head(cls, head: bytes) -> str:
+        """The MIME type of a file sniffed by libmagic from its leading bytes."""
+        signature = hashlib.blake2b(head, digest_size=16).digest()
+        mime_type = cls._by_signature.get(signature)
+        if mime_type is None:
+            mime_type = cls._magic().from_buffer(head)
+            if len(cls._by_signature) < MAX_ENTRIES:
+                cls._by_signature[signature] = mime_type
+        return mime_type
+
+    @classmethod
+    def guess(cls, fname: str | os.PathLike, head: bytes | None = None) -> str | None:
+        """
+        The MIME type of a file.
+
+        Args:
+            fname: Path of the file.
+            head: Leading bytes of the file, if already read. Without them, libmagic opens the file
+                  when the extension is unknown.
+        """
+        mime_type = cls.from_name(fname)
+        if mime_type is None:
+            mime_type = cls.from_head(head) if head else cls._magic().from_file(os.fspath(fname))
+        return mime_type
@@ -0,0 +1,159 @@
+"""
+In-process cache of the responses of the read endpoints of the REST API.
+
+Entries expire after a time to live and the least recently used ones are evicted to
+keep the cache within a number of entries and a number of bytes. Each entry is tagged
+with the collection it was read from, so that a write invalidates only the affected
+responses. Invalidations also bump a generation of the collection, so that a response
+read before a write and cached after it is refused.
+"""
+
+import hashlib
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 1024
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def compute_etag(body: bytes) -> str:
+    """Strong entity tag of a response body."""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+class CachedResponse:
+    """
+    A response body with its entity tag.
+
+    Attributes:
+        body (bytes): The serialised response.
+        etag (str): Entity tag of the body, quoted.
+        collection (str): Name of the collection the response was read from, None if it depends on all of them.
+        expires (float): Monotonic time after which the entry is stale.
+    """
+
+    __slots__ = ("body", "etag", "collection", "expires")
+
+    def __init__(self, body: bytes, collection: str | None, expires: float):
+        self.body = body
+        self.etag = compute_etag(body)
+        self.collection = collection
+        self.expires = expires
+
+
+class ResponseCache:
+    """
+    TTL and LRU cache of serialised responses, bounded by entries and bytes.
+
+    It is meant to be used from the event loop of the application, so it isn't thread-safe.
+
+    Args:
+        ttl: Seconds an entry stays fresh. 0 disables the cache.
+        max_entries: Maximum number of entries.
+        max_bytes: Maximum total size of the cached bodies. Larger bodies are not cached.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        # Number of invalidations so far, and its value at the last one of each collection and of all of them
+        self._invalidations = 0
+        self._generations = {}
+        self._cleared = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_entries > 0
+
+    def get(self, key) -> CachedResponse | None:
+        """Get a fresh entry, marking it as the most recently used."""
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires <= time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def generation(self, collection: str | None = None) -> int:
+        """
+        Generation of the responses read from a collection, or from all of them if None.
+        It changes whenever such responses are invalidated.
+        """
+        if collection is None:
+            return self._invalidations
+        return max(self._generations.get(collection, 0), self._cleared)
+
+    def put(self, key, body: bytes, collection: str | None = None, generation: int | None = None) -> CachedResponse:
+        """
+        Cache a response body, evicting the least recently used entries if needed.
+
+        Args:
+            key: Key of the entry.
+            body: The serialised response.
+            collection: Name of the collection the response was read from, None if it depends on all of them.
+            generation: The generation() of the collection before the response was read. If it has changed
+                        since, a write may have happened in between and the response is not cached.
+
+        Returns:
+            CachedResponse: The entry, returned even when it can't be cached.
+        """
+        entry = CachedResponse(body, collection, time.monotonic() + self.ttl)
+        if not self.enabled or len(body) > self.max_bytes:
+            return entry
+        if generation is not None and generation != self.generation(collection):
+            return entry
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = entry
+        self.nbytes += len(body)
+        while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+        return entry
+
+    def configure(self, ttl: float, max_entries: int, max_bytes: int) -> None:
+        """Change the settings of the cache, evicting the entries beyond the new bounds."""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        if not self.enabled:
+            self.invalidate()
+        while len(self._entries) > self.max_entries or self.nbytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, collection: str | None = None) -> None:
+        """
+        Drop the entries read from a collection and the ones depending on all of them.
+
+        Args:
+            collection: Name of the collection written to. If None, the whole cache is cleared.
+        """
+        self._invalidations += 1
+        if collection is None:
+            self._cleared = self._invalidations
+            self._generations.clear()
+            self._entries.clear()
+            self.nbytes = 0
+            return
+        self._generations[collection] = self._invalidations
+        for key in [key for key, entry in self._entries.items() if entry.collection in (collection, None)]:
+            self._remove(key)
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key)
+        self.nbytes -= len(entry.body)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def summary(self) -> str:
+        return f"Response cache: {len(self)} entries, {self.nbytes} bytes, {self.hits} hits, {self.misses} misses"
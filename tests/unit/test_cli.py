@@ -0,0 +1,96 @@
+import re
+import subprocess
+import sys
+import unittest
+
+import click
+import cloup
+from click.testing import CliRunner
+
+from omnia.cli.lazy_group import LazyGroup
+
+# Dependencies that only the subcommands using them may import
+HEAVY_MODULES = {"fastapi", "uvicorn", "mongoengine", "pymongo", "magic"}
+
+
+def imported_modules(code: str) -> set[str]:
+    """Modules imported by the code, as reported by -X importtime."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True)
+    return set(re.findall(r"^import time:\s+\d+ \|\s+\d+ \|\s+(\S+)$", result.stderr, re.MULTILINE))
+
+
+class TestStartup(unittest.TestCase):
+    def test_import_main(self):
+        modules = imported_modules("import omnia.main")
+        self.assertIn("omnia.main", modules)
+        self.assertFalse(HEAVY_MODULES & modules)
+        self.assertNotIn("omnia.cli.co", modules)
+
+    def test_help(self):
+        for args in ("'--help'", ""):
+            with self.subTest(args=args):
+                modules = imported_modules(
+                    f"import sys; sys.argv = ['omnia', {args}]; from omnia.main import main; main()"
+                )
+                self.assertFalse((HEAVY_MODULES | {"pydantic"}) & modules)
+                self.assertNotIn("omnia.cli.co", modules)
+
+    def test_info(self):
+        modules = imported_modules("import sys; sys.argv = ['omnia', 'info']; from omnia.main import main; main()")
+        # Modules imported with importlib aren't reported, the ones they import are
+        self.assertIn("omnia.config.config_manager", modules)
+        self.assertFalse(HEAVY_MODULES & modules)
+
+
+@cloup.command("hello", aliases=["hi"], help="Say hello.")
+def hello():
+    print("hello")
+
+
+class TestLazyGroup(unittest.TestCase):
+    def setUp(self):
+        @cloup.group(cls=LazyGroup, show_subcommand_aliases=True)
+        def group():
+            pass
+
+        group.lazy_section("Greetings", hello=(f"{__name__}:hello", "Say hello.", ["hi"]))
+        group.add_lazy_command("info", "omnia.cli.info:info", "Show Omnia details")
+        self.group = group
+
+    def test_invoke(self):
+        runner = CliRunner()
+        for name in ("hello", "hi"):
+            result = runner.invoke(self.group, [name])
+            self.assertEqual(result.exit_code, 0)
+            self.assertEqual(result.output, "hello\n")
+        # Only the invoked subcommand is imported
+        self.assertEqual(list(self.group.commands), ["hello"])
+        self.assertEqual(list(self.group.lazy_commands), ["info"])
+
+    def test_help(self):
+        result = CliRunner().invoke(self.group, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertRegex(result.output, r"Greetings:\n\s+hello \(hi\)\s+Say hello.")
+        self.assertRegex(result.output, r"Other commands:\n\s+info\s+Show Omnia details")
+        # Listed without being imported
+        self.assertEqual(list(self.group.lazy_commands), ["hello", "info"])
+
+        # Once imported, a command is listed at the place of its placeholder
+        CliRunner().invoke(self.group, ["hi"])
+        self.assertEqual(CliRunner().invoke(self.group, ["--help"]).output, result.output)
+
+    def test_declared_help(self):
+        from omnia.main import cli
+
+        with click.Context(cli) as ctx:
+            for section in cli.list_sections(ctx):
+                for name, placeholder in section.list_commands():
+                    with self.subTest(name=name):
+                        cmd = cli.get_command(ctx, name)
+                        self.assertEqual(placeholder.get_short_help_str(), cmd.get_short_help_str())
+                        self.assertEqual(placeholder.aliases, getattr(cmd, "aliases", []))
+
+    def test_bad_command_name(self):
+        result = CliRunner().invoke(self.group, ["helo"])
+        self.assertNotEqual(result.exit_code, 0)
+        self.assertIn("Did you mean 'hello'?", result.output)
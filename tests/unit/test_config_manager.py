@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from omnia.config.config_manager import ConfigurationManager, get_snapshot_path
+
+CONFIG = """
+mdbc:
+  uri: "mongodb://localhost:27017/{database}"
+api:
+  cache_ttl: {ttl}
+"""
+
+
+class TestConfigurationManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        patcher = patch("omnia.config.config_manager.cache_dir", Path(self.tmp_dir.name, "cache"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.config_file = self.write_config("config.yaml", database="omnia", ttl=30)
+
+    def tearDown(self):
+        ConfigurationManager.clear_instances()
+        self.tmp_dir.cleanup()
+
+    def write_config(self, name, mtime=None, **values) -> Path:
+        config_file = Path(self.tmp_dir.name, name)
+        config_file.write_text(CONFIG.format(**values))
+        if mtime is not None:
+            os.utime(config_file, (mtime, mtime))
+        return config_file
+
+    def test_instances(self):
+        cm = ConfigurationManager(cf=self.config_file)
+        self.assertEqual(cm.get_mdbc_uri, "mongodb://localhost:27017/omnia")
+        self.assertIs(ConfigurationManager(), cm)
+        self.assertIs(ConfigurationManager(cf=str(self.config_file)), cm)
+
+        other_file = self.write_config("other.yaml", database="other", ttl=30)
+        other = ConfigurationManager(cf=other_file)
+        self.assertEqual(other.get_mdbc_uri, "mongodb://localhost:27017/other")
+        overridden = ConfigurationManager(cf=self.config_file, uri="mongodb://example.com/omnia")
+        self.assertEqual(overridden.get_mdbc_uri, "mongodb://example.com/omnia")
+        self.assertEqual(len({id(cm), id(other), id(overridden)}), 3)
+        # The last one created is the one of the process
+        self.assertIs(ConfigurationManager(), overridden)
+
+    def test_snapshot(self):
+        ConfigurationManager(cf=self.config_file)
+        self.assertTrue(get_snapshot_path(self.config_file).exists())
+        ConfigurationManager.clear_instances()
+
+        with patch.object(ConfigurationManager, "_parse") as parse:
+            cm = ConfigurationManager(cf=self.config_file)
+        parse.assert_not_called()
+        self.assertEqual(cm.get_api_config.cache_ttl, 30)
+        ConfigurationManager.clear_instances()
+
+        # The snapshots of other versions of the configuration models are ignored
+        with patch("omnia.config.config_manager.get_models_fingerprint", return_value=()):
+            cm = ConfigurationManager(cf=self.config_file)
+        self.assertEqual(cm.get_mimetypes_config.extensions[".bam"], "application/x-bam")
+
+    def test_reload(self):
+        cm = ConfigurationManager(cf=self.config_file)
+        self.assertFalse(cm.reload())
+
+        self.write_config("config.yaml", mtime=1_000_000, database="omnia", ttl=5)
+        self.assertTrue(cm.reload())
+        self.assertEqual(cm.get_api_config.cache_ttl, 5)
+
+        # An invalid configuration is ignored
+        self.write_config("config.yaml", mtime=2_000_000, database="omnia", ttl=-1)
+        self.assertFalse(cm.reload())
+        self.assertEqual(cm.get_api_config.cache_ttl, 5)
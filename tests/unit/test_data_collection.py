@@ -0,0 +1,114 @@
+import unittest
+
+import mongomock
+from mongoengine import ValidationError, connect, disconnect
+
+from omnia.cli.commons import CollectionNameResolver
+from omnia.models.commons import migrate_json_fields
+from omnia.models.data_collection import Datacatalog, DataCollection
+
+
+class TestJSONField(unittest.TestCase):
+    def setUp(self):
+        connect("omnia_test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+        self.collection = Datacatalog._get_collection()
+        self.collection.insert_one({"name": "legacy", "uk": "legacy", "notes": '{"project": "X", "run": {"id": "r1"}}'})
+        native = DataCollection(name="native")
+        native.mdb_obj.notes = '{"project": "Y", "run": {"id": "r2"}}'
+        native.save()
+
+    def tearDown(self):
+        disconnect()
+
+    def test_native_storage(self):
+        self.assertEqual(self.collection.find_one({"name": "native"})["notes"], {"project": "Y", "run": {"id": "r2"}})
+        self.assertEqual(Datacatalog.objects(name="legacy").first().notes, {"project": "X", "run": {"id": "r1"}})
+        with self.assertRaises(ValidationError):
+            Datacatalog(name="invalid", uk="invalid", notes="[1, 2]").validate()
+
+    def test_migration(self):
+        self.assertEqual(migrate_json_fields(Datacatalog), 1)
+        self.assertEqual(migrate_json_fields(Datacatalog), 0)
+        self.assertEqual(self.collection.find_one({"name": "legacy"})["notes"]["project"], "X")
+        self.assertIn("notes.$**_1", self.collection.index_information())
+
+    def test_query(self):
+        query = DataCollection().query
+        # The legacy notes are matched once migrated, reads don't write
+        self.assertFalse(query(notes={"project": "X"}))
+        migrate_json_fields(Datacatalog)
+        self.assertEqual([doc["name"] for doc in query(notes={"project": "X"})], ["legacy"])
+        self.assertEqual([doc["name"] for doc in query(notes={"run.id": "r2"})], ["native"])
+
+        # Values are matched exactly unless asked otherwise
+        self.assertFalse(query(notes={"project": "x"}))
+        self.assertEqual([doc["name"] for doc in query(contains=True, notes={"run.id": "R2"})], ["native"])
+        self.assertFalse(query(case_sensitive=True, contains=True, notes={"run.id": "R2"}))
+        self.assertEqual(query(notes={"run.id": "r2"}).queryset._query, {"notes.run.id": "r2"})
+        self.assertEqual(len(query(case_sensitive=True, notes={"project": "Y"}, name="native")), 1)
+        self.assertFalse(query(notes={"project": "Y"}, name="legacy"))
+
+
+class TestCollectionNameResolver(unittest.TestCase):
+    def setUp(self):
+        connect("omnia_test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+        self.collections = [DataCollection(name=f"collection_{i}") for i in range(3)]
+        for collection in self.collections:
+            collection.save()
+
+    def tearDown(self):
+        disconnect()
+
+    def test_resolve(self):
+        resolver = CollectionNameResolver()
+        ids = [collection.mdb_obj.pk for collection in reversed(self.collections)]
+        self.assertEqual(resolver.resolve(ids), ["collection_2", "collection_1", "collection_0"])
+
+        # Names are served from the cache once resolved
+        Datacatalog.objects(pk=ids[0]).delete()
+        self.assertEqual(resolver.resolve(ids[:1]), ["collection_2"])
+        self.assertEqual(CollectionNameResolver().resolve(ids[:1]), [str(ids[0])])
+
+
+class TestMongoMixin(unittest.TestCase):
+    def setUp(self):
+        connect("omnia_test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+        DataCollection(name="collection", description="first").save()
+
+    def tearDown(self):
+        disconnect()
+
+    def test_map(self):
+        collection = DataCollection(name="collection").map()
+        self.assertEqual(collection.mdb_obj.description, "first")
+        self.assertTrue(collection.is_mapped)
+        self.assertEqual(DataCollection(pk=collection.mdb_obj.pk).map().mdb_obj.name, "collection")
+        self.assertEqual(collection.view()["name"], "collection")
+        self.assertIsNone(DataCollection(name="missing").map())
+        self.assertFalse(DataCollection(name="missing").is_mapped)
+
+    def test_update(self):
+        collection = DataCollection(name="collection").map()
+        collection.mdb_obj.description = "second"
+        self.assertTrue(collection.update())
+        self.assertTrue(collection.update(set__keywords=["a"]))
+        self.assertEqual(collection.mdb_obj.keywords, ["a"])
+        stored = Datacatalog.objects(name="collection").first()
+        self.assertEqual((stored.description, stored.keywords), ("second", ["a"]))
+        self.assertFalse(DataCollection(name="collection").update())
+
+    def test_concurrent_update(self):
+        first = DataCollection(name="collection").map()
+        second = DataCollection(name="collection").map()
+        first.mdb_obj.description = "first writer"
+        self.assertTrue(first.update())
+        second.mdb_obj.description = "second writer"
+        self.assertFalse(second.update())
+        self.assertFalse(second.update(set__description="second writer"))
+        self.assertEqual(Datacatalog.objects(name="collection").first().description, "first writer")
+
+    def test_delete(self):
+        collection = DataCollection(name="collection").map()
+        collection.delete()
+        self.assertIsNone(collection.mdb_obj.id)
+        self.assertEqual(Datacatalog.objects.count(), 0)
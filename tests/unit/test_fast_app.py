@@ -0,0 +1,163 @@
+import asyncio
+import datetime
+import gzip
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from bson import ObjectId
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from pymongo import DeleteOne, InsertOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from omnia.cli.fast_app import (
+    BULK_COUNTS,
+    BulkBodyError,
+    create_app,
+    etag_matches,
+    get_database,
+    get_keyset_filter,
+    get_projection,
+    iter_lines,
+    parse_bulk_operation,
+    to_ndjson,
+    write_bulk_batch,
+)
+from omnia.utils import ResponseCache
+
+
+class TestPagination(unittest.TestCase):
+    def test_projection(self):
+        self.assertEqual(get_projection("path, size,"), {"path": 1, "size": 1, "_id": 1})
+
+    def test_keyset_filter(self):
+        oid = ObjectId()
+        self.assertEqual(get_keyset_filter(None), {})
+        self.assertEqual(get_keyset_filter(str(oid)), {"_id": {"$gt": oid}})
+        with self.assertRaises(HTTPException) as cm:
+            get_keyset_filter("not-an-id")
+        self.assertEqual(cm.exception.status_code, 400)
+
+    def test_to_ndjson(self):
+        oid = ObjectId()
+        line = to_ndjson({"_id": oid, "path": "/a", "date": datetime.datetime(2024, 1, 1)})
+        self.assertTrue(line.endswith("\n"))
+        self.assertEqual(json.loads(line), {"_id": str(oid), "path": "/a", "date": "2024-01-01 00:00:00"})
+
+
+class TestBulk(unittest.TestCase):
+    @staticmethod
+    async def chunks(data: bytes, size: int = 7):
+        for start in range(0, len(data), size):
+            yield data[start : start + size]
+
+    def read_lines(self, data: bytes, gzipped: bool = False, **limits) -> list[bytes]:
+        async def collect():
+            return [line async for line in iter_lines(self.chunks(data), gzipped=gzipped, **limits)]
+
+        return asyncio.run(collect())
+
+    def test_iter_lines(self):
+        body = b'{"op": "insert"}\n{"op": "delete"}\n\n{"op": "update"}'
+        expected = [b'{"op": "insert"}', b'{"op": "delete"}', b"", b'{"op": "update"}']
+        self.assertEqual(self.read_lines(body), expected)
+        self.assertEqual(self.read_lines(gzip.compress(body), gzipped=True), expected)
+
+    def test_iter_lines_errors(self):
+        body = b'{"op": "insert"}\n' * 100
+        for data, limits, status_code in (
+            (gzip.compress(body)[:-8], {}, 400),
+            (b"not gzipped", {}, 400),
+            (body, {"max_bytes": 100}, 413),
+            (gzip.compress(body), {"max_decompressed_bytes": 100}, 413),
+        ):
+            with self.subTest(limits=limits), self.assertRaises(BulkBodyError) as cm:
+                self.read_lines(data, gzipped=data != body, **limits)
+            self.assertEqual(cm.exception.status_code, status_code)
+
+    @patch("omnia.cli.fast_app.BULK_BATCH_SIZE", 2)
+    def test_bulk_partial_body(self):
+        collection = MagicMock()
+        collection.bulk_write = AsyncMock(
+            return_value=MagicMock(bulk_api_result={"nInserted": 2, "writeErrors": [], "upserted": []})
+        )
+        app = create_app("mongodb://localhost:27017/omnia", "omnia")
+        app.dependency_overrides[get_database] = lambda: {"datasets": collection}
+        body = b"".join(b'{"op": "insert", "document": {"_id": %d}}\n' % i for i in range(5))
+        with TestClient(app) as client:
+            # The gzip trailer is missing, so the body can't be read to its end
+            response = client.post(
+                "/collections/datasets/_bulk",
+                content=gzip.compress(body)[:-8],
+                headers={"Content-Encoding": "gzip"},
+            )
+        self.assertEqual(response.status_code, 400)
+        report = response.json()
+        self.assertEqual(report["inserted"], 4)
+        self.assertEqual([item["status"] for item in report["items"]], ["ok"] * 4 + ["error"])
+        self.assertEqual(collection.bulk_write.await_count, 2)
+
+    def test_parse_bulk_operation(self):
+        oid = ObjectId()
+        op, request, document = parse_bulk_operation(b'{"op": "insert", "document": {"path": "/a"}}')
+        self.assertEqual((op, request, document), ("insert", InsertOne({"path": "/a"}), {"path": "/a"}))
+        line = f'{{"op": "upsert", "filter": {{"_id": {{"$oid": "{oid}"}}}}, "update": {{"size": 1}}}}'
+        self.assertEqual(parse_bulk_operation(line.encode())[1], UpdateOne({"_id": oid}, {"$set": {"size": 1}}, True))
+        line = b'{"op": "update", "filter": {"path": "/a"}, "update": {"$inc": {"size": 1}}}'
+        self.assertEqual(parse_bulk_operation(line)[1], UpdateOne({"path": "/a"}, {"$inc": {"size": 1}}, False))
+        self.assertEqual(
+            parse_bulk_operation(b'{"op": "delete", "filter": {"path": "/a"}}')[1], DeleteOne({"path": "/a"})
+        )
+        for line in (
+            b"[]",
+            b'{"op": "drop"}',
+            b'{"op": "delete", "filter": {}}',
+            b'{"op": "update", "filter": {"a": 1}}',
+        ):
+            with self.subTest(line=line), self.assertRaises(ValueError):
+                parse_bulk_operation(line)
+
+    def test_write_bulk_batch(self):
+        batch = [parse_bulk_operation(line) for line in (b'{"op": "insert", "document": {"uk": 1}}',) * 2]
+        batch.append(parse_bulk_operation(b'{"op": "upsert", "filter": {"uk": 2}, "update": {"size": 1}}'))
+        batch = [(index, request, document) for index, (_, request, document) in enumerate(batch)]
+        batch[0][2]["_id"], batch[1][2]["_id"] = ObjectId(), ObjectId()
+        upserted_id = ObjectId()
+        details = {
+            "writeErrors": [{"index": 1, "errmsg": "E11000 duplicate key error"}],
+            "upserted": [{"index": 2, "_id": upserted_id}],
+            "nInserted": 1,
+            "nUpserted": 1,
+        }
+        collection = MagicMock()
+        collection.bulk_write = AsyncMock(side_effect=BulkWriteError(details))
+        items = [{"status": "ok"} for _ in batch]
+        counts = dict.fromkeys(BULK_COUNTS, 0)
+
+        asyncio.run(write_bulk_batch(collection, batch, items, counts))
+        self.assertEqual(collection.bulk_write.call_args.kwargs, {"ordered": False})
+        self.assertEqual(items[0], {"status": "ok", "_id": str(batch[0][2]["_id"])})
+        self.assertEqual(items[1], {"status": "error", "error": "E11000 duplicate key error"})
+        self.assertEqual(items[2], {"status": "ok", "_id": str(upserted_id)})
+        self.assertEqual(counts, {"inserted": 1, "matched": 0, "modified": 0, "upserted": 1, "deleted": 0})
+
+
+class TestResponseCaching(unittest.TestCase):
+    def test_etag_matches(self):
+        self.assertTrue(etag_matches('"a", W/"b"', '"b"'))
+        self.assertTrue(etag_matches("*", '"b"'))
+        self.assertFalse(etag_matches('"a"', '"b"'))
+        self.assertFalse(etag_matches(None, '"b"'))
+
+    def test_cached_endpoints(self):
+        cache = ResponseCache()
+        entry = cache.put(("path", "datasets", "data/a.bam"), b'{"path": "data/a.bam"}', collection="datasets")
+        app = create_app("mongodb://localhost:27017/omnia", "omnia", cache=cache)
+        with TestClient(app) as client:
+            response = client.get("/collections/datasets/path/data/a.bam")
+            self.assertEqual((response.status_code, response.json()), (200, {"path": "data/a.bam"}))
+            self.assertEqual(response.headers["etag"], entry.etag)
+
+            response = client.get("/collections/datasets/path/data/a.bam", headers={"If-None-Match": entry.etag})
+            self.assertEqual((response.status_code, response.content), (304, b""))
@@ -0,0 +1,64 @@
+import glob
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from omnia.utils import FileScanner
+
+FILES = ("x.txt", "y.bam", "a/z.txt", "a/b/w.bam", "a/b/c/v.txt", "d/u.fq", ".h/q.txt", "a/.hidden.txt", "a/[x].txt")
+
+
+class TestFileScanner(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.root = self.tmp_dir.name
+        for name in FILES:
+            path = Path(self.root, name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.touch()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def scan(self, source, **kwargs):
+        return sorted(entry.path for entry in FileScanner(source, **kwargs))
+
+    def test_glob_semantic(self):
+        for pattern in ("**/*.txt", "**", "*", "a/*/*.bam", "a/z.txt", "?/z.txt", "a/[[]x].txt", "[!a]/*"):
+            source = os.path.join(self.root, pattern)
+            expected = sorted(path for path in glob.glob(source, recursive=True) if os.path.isfile(path))
+            with self.subTest(pattern=pattern):
+                self.assertEqual(self.scan(source), expected)
+                scanner = FileScanner(source)
+                self.assertTrue(all(scanner.matches(path) for path in expected))
+
+    def test_directory(self):
+        expected = [os.path.join(self.root, name) for name in FILES if "/." not in f"/{name}"]
+        self.assertEqual(self.scan(self.root), sorted(expected))
+
+    def test_hidden(self):
+        hidden = os.path.join(self.root, "a/.hidden.txt")
+        self.assertEqual(self.scan(hidden), [hidden])
+        self.assertTrue(FileScanner(hidden).matches(hidden))
+        self.assertEqual(self.scan(os.path.join(self.root, ".h/*.txt")), [os.path.join(self.root, ".h/q.txt")])
+        # Wildcards don't match hidden names
+        for source in (self.root, os.path.join(self.root, "**/*.txt"), os.path.join(self.root, "*/q.txt")):
+            with self.subTest(source=source):
+                scanner = FileScanner(source)
+                self.assertFalse(scanner.matches(hidden))
+                self.assertFalse(scanner.matches(os.path.join(self.root, ".h/q.txt")))
+
+    def test_filters(self):
+        self.assertEqual(
+            self.scan(self.root, include=["*.txt"], exclude=["b"]),
+            sorted(os.path.join(self.root, name) for name in ("x.txt", "a/z.txt", "a/[x].txt")),
+        )
+        self.assertEqual(
+            self.scan(self.root, max_depth=0), [os.path.join(self.root, "x.txt"), os.path.join(self.root, "y.bam")]
+        )
+        scanner = FileScanner(self.root, exclude=["b"], max_depth=1)
+        self.assertTrue(scanner.matches(os.path.join(self.root, "a/z.txt")))
+        self.assertFalse(scanner.matches(os.path.join(self.root, "a/b/w.bam")))
+        self.assertFalse(scanner.matches(os.path.join(self.root, "a/b/c/v.txt")))
+        self.assertFalse(scanner.matches("/elsewhere/x.txt"))
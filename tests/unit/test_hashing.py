@@ -0,0 +1,127 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from omnia.models.data_object import PosixDataObject
+from omnia.utils import HashCache, Hashing
+from omnia.utils.hashing import HASH_LENGTH
+
+DATA_DIR = Path(__file__).parent.parent / "data"
+
+
+class TestHashing(unittest.TestCase):
+    def setUp(self):
+        self.file_path = DATA_DIR / "file.bin"
+        self.checksum = (DATA_DIR / "checksum.txt").read_text().split()[0]
+
+    def test_compute_file_hash(self):
+        hg = Hashing()
+        self.assertEqual(hg.compute_file_hash(self.file_path), self.checksum)
+        self.assertEqual(hg.compute_file_hash(str(self.file_path)), self.checksum)
+
+    def test_hash_file(self):
+        file_hash = Hashing().hash_file(self.file_path)
+        self.assertEqual(file_hash.digest, self.checksum)
+        self.assertEqual(file_hash.size, self.file_path.stat().st_size)
+        self.assertEqual(file_hash.head, self.file_path.read_bytes()[: len(file_hash.head)])
+        self.assertTrue(file_hash.is_current())
+
+    def test_read_strategies(self):
+        try:
+            for settings in ({"bufsize": 100, "mmap_threshold": None}, {"bufsize": 100, "mmap_threshold": 1}):
+                Hashing.configure(**settings)
+                file_hash = Hashing().hash_file(self.file_path)
+                self.assertEqual(file_hash.digest, self.checksum)
+                self.assertEqual(file_hash.head, self.file_path.read_bytes())
+        finally:
+            Hashing.configure()
+
+    def test_compute_hash(self):
+        hg = Hashing()
+        uk = hg.compute_hash(fpath=self.file_path)
+        self.assertEqual(len(uk), HASH_LENGTH)
+        self.assertEqual(uk, hg.compute_unique_key(hg.hash_file(self.file_path)))
+        self.assertEqual(uk, hg.compute_hash(fpath=str(self.file_path)))
+        self.assertIsNone(hg.compute_hash())
+        with self.assertRaises(ValueError):
+            hg.compute_hash(fpath=self.file_path, st="string")
+
+
+class TestPosixDataObjectHashing(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.tmp_dir.name, "file.bin")
+        shutil.copyfile(DATA_DIR / "file.bin", self.file_path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_file_read_once(self):
+        hg = Hashing()
+        with patch.object(hg, "hash_file", wraps=hg.hash_file) as hash_file:
+            pdo = PosixDataObject(path=str(self.file_path)).compute()
+        hash_file.assert_called_once()
+        self.assertEqual(pdo.mdb_obj.checksum, hg.compute_file_hash(self.file_path))
+        self.assertEqual(pdo.mdb_obj.size, self.file_path.stat().st_size)
+        self.assertEqual(pdo.mdb_obj.uk, hg.compute_hash(fpath=self.file_path))
+
+    def test_file_changed(self):
+        pdo = PosixDataObject(path=str(self.file_path))
+        with open(self.file_path, "ab") as fp:
+            fp.write(b"more content")
+        st = self.file_path.stat()
+        os.utime(self.file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+        pdo.compute()
+        self.assertEqual(pdo.mdb_obj.size, st.st_size)
+        self.assertEqual(pdo.mdb_obj.checksum, Hashing().compute_file_hash(self.file_path))
+
+
+class TestHashCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.file_path = Path(self.tmp_dir.name, "file.bin")
+        shutil.copyfile(DATA_DIR / "file.bin", self.file_path)
+        self.cache = HashCache(Path(self.tmp_dir.name, "cache", "hash_cache.sqlite"))
+        Hashing.set_cache(self.cache)
+
+    def tearDown(self):
+        Hashing.set_cache(None)
+        self.tmp_dir.cleanup()
+
+    def test_unchanged_file_not_read(self):
+        hg = Hashing()
+        digest = hg.compute_file_hash(self.file_path)
+        self.assertEqual((self.cache.hits, self.cache.misses), (0, 1))
+
+        with patch("builtins.open", side_effect=AssertionError("file read")):
+            file_hash = hg.hash_file(self.file_path)
+        self.assertTrue(file_hash.cached)
+        self.assertEqual(file_hash.digest, digest)
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_changed_file(self):
+        hg = Hashing()
+        hg.compute_file_hash(self.file_path)
+        with open(self.file_path, "ab") as fp:
+            fp.write(b"more content")
+        self.assertEqual(hg.compute_file_hash(self.file_path), hg.compute_file_hash(self.file_path))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 2))
+        self.assertEqual(len(self.cache), 2)
+
+    def test_eviction(self):
+        self.cache.max_entries = 2
+        for i in range(3):
+            self.cache.put(SimpleNamespace(st_dev=0, st_ino=i, st_size=0, st_mtime_ns=0), "sha256", str(i))
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_pickle(self):
+        Hashing().compute_file_hash(self.file_path)
+        cache = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(len(cache), 1)
+        cache.close()
@@ -0,0 +1,29 @@
+import unittest
+
+import mongomock
+from mongoengine import connect, disconnect
+
+from omnia.mongo.indexes import ensure_indexes, plan_summary
+
+
+class TestIndexes(unittest.TestCase):
+    def setUp(self):
+        connect("omnia_test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+
+    def tearDown(self):
+        disconnect()
+
+    def test_ensure_indexes(self):
+        indexes = ensure_indexes()
+        self.assertTrue(
+            {"path_1", "path_ci", "included_in_datacatalog_1_path_1", "checksum_1"} <= set(indexes["datasets"])
+        )
+        self.assertTrue({"name_1", "notes.$**_1"} <= set(indexes["data_catalogs"]))
+
+    def test_plan_summary(self):
+        ixscan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "path_1"}}
+        self.assertEqual(plan_summary({"queryPlanner": {"winningPlan": ixscan}}), "FETCH < IXSCAN path_1")
+        sbe = {"queryPlanner": {"winningPlan": {"queryPlan": {"stage": "COLLSCAN"}, "slotBasedPlan": {}}}}
+        self.assertEqual(plan_summary(sbe), "COLLSCAN")
+        union = {"stage": "OR", "inputStages": [{"stage": "IXSCAN", "indexName": "checksum_1"}]}
+        self.assertEqual(plan_summary({"queryPlanner": {"winningPlan": union}}), "OR < IXSCAN checksum_1")
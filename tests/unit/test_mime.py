@@ -0,0 +1,69 @@
+import gzip
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from omnia.utils import MimeDetector, guess_mimetype
+from omnia.utils.mime import DEFAULT_EXTENSIONS
+
+
+class TestMimeDetector(unittest.TestCase):
+    def setUp(self):
+        MimeDetector.configure()
+        MimeDetector._by_signature.clear()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        MimeDetector.configure()
+        self.tmp_dir.cleanup()
+
+    def test_from_name(self):
+        self.assertEqual(MimeDetector.from_name("/data/sample.R1.FASTQ.gz"), "text/x-fastq")
+        self.assertEqual(MimeDetector.from_name("/data/calls.vcf.gz"), "text/x-vcf")
+        self.assertEqual(MimeDetector.from_name("/data/reads.bam"), "application/x-bam")
+        self.assertEqual(MimeDetector.from_name("/data/notes.txt"), "text/plain")
+        self.assertIsNone(MimeDetector.from_name("/data/reads"))
+        self.assertIsNone(MimeDetector.from_name("/data/.hidden"))
+
+        MimeDetector.configure(extensions={"BAM": "application/vnd.bam", ".fastq.gz": "application/gzip"})
+        self.assertEqual(
+            MimeDetector.settings(), {"extensions": {".bam": "application/vnd.bam", ".fastq.gz": "application/gzip"}}
+        )
+        self.assertEqual(MimeDetector.from_name("/data/reads.bam"), "application/vnd.bam")
+        self.assertEqual(MimeDetector.from_name("/data/sample.R1.fastq.gz"), "application/gzip")
+        # Without the default extensions, VCF files are taken for vCards
+        self.assertEqual(MimeDetector.from_name("/data/calls.vcf"), "text/vcard")
+        MimeDetector.configure(extensions=DEFAULT_EXTENSIONS)
+        self.assertEqual(MimeDetector.from_name("/data/calls.vcf"), "text/x-vcf")
+
+    def test_from_head(self):
+        head = gzip.compress(b"@read1\nACGT\n+\nIIII\n")
+        with patch.object(MimeDetector, "_magic", wraps=MimeDetector._magic) as magic:
+            self.assertEqual(MimeDetector.from_head(head), "application/gzip")
+            # Identical heads are sniffed once
+            self.assertEqual(MimeDetector.from_head(bytes(head)), "application/gzip")
+        magic.assert_called_once()
+
+    def test_from_head_shared_prefix(self):
+        prefix = b'{"sample": "A", '
+        self.assertEqual(MimeDetector.from_head(prefix + b'"reads": 12}\n'), "application/json")
+        self.assertEqual(MimeDetector.from_head(prefix + bytes(range(256)) * 4), "application/octet-stream")
+
+    def test_guess(self):
+        path = Path(self.tmp_dir.name, "reads")
+        path.write_bytes(b"%PDF-1.4\n" + bytes(range(256)))
+        self.assertEqual(guess_mimetype(path, head=b"%PDF-1.4\n"), "application/pdf")
+        with patch.object(MimeDetector, "from_head") as from_head:
+            self.assertEqual(guess_mimetype(path), "application/pdf")
+            self.assertEqual(guess_mimetype(Path(self.tmp_dir.name, "reads.cram"), head=b"CRAM"), "application/x-cram")
+        from_head.assert_not_called()
+
+    def test_handle_per_thread(self):
+        handles = [MimeDetector._magic()]
+        thread = threading.Thread(target=lambda: handles.append(MimeDetector._magic()))
+        thread.start()
+        thread.join()
+        self.assertIs(MimeDetector._magic(), handles[0])
+        self.assertIsNot(handles[1], handles[0])
@@ -0,0 +1,45 @@
+import unittest
+
+import mongomock
+from mongoengine import connect, disconnect
+
+from omnia.models.commons import PATH_COLLATION
+from omnia.models.data_object import Dataset, PosixDataObject
+from omnia.mongo.mixin import QueryResult
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        connect("omnia_test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+        Dataset._get_collection().insert_many(
+            [{"path": f"/data/File_{i}.txt", "uk": str(i), "size": i} for i in range(5)]
+        )
+
+    def tearDown(self):
+        disconnect()
+
+    def test_query(self):
+        result = PosixDataObject().query(case_sensitive=True, path="/data/File_1.txt")
+        self.assertIsInstance(result, QueryResult)
+        self.assertTrue(result)
+        self.assertEqual(len(result), 1)
+        self.assertEqual([doc["size"] for doc in result], [1])
+        self.assertFalse(PosixDataObject().query(case_sensitive=True, path="/data/file_1.TXT"))
+
+    def test_case_insensitive_path(self):
+        # Compared with the collation of the path_ci index rather than a regex. mongomock has no collations
+        queryset = PosixDataObject().query(path="/data/file_1.TXT", size=1).queryset
+        self.assertEqual(queryset._query, {"path": "/data/file_1.TXT", "size": 1})
+        self.assertEqual(queryset._collation, PATH_COLLATION)
+        self.assertIsNone(PosixDataObject().query(size=1).queryset._collation)
+        self.assertIsNone(PosixDataObject().query(case_sensitive=True, path="/data/file_1.TXT").queryset._collation)
+
+    def test_projection(self):
+        docs = list(PosixDataObject().query(size=2, projection=("path",)))
+        self.assertEqual(docs, [{"_id": docs[0]["_id"], "path": "/data/File_2.txt"}])
+
+    def test_empty_query(self):
+        result = PosixDataObject().query()
+        self.assertFalse(result)
+        self.assertEqual(len(result), 0)
+        self.assertEqual(list(result), [])
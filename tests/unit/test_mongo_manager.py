@@ -0,0 +1,97 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from omnia.mongo.mongo_manager import MIN_READY_DELAY, MongoDBManager
+
+
+class TestMongoDBManager(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.pidfile = Path(self.tmp_dir.name, "mongod.pid")
+        self.manager = MongoDBManager(
+            dbpath=Path(self.tmp_dir.name, "db"), logpath=Path(self.tmp_dir.name, "mongod.log"), pidfile=self.pidfile
+        )
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @patch("omnia.mongo.mongo_manager.time.sleep")
+    @patch("omnia.mongo.mongo_manager.ping", side_effect=[False, False, False, True])
+    def test_wait_until_ready(self, ping, sleep):
+        self.assertTrue(self.manager.wait_until_ready())
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [MIN_READY_DELAY * 2**i for i in range(3)])
+
+        self.manager.timeout = 0
+        ping.side_effect = None
+        ping.return_value = False
+        self.assertFalse(self.manager.wait_until_ready())
+
+    @patch("omnia.mongo.mongo_manager.ping", return_value=True)
+    @patch("omnia.mongo.mongo_manager.subprocess.Popen")
+    def test_start_and_keep_alive(self, popen, ping):
+        popen.return_value = MagicMock(pid=os.getpid(), **{"poll.return_value": None})
+        self.manager.keep_alive = True
+        self.manager.start()
+        popen.assert_called_once()
+        self.assertTrue(popen.call_args.kwargs["start_new_session"])
+        self.assertEqual(json.loads(self.pidfile.read_text()), {"pid": os.getpid(), "port": 27018, "keep_alive": True})
+
+        # The server is left running and the next manager attaches to it
+        self.assertFalse(self.manager.stop())
+        popen.return_value.terminate.assert_not_called()
+        manager = MongoDBManager(dbpath=self.manager.dbpath, logpath=self.manager.logpath, pidfile=self.pidfile)
+        manager.start()
+        popen.assert_called_once()
+        self.assertTrue(manager.attached)
+        self.assertFalse(manager.stop())
+
+    @patch("omnia.mongo.mongo_manager.ping", return_value=True)
+    @patch("omnia.mongo.mongo_manager.subprocess.Popen")
+    def test_start_and_stop(self, popen, ping):
+        process = popen.return_value = MagicMock(pid=os.getpid(), **{"poll.return_value": None})
+        self.pidfile.write_text(json.dumps({"pid": 2**22 + 1, "port": 27018}))
+        self.manager.start()
+        # The server of the stale pidfile isn't running, so a new one is started
+        self.assertFalse(self.manager.attached)
+        self.assertFalse(popen.call_args.kwargs["start_new_session"])
+
+        self.assertTrue(self.manager.stop())
+        process.terminate.assert_called_once()
+        self.assertEqual(self.pidfile.read_text(), "")
+
+    @patch("omnia.mongo.mongo_manager.ping", return_value=True)
+    @patch("omnia.mongo.mongo_manager.subprocess.Popen")
+    def test_no_attach_without_keep_alive(self, popen, ping):
+        popen.return_value = MagicMock(pid=os.getpid(), **{"poll.return_value": None})
+        self.manager.start()
+        self.assertEqual(json.loads(self.pidfile.read_text())["keep_alive"], False)
+
+        # The server stops with the command that started it, so another command must not use it
+        manager = MongoDBManager(
+            dbpath=self.manager.dbpath, logpath=self.manager.logpath, pidfile=self.pidfile, timeout=0
+        )
+        with self.assertRaisesRegex(RuntimeError, "--mongo-keep-alive"):
+            manager.start()
+        self.assertFalse(manager.attached)
+        popen.assert_called_once()
+        self.assertTrue(self.manager.stop())
+
+    @patch("omnia.mongo.mongo_manager.ping", return_value=False)
+    @patch("omnia.mongo.mongo_manager.subprocess.Popen")
+    def test_start_failure(self, popen, ping):
+        popen.side_effect = FileNotFoundError("mongod")
+        with self.assertRaises(FileNotFoundError):
+            self.manager.start()
+
+        # A server that doesn't get ready is stopped
+        popen.side_effect = None
+        process = popen.return_value = MagicMock(pid=os.getpid(), **{"poll.return_value": None})
+        self.manager.timeout = 0
+        with self.assertRaisesRegex(RuntimeError, "timeout"):
+            self.manager.start()
+        process.terminate.assert_called_once()
+        self.assertEqual(self.pidfile.read_text(), "")
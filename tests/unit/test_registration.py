@@ -0,0 +1,146 @@
+import csv
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+import mongomock
+from mongoengine import connect, disconnect
+
+from omnia.cli.commons import get_data_object
+from omnia.engines.commons import batched
+from omnia.engines.export import DatasetExporter
+from omnia.engines.registration import RegistrationPipeline
+from omnia.engines.sync import SyncPipeline
+from omnia.models.data_collection import DataCollection
+from omnia.models.data_object import Dataset, PosixDataObject
+
+
+class RegistrationTestCase(unittest.TestCase):
+    def setUp(self):
+        connect("omnia_test", host="mongodb://localhost", mongo_client_class=mongomock.MongoClient)
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.paths = []
+        for i in range(5):
+            path = Path(self.tmp_dir.name, f"file_{i}.txt")
+            path.write_text(f"content {i}")
+            self.paths.append(str(path))
+        self.collection = DataCollection(name="test_collection")
+        self.collection.save()
+
+    def tearDown(self):
+        disconnect()
+        self.tmp_dir.cleanup()
+
+
+class TestRegistrationPipeline(RegistrationTestCase):
+    def test_batched(self):
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+        self.assertEqual(list(batched([], 2)), [])
+        with self.assertRaises(ValueError):
+            list(batched(range(5), 0))
+
+    def test_register_new_files(self):
+        pipeline = RegistrationPipeline(self.collection.mdb_obj, workers=1, batch_size=2)
+        stats = pipeline.run(iter(self.paths))
+
+        self.assertEqual(stats.registered, 5)
+        self.assertEqual(stats.processed, 5)
+        self.assertEqual(Dataset.objects.count(), 5)
+        dataset = Dataset.objects(path=self.paths[0]).first()
+        self.assertEqual(dataset.size, len("content 0"))
+        self.assertEqual(dataset.encoding_format, "text/plain")
+        self.assertEqual(dataset.included_in_datacatalog, [self.collection.mdb_obj])
+
+    def test_path_lookups(self):
+        RegistrationPipeline(self.collection.mdb_obj, workers=1).run(self.paths[:3])
+
+        self.assertEqual([doc["path"] for doc in get_data_object(self.paths[0])], [self.paths[0]])
+        # Paths are matched exactly
+        self.assertIsNone(get_data_object(self.paths[0].upper()))
+        self.assertIsNone(get_data_object(self.paths[3]))
+
+    def test_register_existing_files(self):
+        RegistrationPipeline(self.collection.mdb_obj, workers=1).run(self.paths[:2])
+
+        other = DataCollection(name="other_collection")
+        other.save()
+        stats = RegistrationPipeline(other.mdb_obj, workers=1).run(self.paths[:3])
+        self.assertEqual((stats.registered, stats.linked), (1, 2))
+        dataset = Dataset.objects(path=self.paths[0]).first()
+        self.assertEqual(dataset.included_in_datacatalog, [self.collection.mdb_obj, other.mdb_obj])
+
+        stats = RegistrationPipeline(other.mdb_obj, workers=1).run(self.paths[:3])
+        self.assertEqual(stats.skipped, 3)
+
+    def test_missing_file(self):
+        stats = RegistrationPipeline(self.collection.mdb_obj, workers=1).run([str(Path(self.tmp_dir.name, "missing"))])
+        self.assertEqual((stats.registered, stats.failed), (0, 1))
+
+    def test_failing_worker(self):
+        compute = PosixDataObject.compute
+
+        def failing_compute(pdo):
+            if pdo.mdb_obj.path == self.paths[1]:
+                raise ValueError("unexpected content")
+            return compute(pdo)
+
+        with patch.object(PosixDataObject, "compute", failing_compute):
+            stats = RegistrationPipeline(self.collection.mdb_obj, workers=1).run(self.paths[:3])
+        self.assertEqual((stats.registered, stats.failed), (2, 1))
+        self.assertIsNone(Dataset.objects(path=self.paths[1]).first())
+
+
+class TestSyncPipeline(RegistrationTestCase):
+    def test_sync(self):
+        pipeline = SyncPipeline(self.collection.mdb_obj, dry_run=True, workers=1)
+        stats = pipeline.run(self.paths[:4])
+        self.assertEqual((stats.new, stats.registration, Dataset.objects.count()), (4, None, 0))
+        self.assertEqual(pipeline.changed_paths, self.paths[:4])
+
+        stats = SyncPipeline(self.collection.mdb_obj, workers=1).run(self.paths[:4])
+        self.assertEqual((stats.new, stats.registration.registered), (4, 4))
+        dataset = Dataset.objects(path=self.paths[0]).first()
+        st = Path(self.paths[0]).stat()
+        self.assertEqual((dataset.mtime_ns, dataset.inode), (st.st_mtime_ns, st.st_ino))
+
+        pipeline = SyncPipeline(self.collection.mdb_obj, workers=1)
+        stats = pipeline.run(self.paths[1:])
+        self.assertEqual((stats.unchanged, stats.new, stats.vanished), (3, 1, 1))
+        self.assertEqual(pipeline.vanished_paths, [self.paths[0]])
+
+        stats = SyncPipeline(self.collection.mdb_obj, workers=1, prune=True).run(self.paths[1:])
+        self.assertEqual((stats.unchanged, stats.new, stats.removed), (4, 0, 1))
+        self.assertEqual(Dataset.objects(path=self.paths[0]).count(), 0)
+        self.assertEqual(Dataset.objects.count(), 4)
+
+
+class TestDatasetExporter(RegistrationTestCase):
+    def setUp(self):
+        super().setUp()
+        RegistrationPipeline(self.collection.mdb_obj, workers=1).run(self.paths)
+
+    def test_export(self):
+        stream = io.StringIO()
+        self.assertEqual(DatasetExporter(self.collection.mdb_obj, batch_size=2).export(stream), 5)
+        self.assertEqual(sorted(stream.getvalue().splitlines()), self.paths)
+
+        stream = io.StringIO()
+        DatasetExporter(self.collection.mdb_obj, fmt="ndjson", fields=("path", "size")).export(stream)
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        self.assertEqual({record["path"]: record["size"] for record in records}, {path: 9 for path in self.paths})
+
+        stream = io.StringIO()
+        DatasetExporter(self.collection.mdb_obj, fmt="csv", fields=("path", "checksum")).export(stream)
+        rows = list(csv.reader(io.StringIO(stream.getvalue())))
+        self.assertEqual(rows[0], ["path", "checksum"])
+        self.assertEqual(len(rows), 6)
+
+    def test_collection_stats(self):
+        stats = Dataset.collection_stats(self.collection.mdb_obj)
+        self.assertEqual(stats["count"], 5)
+        self.assertEqual(stats["size"], 45)
+        self.assertEqual(stats["mimetypes"], {"text/plain": 5})
+        self.assertIsNotNone(stats["last_modified"])
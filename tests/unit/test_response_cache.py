@@ -0,0 +1,83 @@
+import unittest
+from unittest.mock import patch
+
+from omnia.utils.response_cache import ResponseCache, compute_etag
+
+
+class TestResponseCache(unittest.TestCase):
+    def test_get_put(self):
+        cache = ResponseCache()
+        self.assertIsNone(cache.get("a"))
+        entry = cache.put("a", b"body", collection="datasets")
+        self.assertEqual(entry.etag, compute_etag(b"body"))
+        self.assertIs(cache.get("a"), entry)
+        self.assertEqual((cache.hits, cache.misses, cache.nbytes), (1, 1, 4))
+
+    def test_ttl(self):
+        cache = ResponseCache(ttl=10)
+        with patch("omnia.utils.response_cache.time.monotonic", return_value=100.0):
+            cache.put("a", b"body")
+        with patch("omnia.utils.response_cache.time.monotonic", return_value=109.0):
+            self.assertIsNotNone(cache.get("a"))
+        with patch("omnia.utils.response_cache.time.monotonic", return_value=110.0):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_lru_bounds(self):
+        cache = ResponseCache(max_entries=2, max_bytes=10)
+        cache.put("a", b"1234")
+        cache.put("b", b"1234")
+        cache.get("a")
+        cache.put("c", b"1234")
+        self.assertIsNone(cache.get("b"))
+        self.assertIsNotNone(cache.get("a"))
+        cache.put("d", b"12345678")
+        self.assertEqual((len(cache), cache.nbytes), (1, 8))
+        cache.put("e", b"12345678901")
+        self.assertIsNone(cache.get("e"))
+
+    def test_invalidate(self):
+        cache = ResponseCache()
+        cache.put("list", b"[]")
+        cache.put("a", b"a", collection="datasets")
+        cache.put("b", b"b", collection="data_catalogs")
+        cache.invalidate("datasets")
+        self.assertEqual((cache.get("list"), cache.get("a")), (None, None))
+        self.assertIsNotNone(cache.get("b"))
+        cache.invalidate()
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+    def test_invalidate_during_read(self):
+        cache = ResponseCache()
+        self.assertIsNone(cache.get("a"))
+        generation = cache.generation("datasets")
+        # A write lands while the document is read
+        cache.invalidate("datasets")
+        cache.put("a", b"stale", collection="datasets", generation=generation)
+        self.assertIsNone(cache.get("a"))
+
+        # Writes to other collections don't matter, clearing the whole cache does
+        generation = cache.generation("datasets")
+        cache.invalidate("collections")
+        cache.put("a", b"fresh", collection="datasets", generation=generation)
+        self.assertEqual(cache.get("a").body, b"fresh")
+        generation, all_generation = cache.generation("datasets"), cache.generation()
+        cache.invalidate()
+        cache.put("a", b"stale", collection="datasets", generation=generation)
+        cache.put("b", b"stale", generation=all_generation)
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled(self):
+        cache = ResponseCache(ttl=0)
+        self.assertEqual(cache.put("a", b"body").body, b"body")
+        self.assertIsNone(cache.get("a"))
+
+    def test_configure(self):
+        cache = ResponseCache()
+        for key in "abc":
+            cache.put(key, b"1234")
+        cache.configure(ttl=10, max_entries=2, max_bytes=4)
+        self.assertEqual(len(cache), 1)
+        self.assertIsNotNone(cache.get("c"))
+        cache.configure(ttl=0, max_entries=2, max_bytes=4)
+        self.assertEqual((len(cache), cache.nbytes), (0, 0))
@@ -0,0 +1,147 @@
+import re
+import tempfile
+import unittest
+from pathlib import Path
+
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+
+from omnia.engines.registration import RegistrationPipeline
+from omnia.engines.sync import SyncPipeline
+from omnia.models.data_collection import Datacatalog, DataCollection
+from omnia.models.data_object import Dataset, PosixDataObject
+from omnia.mongo.connection_manager import get_mec
+from omnia.storage import SQLiteCollection, get_collection, get_store
+
+
+class SQLiteTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.mec = get_mec(uri=f"sqlite://{Path(self.tmp_dir.name, 'omnia.sqlite')}")
+        self.mec.__enter__()
+
+    def tearDown(self):
+        self.mec.__exit__(None, None, None)
+        self.tmp_dir.cleanup()
+
+
+class TestSQLiteCollection(SQLiteTestCase):
+    def setUp(self):
+        super().setUp()
+        self.collection = get_collection(Dataset)
+        self.collection.insert_many(
+            [
+                {"path": f"/data/File_{i}.txt", "uk": str(i), "size": i, "included_in_datacatalog": [i % 2]}
+                for i in range(5)
+            ]
+        )
+
+    def test_store(self):
+        self.assertIsInstance(self.collection, SQLiteCollection)
+        self.assertIsNotNone(get_store(Dataset))
+        self.assertIn("path_ci", self.collection.index_information())
+
+    def test_find(self):
+        find = self.collection.find
+        self.assertEqual(len(list(find({"size": {"$gte": 3}}))), 2)
+        self.assertEqual([doc["uk"] for doc in find({"path": {"$in": ["/data/File_1.txt", "/data/missing"]}})], ["1"])
+        self.assertEqual(find({"path": re.compile("^/data/file_2\\.txt$", re.IGNORECASE)}).count(), 1)
+        self.assertEqual(find({"included_in_datacatalog": 1}).count(), 2)
+        self.assertEqual(find({}, {"size": 1}, limit=1).first().keys(), {"_id", "size"})
+
+    def test_list_fields(self):
+        query = self.collection.find({"included_in_datacatalog": 1})
+        plan = " ".join(row[3] for row in get_store().execute(f"EXPLAIN QUERY PLAN {query._sql('doc')}", query.params))
+        self.assertIn("datasets__elements_value", plan)
+
+        # The elements follow the writes
+        self.collection.update_many({"uk": {"$in": ["0", "1"]}}, {"$set": {"included_in_datacatalog": [2]}})
+        self.collection.delete_one({"uk": "3"})
+        self.assertEqual(sorted(doc["uk"] for doc in self.collection.find({"included_in_datacatalog": 2})), ["0", "1"])
+        self.assertEqual([doc["uk"] for doc in self.collection.find({"included_in_datacatalog": {"$in": [1, 3]}})], [])
+        self.assertEqual(get_store().execute('SELECT COUNT(*) FROM "datasets__elements"').fetchone()[0], 4)
+
+    def test_write(self):
+        with self.assertRaises(DuplicateKeyError):
+            self.collection.insert_one({"path": "/data/other", "uk": "0"})
+        result = self.collection.update_many({"size": {"$lt": 2}}, {"$pull": {"included_in_datacatalog": 0}})
+        self.assertEqual(result.modified_count, 1)
+        self.assertEqual(self.collection.delete_many({"included_in_datacatalog": {"$size": 0}}).deleted_count, 1)
+        self.assertEqual(self.collection.count_documents({}), 4)
+
+    def test_unsupported_operators(self):
+        self.collection.update_one({"uk": "1"}, {"$push": {"included_in_datacatalog": {"$each": [1, 2]}}})
+        self.assertEqual(self.collection.find_one({"uk": "1"})["included_in_datacatalog"], [1, 1, 2])
+        with self.assertRaisesRegex(OperationFailure, r"\$inc"):
+            self.collection.update_one({"uk": "1"}, {"$inc": {"size": 1}})
+        with self.assertRaisesRegex(OperationFailure, r"\$not"):
+            self.collection.find({"size": {"$not": {"$gt": 2}}})
+        with self.assertRaisesRegex(OperationFailure, "ReplaceOne"):
+            self.collection.bulk_write([ReplaceOne({"uk": "1"}, {"uk": "1"})])
+
+
+class TestModelsOnSQLite(SQLiteTestCase):
+    def test_mixin(self):
+        DataCollection(name="collection", description="first").save()
+        collection = DataCollection(name="collection").map()
+        self.assertTrue(collection.is_mapped)
+        self.assertEqual(collection.mdb_obj.description, "first")
+        self.assertTrue(collection.update(set__description="second"))
+        self.assertEqual(DataCollection(name="collection").view()["description"], "second")
+        self.assertEqual([doc["name"] for doc in DataCollection().query(name="COLLECTION")], ["collection"])
+
+        # The list updates are applied by the store
+        self.assertTrue(collection.update(push__keywords="a"))
+        self.assertTrue(collection.update(add_to_set__keywords=["a", "b", "c"]))
+        self.assertTrue(collection.update(pull__keywords="b"))
+        self.assertEqual(collection.mdb_obj.keywords, ["a", "c"])
+        self.assertEqual(DataCollection(name="collection").view()["keywords"], ["a", "c"])
+        with self.assertRaisesRegex(OperationFailure, r"\$rename"):
+            collection.update(rename__description="summary")
+
+        # The names are unique
+        DataCollection(name="collection").save()
+        self.assertEqual(get_collection(Datacatalog).count_documents({}), 1)
+        collection.delete()
+        self.assertFalse(DataCollection(name="collection").is_mapped)
+
+    def test_registration(self):
+        paths = []
+        for i in range(3):
+            path = Path(self.tmp_dir.name, f"file_{i}.txt")
+            path.write_text(f"content {i}")
+            paths.append(str(path))
+        collection = DataCollection(name="collection")
+        collection.save()
+
+        stats = RegistrationPipeline(collection.mdb_obj, workers=1, batch_size=2).run(paths)
+        self.assertEqual(stats.registered, 3)
+        self.assertEqual(len(PosixDataObject().query(case_sensitive=True, path=paths[0])), 1)
+        self.assertEqual(len(PosixDataObject().query(path=paths[0].upper())), 1)
+        self.assertEqual(Dataset.collection_stats(collection.mdb_obj)["count"], 3)
+
+        stats = SyncPipeline(collection.mdb_obj, prune=True, workers=1).run(paths[1:])
+        self.assertEqual((stats.unchanged, stats.vanished, stats.removed), (2, 1, 1))
+        self.assertEqual(get_collection(Dataset).count_documents({}), 2)
+
+    def test_sync_changed_in_other_collection(self):
+        paths = []
+        for i in range(2):
+            path = Path(self.tmp_dir.name, f"file_{i}.txt")
+            path.write_text(f"content {i}")
+            paths.append(str(path))
+        collection, other = DataCollection(name="collection"), DataCollection(name="other")
+        collection.save()
+        other.save()
+        RegistrationPipeline(collection.mdb_obj, workers=1).run(paths)
+        checksum = get_collection(Dataset).find_one({"path": paths[0]})["checksum"]
+        Path(paths[0]).write_text("new content, longer")
+
+        # The files are new to the other collection, the changed one is hashed again
+        stats = SyncPipeline(other.mdb_obj, workers=1).run(paths)
+        self.assertEqual((stats.new, stats.registration.linked, stats.registration.updated), (2, 1, 1))
+        for path in paths:
+            doc = get_collection(Dataset).find_one({"path": path})
+            self.assertEqual(doc["included_in_datacatalog"], [collection.mdb_obj.pk, other.mdb_obj.pk])
+            self.assertEqual(doc["size"], Path(path).stat().st_size)
+        self.assertNotEqual(get_collection(Dataset).find_one({"path": paths[0]})["checksum"], checksum)
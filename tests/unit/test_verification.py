@@ -0,0 +1,40 @@
+import io
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from omnia.engines.verification import VerificationEngine
+from omnia.utils import Hashing
+
+
+class TestVerificationEngine(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.items = []
+        for i in range(10):
+            path = Path(self.tmp_dir.name, f"file_{i}.txt")
+            path.write_text(f"content {i}")
+            self.items.append({"path": str(path), "checksum": Hashing().compute_file_hash(path)})
+        self.items[0]["checksum"] = "wrong"
+        Path(self.items[1]["path"]).unlink()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_run(self):
+        report = io.StringIO()
+        engine = VerificationEngine(jobs=3, report=report)
+        results = {result.path: result for result in engine.run(iter(self.items))}
+
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[self.items[0]["path"]].status, "mismatch")
+        self.assertEqual(results[self.items[1]["path"]].status, "missing")
+        self.assertTrue(all(results[item["path"]].ok for item in self.items[2:]))
+        self.assertEqual(engine.stats.counts, {"ok": 8, "mismatch": 1, "missing": 1, "error": 0})
+
+        records = [json.loads(line) for line in report.getvalue().splitlines()]
+        self.assertEqual(len(records), 11)
+        self.assertEqual(records[-1]["status"], "summary")
+        self.assertEqual(records[-1]["verified"], 10)
+        self.assertEqual({record["path"] for record in records[:-1]}, set(results))